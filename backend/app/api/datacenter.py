@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List
+from typing import Dict, List
 import logging
 
 from app.core.database import get_db
@@ -16,6 +16,11 @@ from app.schemas.datacenter import (
     DeviceUpdate,
     DeviceResponse
 )
+from app.services.device_monitor import device_monitor
+from app.services.latency_history import parse_windows
+from app.services.datacenter_stats import datacenter_stats
+from app.services.fleet_exec import resolve_targets
+from app.api.socket_handlers import join_datacenter_room
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -41,6 +46,7 @@ async def create_datacenter(
         db.add(new_datacenter)
         await db.commit()
         await db.refresh(new_datacenter)
+        await join_datacenter_room(current_user.id, new_datacenter.id)
         
         logger.info(f"Successfully created datacenter: {new_datacenter.id}")
         return new_datacenter
@@ -117,6 +123,64 @@ async def get_datacenter(
     }
 
 
+@router.get("/{datacenter_id}/latency")
+async def get_datacenter_latency(
+    datacenter_id: int,
+    windows: str = Query("60,300,3600", description="Comma-separated window lengths in seconds"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> Dict:
+    """Get ping latency percentiles and packet loss for every device in a datacenter"""
+    result = await db.execute(
+        select(Datacenter)
+        .where(Datacenter.id == datacenter_id)
+        .where(Datacenter.user_id == current_user.id)
+    )
+    datacenter = result.scalar_one_or_none()
+    
+    if not datacenter:
+        raise HTTPException(status_code=404, detail="Datacenter not found")
+    
+    try:
+        window_list = parse_windows(windows)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="windows must be positive integers (seconds)")
+    
+    devices_result = await db.execute(
+        select(Device.id).where(Device.datacenter_id == datacenter.id)
+    )
+    device_ids = devices_result.scalars().all()
+    
+    summaries = device_monitor.latency.summaries(device_ids, window_list)
+    return {
+        "datacenter_id": datacenter.id,
+        "devices": {str(device_id): summary for device_id, summary in summaries.items()}
+    }
+
+
+@router.get("/{datacenter_id}/stats")
+async def get_datacenter_stats(
+    datacenter_id: int,
+    deadline: float = Query(None, gt=0, le=60, description="Seconds to wait before returning partial results"),
+    max_age: float = Query(None, ge=0, description="Reuse cached device samples younger than this (seconds)"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> Dict:
+    """Get CPU, memory and disk of every SSH-configured device in a datacenter plus totals"""
+    result = await db.execute(
+        select(Datacenter)
+        .where(Datacenter.id == datacenter_id)
+        .where(Datacenter.user_id == current_user.id)
+    )
+    datacenter = result.scalar_one_or_none()
+    
+    if not datacenter:
+        raise HTTPException(status_code=404, detail="Datacenter not found")
+    
+    targets, skipped = await resolve_targets(db, current_user.id, datacenter_ids=[datacenter.id])
+    return await datacenter_stats.collect(datacenter.id, targets, skipped, deadline, max_age)
+
+
 @router.delete("/{datacenter_id}")
 async def delete_datacenter(
     datacenter_id: int,
@@ -136,6 +200,7 @@ async def delete_datacenter(
     
     await db.delete(datacenter)
     await db.commit()
+    device_monitor.request_sync()
     return {"message": "Datacenter deleted successfully"}
 
 
@@ -167,11 +232,13 @@ async def create_device(
         ssh_username=device_data.ssh_username,
         ssh_password=device_data.ssh_password,  # TODO: Encrypt in production
         description=device_data.description,
+        check_interval=device_data.check_interval,
         datacenter_id=datacenter_id
     )
     db.add(new_device)
     await db.commit()
     await db.refresh(new_device)
+    device_monitor.request_sync()
     return new_device
 
 
@@ -213,6 +280,7 @@ async def update_device(
     
     await db.commit()
     await db.refresh(device)
+    device_monitor.request_sync()
     return device
 
 
@@ -248,4 +316,5 @@ async def delete_device(
     
     await db.delete(device)
     await db.commit()
+    device_monitor.request_sync()
     return {"message": "Device deleted successfully"}
@@ -1,7 +1,7 @@
 """
 API endpoints for device statistics and monitoring
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import Dict, List
@@ -11,6 +11,9 @@ from app.core.security import get_current_user
 from app.models.user import User
 from app.models.datacenter import Device
 from app.services.device_stats_service import device_stats_service
+from app.services.device_monitor import device_monitor
+from app.services.latency_history import parse_windows
+from app.services.service_inventory import ServiceView
 import logging
 
 logger = logging.getLogger(__name__)
@@ -60,13 +63,57 @@ async def get_device_stats(
     return stats
 
 
+@router.get("/{device_id}/latency")
+async def get_device_latency(
+    device_id: int,
+    windows: str = Query("60,300,3600", description="Comma-separated window lengths in seconds"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> Dict:
+    """Get ping latency percentiles (p50/p95/p99) and packet loss per window"""
+    # Verify device ownership
+    result = await db.execute(
+        select(Device).where(Device.id == device_id)
+    )
+    device = result.scalar_one_or_none()
+    
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+    
+    # Verify user owns the datacenter
+    from app.models.datacenter import Datacenter
+    dc_result = await db.execute(
+        select(Datacenter).where(
+            Datacenter.id == device.datacenter_id,
+            Datacenter.user_id == current_user.id
+        )
+    )
+    if not dc_result.scalar_one_or_none():
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    try:
+        window_list = parse_windows(windows)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="windows must be positive integers (seconds)")
+    
+    return {
+        "device_id": device.id,
+        "windows": device_monitor.latency.summary(device.id, window_list)
+    }
+
+
 @router.get("/{device_id}/services")
 async def get_device_services(
     device_id: int,
+    filter: str = Query("", description="Case-insensitive substring of the unit name"),
+    state: str = Query("", description="Active, sub or enabled state, e.g. running, failed, enabled"),
+    sort: str = Query("name", description="name, active, sub, enabled or load"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
-) -> List[Dict]:
-    """Get list of services running on device"""
+) -> Dict:
+    """Get a filtered page of the device's systemd services"""
     # Verify device ownership
     result = await db.execute(
         select(Device).where(Device.id == device_id)
@@ -98,7 +145,8 @@ async def get_device_services(
         password=device.ssh_password or ""
     )
     
-    return services
+    view = ServiceView(sort=sort, query=filter, state=state, offset=offset, limit=limit)
+    return view.page(services)
 
 
 @router.get("/{device_id}/processes")
@@ -150,7 +198,7 @@ async def manage_device_service(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ) -> Dict:
-    """Manage a service (start, stop, restart)"""
+    """Manage a service (start, stop, restart, reload)"""
     # Verify device ownership
     result = await db.execute(
         select(Device).where(Device.id == device_id)
@@ -174,15 +222,18 @@ async def manage_device_service(
     if not device.ip_address or not device.ssh_username:
         raise HTTPException(status_code=400, detail="Device SSH configuration incomplete")
     
-    result = await device_stats_service.manage_service(
-        device_id=device.id,
-        host=device.ip_address,
-        port=device.ssh_port or 22,
-        username=device.ssh_username,
-        password=device.ssh_password or "",
-        service_name=service_name,
-        action=action
-    )
+    try:
+        result = await device_stats_service.manage_service(
+            device_id=device.id,
+            host=device.ip_address,
+            port=device.ssh_port or 22,
+            username=device.ssh_username,
+            password=device.ssh_password or "",
+            service_name=service_name,
+            action=action
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     if not result.get("success"):
         raise HTTPException(status_code=500, detail=result.get("error", "Unknown error"))
@@ -222,15 +273,18 @@ async def manage_device_process(
     if not device.ip_address or not device.ssh_username:
         raise HTTPException(status_code=400, detail="Device SSH configuration incomplete")
     
-    result = await device_stats_service.manage_process(
-        device_id=device.id,
-        host=device.ip_address,
-        port=device.ssh_port or 22,
-        username=device.ssh_username,
-        password=device.ssh_password or "",
-        pid=pid,
-        action=action
-    )
+    try:
+        result = await device_stats_service.manage_process(
+            device_id=device.id,
+            host=device.ip_address,
+            port=device.ssh_port or 22,
+            username=device.ssh_username,
+            password=device.ssh_password or "",
+            pid=pid,
+            action=action
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     if not result.get("success"):
         raise HTTPException(status_code=500, detail=result.get("error", "Unknown error"))
@@ -0,0 +1,59 @@
+"""
+API endpoints for running commands across many devices
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+import json
+import logging
+
+from app.core.database import get_db
+from app.core.security import get_current_user
+from app.models.user import User
+from app.schemas.fleet import FleetExecRequest
+from app.services.fleet_exec import build_command, fleet_executor, resolve_targets
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/fleet", tags=["fleet"])
+
+
+@router.post("/exec")
+async def fleet_exec(
+    request: FleetExecRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> StreamingResponse:
+    """
+    Run a command or service/process action on every selected device
+    
+    The response is a stream of newline-delimited JSON events
+    (``{"event": ..., ...}``) as hosts start, produce output and finish,
+    ending with a ``fleet_exec_summary``. Closing the connection cancels
+    the hosts still running.
+    """
+    try:
+        command, kind = build_command(
+            request.command, request.service, request.service_action,
+            request.pid, request.process_action
+        )
+        targets, skipped = await resolve_targets(
+            db, current_user.id, request.datacenter_ids, request.device_types, request.device_ids
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not targets:
+        raise HTTPException(status_code=404, detail="No devices match the selector")
+    
+    job = fleet_executor.start(command, kind, targets, skipped, request.concurrency, request.timeout)
+    
+    async def stream():
+        try:
+            async for event, payload in job.events():
+                yield json.dumps({"event": event, **payload}) + "\n"
+        finally:
+            # Client went away before the summary: stop the remaining hosts
+            job.cancel()
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
@@ -1,8 +1,21 @@
 import socketio
 from app.services.terminal_service import terminal_manager
-from app.services.device_stats_service import device_stats_service
+from app.services.device_monitor import device_monitor, datacenter_room
+from app.services.stats_publisher import stats_publisher
+from app.services.process_table import ProcessView, process_table_publisher
+from app.services.service_inventory import ServiceView
+from app.services.service_publisher import service_inventory_publisher
+from app.services.fleet_exec import FleetTarget, build_command, fleet_executor, resolve_targets
+from app.services.datacenter_stats import datacenter_stats_publisher
+from app.core.config import settings
+from app.core.database import async_session
+from app.core.security import decode_access_token
+from app.models.user import User
+from app.models.datacenter import Datacenter
+from sqlalchemy import select
+from urllib.parse import parse_qs
 import asyncio
-from typing import Dict
+from typing import Dict, Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,14 +31,49 @@ sio = socketio.AsyncServer(
 # Store user terminal mappings
 user_terminals: Dict[str, set] = {}
 
-# Store active device monitoring tasks
-device_monitoring_tasks: Dict[str, asyncio.Task] = {}
+# Store connected sids per user id
+user_sessions: Dict[int, set] = {}
+
+
+def _get_token(environ, auth) -> Optional[str]:
+    """Read the access token from the handshake auth payload or query string"""
+    if isinstance(auth, dict) and auth.get('token'):
+        return auth['token']
+    query = parse_qs(environ.get('QUERY_STRING', ''))
+    return query.get('token', [None])[0]
+
+
+async def join_datacenter_room(user_id: int, datacenter_id: int):
+    """Subscribe every session of a user to a (newly created) datacenter"""
+    for sid in list(user_sessions.get(user_id, ())):
+        await sio.enter_room(sid, datacenter_room(datacenter_id))
 
 
 @sio.event
-async def connect(sid, environ):
-    """Handle client connection"""
-    logger.info(f"Client connected: {sid}")
+async def connect(sid, environ, auth=None):
+    """Authenticate the client and join rooms for the datacenters it owns"""
+    token = _get_token(environ, auth)
+    username = decode_access_token(token) if token else None
+    if username is None:
+        logger.warning(f"Rejected unauthenticated socket connection: {sid}")
+        raise socketio.exceptions.ConnectionRefusedError('authentication failed')
+    
+    async with async_session() as db:
+        result = await db.execute(select(User).where(User.username == username))
+        user = result.scalar_one_or_none()
+        if user is None:
+            raise socketio.exceptions.ConnectionRefusedError('authentication failed')
+        dc_result = await db.execute(
+            select(Datacenter.id).where(Datacenter.user_id == user.id)
+        )
+        datacenter_ids = dc_result.scalars().all()
+    
+    await sio.save_session(sid, {'user_id': user.id, 'username': user.username})
+    for datacenter_id in datacenter_ids:
+        await sio.enter_room(sid, datacenter_room(datacenter_id))
+    user_sessions.setdefault(user.id, set()).add(sid)
+    
+    logger.info(f"Client connected: {sid} (user {user.username})")
     user_terminals[sid] = set()
 
 
@@ -34,13 +82,53 @@ async def disconnect(sid):
     """Handle client disconnection"""
     logger.info(f"Client disconnected: {sid}")
     
-    # Close all terminals for this user
+    session = await sio.get_session(sid)
+    user_id = session.get('user_id')
+    if user_id in user_sessions:
+        user_sessions[user_id].discard(sid)
+        if not user_sessions[user_id]:
+            del user_sessions[user_id]
+    
+    # Leave shared device stats streams and release file manager sessions
+    await stats_publisher.unsubscribe_all(sid)
+    process_table_publisher.unsubscribe_all(sid)
+    service_inventory_publisher.unsubscribe_all(sid)
+    fleet_executor.cancel_owned(sid)
+    await datacenter_stats_publisher.unsubscribe_all(sid)
+    file_manager_service.close_session(sid)
+    
+    # Detach this client's terminals; they keep running for the grace period
     if sid in user_terminals:
         for terminal_id in list(user_terminals[sid]):
-            terminal_manager.close_terminal(terminal_id)
+            await terminal_manager.detach(terminal_id, sid)
         del user_terminals[sid]
 
 
+@sio.event
+async def resync_status(sid, data):
+    """Send a reconnecting client the status changes it missed (or a snapshot)"""
+    try:
+        data = data or {}
+        last_seqs = {
+            int(datacenter_id): int(seq)
+            for datacenter_id, seq in (data.get('seqs') or {}).items()
+        }
+        datacenter_ids = [
+            int(room.split(':', 1)[1])
+            for room in sio.rooms(sid)
+            if room.startswith('datacenter:')
+        ]
+        
+        payload = device_monitor.get_resync(datacenter_ids, data.get('epoch'), last_seqs)
+        await sio.emit('device_status_resync', payload, room=sid)
+        
+    except Exception as e:
+        logger.error(f"Error resyncing status: {e}")
+        await sio.emit('error', {
+            'message': f'Failed to resync status: {str(e)}'
+        }, room=sid)
+
+
 @sio.event
 async def create_terminal(sid, data):
     """Create a new terminal (local or SSH)"""
@@ -48,9 +136,14 @@ async def create_terminal(sid, data):
         cols = data.get('cols', 80)
         rows = data.get('rows', 24)
         ssh_config = data.get('ssh_config')  # Optional SSH configuration
+        binary = bool(data.get('binary', False))  # Raw byte frames instead of text
+        
+        session = await sio.get_session(sid)
         
         # Create terminal
-        terminal = await terminal_manager.create_terminal(cols, rows, ssh_config)
+        terminal = await terminal_manager.create_terminal(
+            cols, rows, ssh_config, binary, owner=session.get('user_id'), sid=sid
+        )
         
         # Track this terminal for the user
         if sid not in user_terminals:
@@ -58,14 +151,15 @@ async def create_terminal(sid, data):
         user_terminals[sid].add(terminal.terminal_id)
         
         # Start reading output
-        asyncio.create_task(stream_terminal_output(sid, terminal.terminal_id))
+        asyncio.create_task(stream_terminal_output(terminal.terminal_id))
         
         # Send success response
         await sio.emit('terminal_created', {
             'terminal_id': terminal.terminal_id,
             'status': 'success',
             'is_ssh': terminal.is_ssh,
-            'host': ssh_config['host'] if ssh_config else 'local'
+            'binary': terminal.binary,
+            'host': terminal.host
         }, room=sid)
         
     except Exception as e:
@@ -75,15 +169,86 @@ async def create_terminal(sid, data):
         }, room=sid)
 
 
+@sio.event
+async def attach_terminal(sid, data):
+    """Reattach a detached terminal (or take one over from another tab) and send its screen"""
+    try:
+        terminal_id = data.get('terminal_id')
+        session = await sio.get_session(sid)
+        terminal = terminal_manager.get_terminal(terminal_id)
+        if not terminal or terminal.closed or terminal.owner != session.get('user_id'):
+            await sio.emit('terminal_closed', {
+                'terminal_id': terminal_id
+            }, room=sid)
+            return
+        
+        async with terminal.attach_lock:
+            previous = terminal.sid
+            screen = await terminal_manager.attach(
+                terminal_id, sid, data.get('cols'), data.get('rows')
+            )
+            if screen is None:
+                await sio.emit('terminal_closed', {
+                    'terminal_id': terminal_id
+                }, room=sid)
+                return
+            
+            user_terminals.setdefault(sid, set()).add(terminal_id)
+            # One frame with the current screen; output follows as terminal_output
+            await sio.emit('terminal_attached', {
+                'terminal_id': terminal_id,
+                'is_ssh': terminal.is_ssh,
+                'binary': terminal.binary,
+                'host': terminal.host,
+                'data': screen if terminal.binary else screen.decode('utf-8', errors='replace')
+            }, room=sid)
+        
+        if previous and previous != sid:
+            user_terminals.get(previous, set()).discard(terminal_id)
+            await sio.emit('terminal_detached', {
+                'terminal_id': terminal_id
+            }, room=previous)
+        logger.info(f"Client {sid} attached to terminal {terminal_id}")
+        
+    except Exception as e:
+        logger.error(f"Error attaching terminal: {e}")
+        await sio.emit('error', {
+            'message': f'Failed to attach terminal: {str(e)}'
+        }, room=sid)
+
+
+@sio.event
+async def list_terminals(sid, data=None):
+    """Send the user's open terminals, attached or not, so a new page can reattach them"""
+    try:
+        session = await sio.get_session(sid)
+        await sio.emit('terminal_list', {
+            'terminals': [
+                {
+                    'terminal_id': terminal.terminal_id,
+                    'is_ssh': terminal.is_ssh,
+                    'binary': terminal.binary,
+                    'host': terminal.host,
+                    'attached': terminal.sid is not None
+                }
+                for terminal in list(terminal_manager.terminals.values())
+                if terminal.owner == session.get('user_id') and not terminal.closed
+            ]
+        }, room=sid)
+    except Exception as e:
+        logger.error(f"Error listing terminals: {e}")
+
+
 @sio.event
 async def terminal_input(sid, data):
     """Handle terminal input"""
     try:
         terminal_id = data.get('terminal_id')
-        input_data = data.get('data', '')
+        input_data = data.get('data', '')  # Text, or bytes sent as a binary attachment
         
+        # Only the attached client may type; a taken-over tab is ignored
         terminal = terminal_manager.get_terminal(terminal_id)
-        if terminal and not terminal.closed:
+        if terminal and not terminal.closed and terminal.sid == sid:
             terminal.write(input_data)
     except Exception as e:
         logger.error(f"Error handling terminal input: {e}")
@@ -98,12 +263,25 @@ async def terminal_resize(sid, data):
         rows = data.get('rows', 24)
         
         terminal = terminal_manager.get_terminal(terminal_id)
-        if terminal and not terminal.closed:
+        if terminal and not terminal.closed and terminal.sid == sid:
             terminal.resize(cols, rows)
     except Exception as e:
         logger.error(f"Error resizing terminal: {e}")
 
 
+@sio.event
+async def terminal_ack(sid, data):
+    """Client has written ``bytes`` more bytes of a terminal's output"""
+    try:
+        terminal_id = data.get('terminal_id')
+        
+        terminal = terminal_manager.get_terminal(terminal_id)
+        if terminal and not terminal.closed and terminal.sid == sid:
+            terminal.acknowledge(int(data.get('bytes', 0)))
+    except Exception as e:
+        logger.error(f"Error handling terminal ack: {e}")
+
+
 @sio.event
 async def close_terminal(sid, data):
     """Close a terminal"""
@@ -113,7 +291,11 @@ async def close_terminal(sid, data):
         if sid in user_terminals and terminal_id in user_terminals[sid]:
             user_terminals[sid].remove(terminal_id)
         
-        terminal_manager.close_terminal(terminal_id)
+        # Detached terminals can be closed by their owner without reattaching
+        session = await sio.get_session(sid)
+        terminal = terminal_manager.get_terminal(terminal_id)
+        if terminal and terminal.owner == session.get('user_id'):
+            terminal_manager.close_terminal(terminal_id)
         
         await sio.emit('terminal_closed', {
             'terminal_id': terminal_id
@@ -123,67 +305,92 @@ async def close_terminal(sid, data):
         logger.error(f"Error closing terminal: {e}")
 
 
-async def stream_terminal_output(sid: str, terminal_id: str):
-    """Stream terminal output to client"""
+async def stream_terminal_output(terminal_id: str):
+    """
+    Stream terminal output to its attached client
+    
+    Runs for the terminal's lifetime, not the client's: while the terminal
+    is detached its output only goes to the scrollback.
+    """
+    terminal = terminal_manager.get_terminal(terminal_id)
     try:
-        while True:
-            terminal = terminal_manager.get_terminal(terminal_id)
-            if not terminal or terminal.closed:
-                break
-            
+        while terminal and not terminal.closed:
             output = await terminal_manager.read_output(terminal_id)
             if output is None:
                 # Terminal closed
                 break
             
-            if output:
+            async with terminal.attach_lock:
+                terminal.screen.feed(output)
+                if terminal.sid is None:
+                    # Nobody is there to acknowledge it
+                    terminal.acknowledge(len(output))
+                    continue
+                
+                # The client acknowledges ``bytes`` once written (terminal_ack).
+                # Binary terminals get the raw frame as a binary attachment.
                 await sio.emit('terminal_output', {
                     'terminal_id': terminal_id,
-                    'data': output
-                }, room=sid)
-            
-            # Small delay to avoid overwhelming the client
-            await asyncio.sleep(0.01)
+                    'data': output if terminal.binary else terminal.decode(output),
+                    'bytes': len(output)
+                }, room=terminal.sid)
             
     except Exception as e:
         logger.error(f"Error streaming terminal output: {e}")
     finally:
-        # Notify client that terminal is closed
-        await sio.emit('terminal_closed', {
-            'terminal_id': terminal_id
-        }, room=sid)
+        # Drop the finished terminal and notify its client, if attached
+        sid = terminal.sid if terminal else None
+        terminal_manager.close_terminal(terminal_id)
+        if sid:
+            user_terminals.get(sid, set()).discard(terminal_id)
+            await sio.emit('terminal_closed', {
+                'terminal_id': terminal_id
+            }, room=sid)
+
+
+def _device_id(data: dict) -> Optional[int]:
+    """The request's device id as stored (streams are keyed by the int id), or None"""
+    try:
+        return int(data.get('device_id'))
+    except (TypeError, ValueError):
+        return None
+
+
+async def _owned_device(sid: str, device_id: Optional[int]) -> Optional[FleetTarget]:
+    """
+    The session user's device with its stored SSH connection
+    
+    Connection details sent by clients are never used: device streams are
+    shared per device id and feed the device's caches. Emits an error and
+    returns None if the device is not the user's or cannot be reached over SSH.
+    """
+    session = await sio.get_session(sid)
+    targets, skipped = [], []
+    if device_id is not None:
+        async with async_session() as db:
+            targets, skipped = await resolve_targets(db, session['user_id'], device_ids=[device_id])
+    
+    if targets:
+        return targets[0]
+    await sio.emit('error', {
+        'message': skipped[0]['error'] if skipped else 'Device not found'
+    }, room=sid)
+    return None
 
 
 @sio.event
 async def start_device_monitoring(sid, data):
     """Start streaming device statistics"""
     try:
-        device_id = data.get('device_id')
-        host = data.get('host')
-        port = data.get('port', 22)
-        username = data.get('username')
-        password = data.get('password')
-        
-        if not all([device_id, host, username, password]):
-            await sio.emit('error', {
-                'message': 'Missing required device connection info'
-            }, room=sid)
+        interval = max(float(data.get('interval', 3)), settings.STATS_STREAM_MIN_INTERVAL)
+        device = await _owned_device(sid, _device_id(data))
+        if device is None:
             return
         
-        # Create monitoring task key
-        task_key = f"{sid}:{device_id}"
-        
-        # Stop existing monitoring if any
-        if task_key in device_monitoring_tasks:
-            device_monitoring_tasks[task_key].cancel()
-        
-        # Start monitoring task
-        task = asyncio.create_task(
-            stream_device_stats(sid, device_id, host, port, username, password)
+        await stats_publisher.subscribe(
+            sid, device.device_id, device.host, device.port,
+            device.username, device.password, interval
         )
-        device_monitoring_tasks[task_key] = task
-        
-        logger.info(f"Started device monitoring for device {device_id}")
         
     except Exception as e:
         logger.error(f"Error starting device monitoring: {e}")
@@ -196,48 +403,213 @@ async def start_device_monitoring(sid, data):
 async def stop_device_monitoring(sid, data):
     """Stop streaming device statistics"""
     try:
-        device_id = data.get('device_id')
-        task_key = f"{sid}:{device_id}"
-        
-        if task_key in device_monitoring_tasks:
-            device_monitoring_tasks[task_key].cancel()
-            del device_monitoring_tasks[task_key]
-            device_stats_service.close_connection(device_id)
-            logger.info(f"Stopped device monitoring for device {device_id}")
+        device_id = _device_id(data)
+        await stats_publisher.unsubscribe(sid, device_id)
+        logger.info(f"Stopped device monitoring for device {device_id}")
         
     except Exception as e:
         logger.error(f"Error stopping device monitoring: {e}")
 
 
-async def stream_device_stats(sid: str, device_id: int, host: str, 
-                               port: int, username: str, password: str):
-    """Stream device statistics to client every 3 seconds"""
+def _process_view_params(data: dict) -> dict:
+    """Sort, filter and page options of a process table request"""
+    return {
+        'sort': data.get('sort', 'cpu'),
+        'descending': data.get('order', 'desc') != 'asc',
+        'query': data.get('filter', ''),
+        'offset': data.get('offset', 0),
+        'limit': data.get('limit', 100)
+    }
+
+
+@sio.event
+async def subscribe_processes(sid, data):
+    """Start streaming a sorted, filtered page of a device's process table"""
     try:
-        while True:
-            # Get system stats
-            stats = await device_stats_service.get_system_stats(
-                device_id, host, port, username, password
-            )
-            
-            if stats and 'error' not in stats:
-                await sio.emit('device_stats_update', {
-                    'device_id': device_id,
-                    'stats': stats
-                }, room=sid)
-            else:
-                logger.warning(f"Failed to get stats for device {device_id}")
-            
-            # Wait 3 seconds before next update
-            await asyncio.sleep(3)
-            
-    except asyncio.CancelledError:
-        logger.info(f"Device monitoring cancelled for device {device_id}")
+        interval = max(float(data.get('interval', 2)), settings.PROCESS_TABLE_MIN_INTERVAL)
+        device = await _owned_device(sid, _device_id(data))
+        if device is None:
+            return
+        
+        await process_table_publisher.subscribe(
+            sid, device.device_id, device.host, device.port,
+            device.username, device.password, interval,
+            ProcessView(**_process_view_params(data))
+        )
+        
     except Exception as e:
-        logger.error(f"Error streaming device stats: {e}")
-        await sio.emit('device_monitoring_error', {
-            'device_id': device_id,
+        logger.error(f"Error subscribing to processes: {e}")
+        await sio.emit('error', {
+            'message': f'Failed to stream processes: {str(e)}'
+        }, room=sid)
+
+
+@sio.event
+async def update_process_view(sid, data):
+    """Change the sort, filter or page of a process table subscription"""
+    try:
+        await process_table_publisher.update_view(
+            sid, _device_id(data), **_process_view_params(data)
+        )
+    except Exception as e:
+        logger.error(f"Error updating process view: {e}")
+
+
+@sio.event
+async def unsubscribe_processes(sid, data):
+    """Stop streaming a device's process table"""
+    try:
+        process_table_publisher.unsubscribe(sid, _device_id(data))
+    except Exception as e:
+        logger.error(f"Error unsubscribing from processes: {e}")
+
+
+def _service_view_params(data: dict) -> dict:
+    """Name filter, state filter and page options of a service inventory request"""
+    return {
+        'sort': data.get('sort', 'name'),
+        'descending': data.get('order', 'asc') == 'desc',
+        'query': data.get('filter', ''),
+        'state': data.get('state', ''),
+        'offset': data.get('offset', 0),
+        'limit': data.get('limit', 100)
+    }
+
+
+@sio.event
+async def subscribe_services(sid, data):
+    """Start receiving a filtered page of a device's service inventory and its changes"""
+    try:
+        device = await _owned_device(sid, _device_id(data))
+        if device is None:
+            return
+        
+        await service_inventory_publisher.subscribe(
+            sid, device.device_id, device.host, device.port,
+            device.username, device.password,
+            ServiceView(**_service_view_params(data))
+        )
+        
+    except Exception as e:
+        logger.error(f"Error subscribing to services: {e}")
+        await sio.emit('error', {
+            'message': f'Failed to load services: {str(e)}'
+        }, room=sid)
+
+
+@sio.event
+async def update_service_view(sid, data):
+    """Change the filter or page of a service inventory subscription"""
+    try:
+        await service_inventory_publisher.update_view(
+            sid, _device_id(data), **_service_view_params(data)
+        )
+    except Exception as e:
+        logger.error(f"Error updating service view: {e}")
+
+
+@sio.event
+async def unsubscribe_services(sid, data):
+    """Stop receiving a device's service inventory"""
+    try:
+        service_inventory_publisher.unsubscribe(sid, _device_id(data))
+    except Exception as e:
+        logger.error(f"Error unsubscribing from services: {e}")
+
+
+@sio.event
+async def subscribe_datacenter_stats(sid, data):
+    """Start receiving stats of every device in a datacenter plus totals"""
+    try:
+        datacenter_id = int(data.get('datacenter_id'))
+        interval = max(float(data.get('interval', 10)), settings.DATACENTER_STATS_MIN_INTERVAL)
+        
+        # Clients are in the rooms of the datacenters they own
+        if datacenter_room(datacenter_id) not in sio.rooms(sid):
+            await sio.emit('error', {
+                'message': 'Datacenter not found'
+            }, room=sid)
+            return
+        
+        session = await sio.get_session(sid)
+        await datacenter_stats_publisher.subscribe(sid, datacenter_id, session['user_id'], interval)
+        
+    except Exception as e:
+        logger.error(f"Error subscribing to datacenter stats: {e}")
+        await sio.emit('error', {
+            'message': f'Failed to subscribe to datacenter stats: {str(e)}'
+        }, room=sid)
+
+
+@sio.event
+async def unsubscribe_datacenter_stats(sid, data):
+    """Stop receiving a datacenter's stats"""
+    try:
+        await datacenter_stats_publisher.unsubscribe(sid, int(data.get('datacenter_id')))
+    except Exception as e:
+        logger.error(f"Error unsubscribing from datacenter stats: {e}")
+
+
+@sio.event
+async def fleet_exec(sid, data):
+    """Run a command or service/process action across selected devices, streaming per-host events"""
+    try:
+        session = await sio.get_session(sid)
+        command, kind = build_command(
+            data.get('command'), data.get('service'), data.get('service_action'),
+            data.get('pid'), data.get('process_action')
+        )
+        async with async_session() as db:
+            targets, skipped = await resolve_targets(
+                db, session['user_id'],
+                data.get('datacenter_ids'), data.get('device_types'), data.get('device_ids')
+            )
+        
+        if not targets:
+            await sio.emit('fleet_exec_error', {
+                'request_id': data.get('request_id'),
+                'error': 'No devices match the selector'
+            }, room=sid)
+            return
+        
+        job = fleet_executor.start(
+            command, kind, targets, skipped,
+            data.get('concurrency'), data.get('timeout'), owner=sid
+        )
+        asyncio.create_task(stream_fleet_job(sid, job, data.get('request_id')))
+        
+    except ValueError as e:
+        await sio.emit('fleet_exec_error', {
+            'request_id': data.get('request_id'),
             'error': str(e)
         }, room=sid)
+    except Exception as e:
+        logger.error(f"Error starting fleet job: {e}")
+        await sio.emit('fleet_exec_error', {
+            'request_id': data.get('request_id'),
+            'error': f'Failed to start fleet job: {str(e)}'
+        }, room=sid)
+
+
+async def stream_fleet_job(sid: str, job, request_id=None):
+    """Forward a fleet job's events to the client that started it"""
+    try:
+        async for event, payload in job.events():
+            if request_id is not None:
+                payload['request_id'] = request_id
+            await sio.emit(event, payload, room=sid)
+    except Exception as e:
+        logger.error(f"Error streaming fleet job {job.job_id}: {e}")
+        job.cancel()
+
+
+@sio.event
+async def cancel_fleet_exec(sid, data):
+    """Cancel a running fleet job started by this client"""
+    try:
+        fleet_executor.cancel(data.get('job_id'), owner=sid)
+    except Exception as e:
+        logger.error(f"Error cancelling fleet job: {e}")
 
 
 # File Manager Events
@@ -13,6 +13,84 @@ class Settings(BaseSettings):
     
     CORS_ORIGINS: List[str] = ["http://localhost:5173", "http://localhost:3000"]
     
+    # Device monitoring
+    MONITOR_USE_ICMP_ENGINE: bool = True  # Fall back to the ping subprocess when False
+    MONITOR_PING_TIMEOUT: int = 2
+    MONITOR_CHECK_INTERVAL: int = 30  # Default per-device interval (Device.check_interval overrides)
+    MONITOR_FAST_RECHECK_INTERVAL: int = 5  # Re-probe interval right after a device goes offline
+    MONITOR_FAST_RECHECK_COUNT: int = 3
+    MONITOR_BACKOFF_AFTER: int = 10  # Unchanged results before a stable device's interval doubles
+    MONITOR_MAX_BACKOFF_FACTOR: int = 4
+    MONITOR_SYNC_INTERVAL: int = 15  # How often the schedule is reconciled with the database
+    MONITOR_LAG_WARNING: float = 5.0  # Log when the scheduler falls this many seconds behind
+    MONITOR_MAX_INFLIGHT_PROBES: int = 500  # Per probe loop, 0 = unlimited
+    MONITOR_STATUS_FLUSH_INTERVAL: float = 5.0  # Seconds between bulk status writes
+    MONITOR_STATUS_FLUSH_BATCH: int = 500  # Flush early once this many devices are queued
+    MONITOR_CHANGE_LOG_SIZE: int = 1000  # Status changes kept per datacenter for reconnect resync
+    MONITOR_DELTA_WINDOW: float = 1.0  # Seconds status changes are coalesced before being emitted
+    MONITOR_LATENCY_SAMPLES: int = 720  # RTT/loss samples kept per device
+    MONITOR_WORKER_PROCESSES: int = 0  # Shard probing across N processes, 0 = probe in the API process
+    
+    # Device stats streaming
+    STATS_STREAM_MIN_INTERVAL: float = 0.5  # Fastest sampling interval a client may request (seconds)
+    PROCESS_TABLE_MIN_INTERVAL: float = 1.0  # Fastest process table sampling interval a client may request (seconds)
+    PROCESS_TABLE_MAX_PAGE: int = 500  # Largest process table page a client may request
+    SERVICE_INVENTORY_REFRESH_INTERVAL: float = 30.0  # Seconds between service inventory refreshes while subscribed
+    SERVICE_INVENTORY_MAX_PAGE: int = 500  # Largest service inventory page a client may request
+    
+    # Device stats request caching (seconds fresh, then seconds served stale while refreshing)
+    STATS_CACHE_TTL: float = 2.0
+    STATS_CACHE_STALE: float = 10.0
+    SERVICES_CACHE_TTL: float = 10.0
+    SERVICES_CACHE_STALE: float = 60.0
+    PROCESSES_CACHE_TTL: float = 3.0
+    PROCESSES_CACHE_STALE: float = 10.0
+    
+    # Datacenter-wide stats collection
+    DATACENTER_STATS_CONCURRENCY: int = 32  # Devices fetched at once across all datacenter stats requests
+    DATACENTER_STATS_DEADLINE: float = 5.0  # Seconds to wait before returning partial results
+    DATACENTER_STATS_MAX_AGE: float = 10.0  # Reuse cached device samples younger than this (seconds)
+    DATACENTER_STATS_MIN_INTERVAL: float = 5.0  # Fastest datacenter stats push interval a client may request
+    
+    # Fleet command execution
+    FLEET_EXEC_CONCURRENCY: int = 20  # Hosts a fleet job runs at once unless the request asks otherwise
+    FLEET_EXEC_MAX_CONCURRENCY: int = 100  # Upper bound on a job's requested concurrency
+    FLEET_EXEC_TIMEOUT: float = 60.0  # Per-host command deadline (seconds)
+    FLEET_EXEC_MAX_TIMEOUT: float = 3600.0  # Upper bound on a job's requested deadline (seconds)
+    FLEET_EXEC_MAX_OUTPUT: int = 65536  # Bytes of stdout/stderr streamed per host and stream
+    
+    # Terminal output streaming
+    TERMINAL_FRAME_INTERVAL: float = 0.02  # Seconds a busy terminal's output is coalesced into one frame
+    TERMINAL_FRAME_MAX_BYTES: int = 65536  # Send a frame early once this much output is collected
+    TERMINAL_HIGH_WATERMARK: int = 1048576  # Pause reading a terminal with this many unacknowledged bytes
+    TERMINAL_LOW_WATERMARK: int = 262144  # Resume once acknowledgements bring it down to this
+    TERMINAL_DETACH_GRACE: float = 300.0  # Seconds a terminal survives its client disconnecting, 0 closes it at once
+    TERMINAL_SCROLLBACK_BYTES: int = 65536  # Recent output kept per terminal to rebuild its screen on reattach
+    
+    # SSH connection pool
+    SSH_BACKEND: str = "asyncssh"  # "asyncssh" (asyncio-native) or "paramiko"; paramiko is used if asyncssh is not installed
+    SSH_POOL_MAX_CONNECTIONS: int = 200  # Idle connections beyond this are evicted least recently used first
+    SSH_POOL_IDLE_TIMEOUT: int = 300  # Close connections without open channels after this many seconds
+    SSH_POOL_HEALTH_CHECK_INTERVAL: int = 30  # Seconds between dead/idle connection sweeps
+    SSH_KEEPALIVE_INTERVAL: int = 30  # Transport keepalive interval (seconds, 0 disables)
+    SSH_MAX_CHANNELS_PER_HOST: int = 10  # Concurrent channels per host (sshd MaxSessions defaults to 10)
+    SSH_CHANNEL_WAIT_TIMEOUT: int = 10  # Seconds to wait for a free channel slot before failing
+    SSH_CONNECT_TIMEOUT: int = 10  # SSH connect/handshake timeout (seconds)
+    SSH_EXEC_TIMEOUT: int = 30  # Default deadline for a remote command (seconds)
+    SSH_EXEC_MAX_OUTPUT: int = 1048576  # Bytes of stdout/stderr kept per remote command
+    SSH_BREAKER_FAILURE_THRESHOLD: int = 3  # Consecutive connect failures before a host's circuit opens
+    SSH_BREAKER_BASE_BACKOFF: int = 5  # First open window (seconds), doubled per further failure
+    SSH_BREAKER_MAX_BACKOFF: int = 300  # Longest open window (seconds)
+    SSH_SKIP_OFFLINE_HOSTS: bool = True  # Don't dial devices the ping monitor reports offline
+    
+    # Blocking SSH work (paramiko backend): separate bounded thread pools
+    SSH_CONNECT_WORKERS: int = 8  # Threads for SSH connects/handshakes
+    SSH_CONNECT_QUEUE: int = 32  # Waiting connects beyond this are rejected
+    SSH_EXEC_WORKERS: int = 16  # Threads for command execution and SFTP metadata
+    SSH_EXEC_QUEUE: int = 64  # Waiting exec jobs beyond this are rejected
+    SSH_TRANSFER_WORKERS: int = 4  # Threads for SFTP file reads/writes
+    SSH_TRANSFER_QUEUE: int = 16  # Waiting transfers beyond this are rejected
+    
     # AI Configuration (optional)
     OPENAI_API_KEY: str = ""
     OLLAMA_BASE_URL: str = "http://localhost:11434"
@@ -7,8 +7,19 @@ from app.core.database import init_db
 from app.api.auth import router as auth_router
 from app.api.datacenter import router as datacenter_router
 from app.api.device_stats import router as device_stats_router
+from app.api.fleet import router as fleet_router
 from app.api.socket_handlers import sio
 from app.services.device_monitor import device_monitor
+from app.services.stats_publisher import stats_publisher
+from app.services.process_table import process_table_publisher
+from app.services.service_publisher import service_inventory_publisher
+from app.services.device_stats_service import device_stats_service
+from app.services.fleet_exec import fleet_executor
+from app.services.datacenter_stats import datacenter_stats_publisher
+from app.services.terminal_service import terminal_manager
+from app.services.ssh_pool import ssh_pool
+from app.services.executors import get_executor_stats, shutdown_executors
+from app.services.circuit_breaker import ssh_breakers
 
 # Import models so SQLAlchemy knows about them
 from app.models.user import User  # noqa: F401
@@ -33,6 +44,7 @@ app.add_middleware(
 app.include_router(auth_router)
 app.include_router(datacenter_router)
 app.include_router(device_stats_router)
+app.include_router(fleet_router)
 
 # Mount Socket.IO
 socket_app = socketio.ASGIApp(sio, app)
@@ -44,6 +56,13 @@ async def startup_event():
     await init_db()
     device_monitor.sio = sio  # Pass Socket.IO instance to monitor
     await device_monitor.start()
+    stats_publisher.sio = sio
+    process_table_publisher.sio = sio
+    service_inventory_publisher.sio = sio
+    datacenter_stats_publisher.sio = sio
+    device_stats_service.services_listener = service_inventory_publisher.services_changed
+    ssh_pool.start()
+    ssh_breakers.reachability = device_monitor.get_host_reachability  # Don't dial devices known offline
     print(f"🚀 {settings.APP_NAME} started successfully!")
 
 
@@ -51,6 +70,8 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on shutdown"""
     await device_monitor.stop()
+    await ssh_pool.stop()
+    shutdown_executors()
 
 
 @app.get("/")
@@ -63,4 +84,16 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "monitor": device_monitor.get_stats(),
+        "stats_streams": stats_publisher.get_stats(),
+        "process_tables": process_table_publisher.get_stats(),
+        "service_inventories": service_inventory_publisher.get_stats(),
+        "datacenter_stats": datacenter_stats_publisher.get_stats(),
+        "stats_caches": device_stats_service.get_cache_stats(),
+        "fleet_jobs": fleet_executor.get_stats(),
+        "terminals": terminal_manager.get_stats(),
+        "ssh_pool": ssh_pool.get_stats(),
+        "ssh_executors": get_executor_stats()
+    }
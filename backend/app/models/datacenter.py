@@ -31,6 +31,7 @@ class Device(Base):
     description = Column(Text, nullable=True)
     status = Column(String, default="offline")  # online, offline, error
     last_checked = Column(DateTime(timezone=True), nullable=True)
+    check_interval = Column(Integer, nullable=True)  # Ping interval in seconds, None = default
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
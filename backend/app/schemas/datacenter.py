@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 
@@ -27,6 +27,7 @@ class DeviceCreate(BaseModel):
     ssh_username: Optional[str] = None
     ssh_password: Optional[str] = None
     description: Optional[str] = None
+    check_interval: Optional[int] = Field(None, ge=1)  # seconds
     datacenter_id: int
 
 
@@ -38,6 +39,7 @@ class DeviceUpdate(BaseModel):
     ssh_username: Optional[str] = None
     ssh_password: Optional[str] = None
     description: Optional[str] = None
+    check_interval: Optional[int] = Field(None, ge=1)
     status: Optional[str] = None
 
 
@@ -50,6 +52,7 @@ class DeviceResponse(BaseModel):
     ssh_username: Optional[str]
     ssh_password: Optional[str] = None  # Include password for SSH connections
     description: Optional[str]
+    check_interval: Optional[int] = None
     status: str
     created_at: datetime
     updated_at: Optional[datetime]
@@ -0,0 +1,23 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+
+from app.core.config import settings
+
+
+class FleetExecRequest(BaseModel):
+    # Device selector: devices must match every given criterion
+    datacenter_ids: List[int] = []
+    device_types: List[str] = []  # pc, server, switch, ups
+    device_ids: List[int] = []
+    
+    # Exactly one of: a raw command, a service action or a process action
+    command: Optional[str] = None
+    service: Optional[str] = None
+    service_action: Optional[str] = None  # start, stop, restart, reload, status
+    pid: Optional[int] = None
+    process_action: Optional[str] = None  # kill, stop
+    
+    # Hosts run at once, default FLEET_EXEC_CONCURRENCY
+    concurrency: Optional[int] = Field(None, gt=0, le=settings.FLEET_EXEC_MAX_CONCURRENCY)
+    # Per-host deadline in seconds, default FLEET_EXEC_TIMEOUT
+    timeout: Optional[float] = Field(None, gt=0, le=settings.FLEET_EXEC_MAX_TIMEOUT)
@@ -0,0 +1,100 @@
+"""
+Per-host circuit breakers for SSH connects
+"""
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpen(Exception):
+    """Raised instead of dialing a host that is known to be unreachable"""
+
+
+class HostBreaker:
+    """Failure count and open deadline of one host"""
+
+    __slots__ = ('failures', 'open_until')
+
+    def __init__(self):
+        self.failures = 0
+        self.open_until = 0.0
+
+
+class CircuitBreakerRegistry:
+    """
+    Fails fast for hosts whose SSH connects keep failing.
+
+    After ``failure_threshold`` consecutive connect failures a host's breaker
+    opens for ``base_backoff`` seconds, doubling with every further failure
+    up to ``max_backoff``. Once the window passes the next connect is let
+    through as a trial; success closes the breaker. ``reachability`` can
+    report a host as known offline (from the ping monitor) so it is not
+    dialed at all, and a successful ping closes the breaker right away.
+    """
+
+    def __init__(self, failure_threshold: int = 3, base_backoff: float = 5,
+                 max_backoff: float = 300, skip_offline: bool = True):
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.skip_offline = skip_offline
+        self.reachability: Optional[Callable[[str], Optional[bool]]] = None
+        self.breakers: Dict[str, HostBreaker] = {}
+
+    def check(self, host: str):
+        """Raise CircuitOpen if ``host`` should not be dialed right now"""
+        if self.skip_offline and self.reachability and self.reachability(host) is False:
+            raise CircuitOpen(f"{host} is offline")
+
+        breaker = self.breakers.get(host)
+        if breaker is not None:
+            remaining = breaker.open_until - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpen(
+                    f"{host} unreachable after {breaker.failures} failed connects, "
+                    f"retrying in {remaining:.0f}s"
+                )
+
+    def record_success(self, host: str):
+        if self.breakers.pop(host, None) is not None:
+            logger.info(f"Circuit for {host} closed")
+
+    def record_failure(self, host: str):
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = self.breakers[host] = HostBreaker()
+        breaker.failures += 1
+
+        if breaker.failures >= self.failure_threshold:
+            backoff = min(
+                self.base_backoff * 2 ** (breaker.failures - self.failure_threshold),
+                self.max_backoff
+            )
+            breaker.open_until = time.monotonic() + backoff
+            logger.warning(f"Circuit for {host} open for {backoff:g}s after {breaker.failures} failures")
+
+    def record_ping_success(self, host: str):
+        """A successful ping proves the host is back; let the next connect through"""
+        if host in self.breakers:
+            self.record_success(host)
+
+    def get_stats(self) -> Dict:
+        """Counts only: this is served on the unauthenticated health endpoint"""
+        now = time.monotonic()
+        return {
+            "open": sum(1 for breaker in self.breakers.values() if breaker.open_until > now),
+            "failing": sum(1 for breaker in self.breakers.values() if breaker.failures)
+        }
+
+
+# Global SSH circuit breakers, consulted by the SSH pool and reset by the device monitor
+ssh_breakers = CircuitBreakerRegistry(
+    failure_threshold=settings.SSH_BREAKER_FAILURE_THRESHOLD,
+    base_backoff=settings.SSH_BREAKER_BASE_BACKOFF,
+    max_backoff=settings.SSH_BREAKER_MAX_BACKOFF,
+    skip_offline=settings.SSH_SKIP_OFFLINE_HOSTS
+)
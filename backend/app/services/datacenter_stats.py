@@ -0,0 +1,214 @@
+"""
+Service for collecting stats of every device in a datacenter at once
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.core.database import async_session
+from app.services.device_stats_service import device_stats_service
+from app.services.fleet_exec import FleetTarget, resolve_targets
+
+logger = logging.getLogger(__name__)
+
+
+def datacenter_stats_room(datacenter_id: int) -> str:
+    """Socket.IO room holding every client that watches a datacenter's stats"""
+    return f"datacenter_stats:{datacenter_id}"
+
+
+def aggregate_stats(results: Dict[str, Dict]) -> Dict:
+    """Datacenter totals over the devices that reported stats"""
+    reporting = [r for r in results.values() if r.get("stats")]
+    cpu = [r["stats"]["cpu"]["percent"] for r in reporting]
+    memory_total = sum(r["stats"]["memory"]["total"] for r in reporting)
+    memory_used = sum(r["stats"]["memory"]["used"] for r in reporting)
+    disk_total = sum(r["stats"]["disk"].get("total_kb", 0) for r in reporting)
+    disk_used = sum(r["stats"]["disk"].get("used_kb", 0) for r in reporting)
+    disk_available = sum(r["stats"]["disk"].get("available_kb", 0) for r in reporting)
+
+    busiest = max(reporting, key=lambda r: r["stats"]["cpu"]["percent"], default=None)
+    return {
+        "cpu": {
+            "average": round(sum(cpu) / len(cpu), 2) if cpu else 0,
+            "max": max(cpu, default=0),
+            "max_device_id": busiest["device_id"] if busiest else None
+        },
+        "memory": {
+            "total": memory_total,
+            "used": memory_used,
+            "percent": round(memory_used * 100 / memory_total, 2) if memory_total else 0
+        },
+        "disk": {
+            "total_kb": disk_total,
+            "used_kb": disk_used,
+            "percent": round(disk_used * 100 / (disk_used + disk_available), 2)
+            if disk_used + disk_available else 0
+        }
+    }
+
+
+class DatacenterStatsCollector:
+    """
+    Collects stats for many devices concurrently, within a deadline.
+
+    Devices with a cached sample younger than ``max_age`` (e.g. one with a
+    live dashboard stream) are answered from the cache. The rest are
+    fetched over the SSH pool, at most ``DATACENTER_STATS_CONCURRENCY`` at
+    a time across all requests. Devices still being fetched when the
+    deadline passes are reported as pending; their fetch carries on and
+    fills the cache, so the next request picks them up.
+    """
+
+    def __init__(self):
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[int, asyncio.Task] = {}
+
+    def _fetch(self, target: FleetTarget) -> asyncio.Task:
+        task = self._inflight.get(target.device_id)
+        if task is None:
+            task = asyncio.create_task(self._fetch_one(target))
+            self._inflight[target.device_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(target.device_id, None))
+        return task
+
+    async def _fetch_one(self, target: FleetTarget) -> Dict:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(settings.DATACENTER_STATS_CONCURRENCY)
+        async with self._slots:
+            return await device_stats_service.get_system_stats(
+                target.device_id, target.host, target.port, target.username, target.password
+            )
+
+    async def collect(self, datacenter_id: int, targets: List[FleetTarget],
+                      skipped: Optional[List[Dict]] = None, deadline: Optional[float] = None,
+                      max_age: Optional[float] = None) -> Dict:
+        deadline = settings.DATACENTER_STATS_DEADLINE if deadline is None else deadline
+        max_age = settings.DATACENTER_STATS_MAX_AGE if max_age is None else max_age
+        started = time.monotonic()
+
+        results: Dict[str, Dict] = {}
+        pending: Dict[asyncio.Task, FleetTarget] = {}
+        for target in targets:
+            cached = device_stats_service.stats_cache.peek(target.device_id, max_age)
+            if cached is not None:
+                results[str(target.device_id)] = {
+                    "device_id": target.device_id, "name": target.name,
+                    "status": "cached", "stats": cached
+                }
+            else:
+                pending[self._fetch(target)] = target
+
+        if pending:
+            # asyncio.wait leaves unfinished fetches running; they are not cancelled
+            done, _ = await asyncio.wait(list(pending), timeout=deadline)
+            for task, target in pending.items():
+                entry = {"device_id": target.device_id, "name": target.name}
+                if task not in done:
+                    entry["status"] = "pending"
+                elif task.exception() is not None:
+                    entry.update(status="error", error=str(task.exception()))
+                elif not task.result() or "error" in task.result():
+                    entry.update(status="error", error=(task.result() or {}).get("error", "No stats"))
+                else:
+                    entry.update(status="ok", stats=task.result())
+                results[str(target.device_id)] = entry
+
+        for device in skipped or []:
+            results[str(device["device_id"])] = {**device, "status": "unconfigured"}
+
+        counts: Dict[str, int] = {}
+        for entry in results.values():
+            counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+
+        return {
+            "datacenter_id": datacenter_id,
+            "collected_in": round(time.monotonic() - started, 3),
+            "complete": "pending" not in counts,
+            "counts": counts,
+            "aggregate": aggregate_stats(results),
+            "devices": results
+        }
+
+
+class DatacenterStatsPublisher:
+    """
+    Pushes datacenter stats to subscribed clients on a shared interval.
+
+    One collection loop runs per watched datacenter at the fastest interval
+    any subscriber asked for (no faster than DATACENTER_STATS_MIN_INTERVAL),
+    emitting ``datacenter_stats_update`` to the datacenter's stats room.
+    The device list is re-read every round so added devices show up.
+    """
+
+    def __init__(self, sio=None):
+        self.sio = sio
+        self.subscribers: Dict[int, Dict[str, float]] = {}  # datacenter -> sid -> interval
+        self.owners: Dict[int, int] = {}  # datacenter -> user id
+        self.tasks: Dict[int, asyncio.Task] = {}
+
+    async def subscribe(self, sid: str, datacenter_id: int, user_id: int, interval: float):
+        self.subscribers.setdefault(datacenter_id, {})[sid] = interval
+        self.owners[datacenter_id] = user_id
+        await self.sio.enter_room(sid, datacenter_stats_room(datacenter_id))
+        if datacenter_id not in self.tasks:
+            self.tasks[datacenter_id] = asyncio.create_task(self._publish(datacenter_id))
+        logger.info(f"Client {sid} subscribed to datacenter {datacenter_id} stats every {interval:g}s")
+
+    async def unsubscribe(self, sid: str, datacenter_id: int):
+        subscribers = self.subscribers.get(datacenter_id)
+        if not subscribers or sid not in subscribers:
+            return
+        del subscribers[sid]
+        await self.sio.leave_room(sid, datacenter_stats_room(datacenter_id))
+        if not subscribers:
+            del self.subscribers[datacenter_id]
+            self.owners.pop(datacenter_id, None)
+            task = self.tasks.pop(datacenter_id, None)
+            if task:
+                task.cancel()
+            logger.info(f"Stopped stats collection for datacenter {datacenter_id}")
+
+    async def unsubscribe_all(self, sid: str):
+        """Drop a disconnected client from every datacenter it watched"""
+        for datacenter_id in [
+            datacenter_id for datacenter_id, subscribers in self.subscribers.items()
+            if sid in subscribers
+        ]:
+            await self.unsubscribe(sid, datacenter_id)
+
+    async def _publish(self, datacenter_id: int):
+        room = datacenter_stats_room(datacenter_id)
+        try:
+            while datacenter_id in self.subscribers:
+                started = time.monotonic()
+                async with async_session() as db:
+                    targets, skipped = await resolve_targets(
+                        db, self.owners[datacenter_id], datacenter_ids=[datacenter_id]
+                    )
+                snapshot = await datacenter_stats.collect(datacenter_id, targets, skipped)
+                await self.sio.emit('datacenter_stats_update', snapshot, room=room)
+
+                interval = max(min(self.subscribers[datacenter_id].values()),
+                               settings.DATACENTER_STATS_MIN_INTERVAL)
+                await asyncio.sleep(max(interval - (time.monotonic() - started), 0))
+
+        except asyncio.CancelledError:
+            logger.debug(f"Stats collection for datacenter {datacenter_id} cancelled")
+        except Exception as e:
+            logger.error(f"Error collecting stats for datacenter {datacenter_id}: {e}")
+            self.tasks.pop(datacenter_id, None)
+
+    def get_stats(self) -> Dict:
+        """Counts only: this is served on the unauthenticated health endpoint"""
+        return {
+            "datacenters": len(self.subscribers),
+            "subscribers": sum(len(subscribers) for subscribers in self.subscribers.values())
+        }
+
+
+# Global instances
+datacenter_stats = DatacenterStatsCollector()
+datacenter_stats_publisher = DatacenterStatsPublisher()
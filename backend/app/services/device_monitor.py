@@ -1,21 +1,41 @@
 import asyncio
 import logging
 from datetime import datetime
-from typing import Dict, Set, Optional
+from typing import Dict, Set, Optional, List, Tuple
 import subprocess
 import platform
+import re
+import time
 
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import select
+from app.core.config import settings
 from app.core.database import async_session
 from app.models.datacenter import Device
+from app.services.icmp_probe import ICMPProber
+from app.services.probe_scheduler import ProbeScheduler, ProbeTarget
+from app.services.probe_workers import ProbeWorkerPool
+from app.services.status_writer import StatusWriteBehind
+from app.services.status_log import StatusChangeLog
+from app.services.latency_history import LatencyHistory
+from app.services.circuit_breaker import ssh_breakers
 
 logger = logging.getLogger(__name__)
 
+# Resolved once instead of on every ping
+IS_WINDOWS = platform.system().lower() == 'windows'
+
+# "time=0.045 ms" (Linux/macOS) or "time<1ms" (Windows)
+PING_TIME_PATTERN = re.compile(r'time[=<]\s*([\d.]+)\s*ms')
+
 # Will be set by main.py
 sio_instance = None
 
 
+def datacenter_room(datacenter_id: int) -> str:
+    """Socket.IO room for sessions allowed to see a datacenter's devices"""
+    return f"datacenter:{datacenter_id}"
+
+
 class DeviceMonitor:
     """Background service to monitor device status via ping"""
     
@@ -23,7 +43,37 @@ class DeviceMonitor:
         self.running = False
         self.monitored_devices: Set[int] = set()
         self.status_cache: Dict[int, str] = {}
+        self.device_datacenters: Dict[int, int] = {}
+        self.host_devices: Dict[str, Set[int]] = {}
+        self.latency = LatencyHistory(settings.MONITOR_LATENCY_SAMPLES)
         self.sio = sio
+        self.prober = ICMPProber()
+        self.scheduler = ProbeScheduler(
+            self._probe_batch,
+            self._handle_results,
+            default_interval=settings.MONITOR_CHECK_INTERVAL,
+            fast_recheck_interval=settings.MONITOR_FAST_RECHECK_INTERVAL,
+            fast_recheck_count=settings.MONITOR_FAST_RECHECK_COUNT,
+            backoff_after=settings.MONITOR_BACKOFF_AFTER,
+            max_backoff_factor=settings.MONITOR_MAX_BACKOFF_FACTOR,
+            lag_warning=settings.MONITOR_LAG_WARNING,
+            max_in_flight=settings.MONITOR_MAX_INFLIGHT_PROBES
+        )
+        self.workers: Optional[ProbeWorkerPool] = None
+        self.status_writer = StatusWriteBehind(
+            flush_interval=settings.MONITOR_STATUS_FLUSH_INTERVAL,
+            max_pending=settings.MONITOR_STATUS_FLUSH_BATCH
+        )
+        
+        # Sequenced change log and per-datacenter deltas waiting to be emitted
+        self.change_log = StatusChangeLog(settings.MONITOR_CHANGE_LOG_SIZE)
+        self._outbox: Dict[int, Dict[int, Dict]] = {}
+        self._outbox_from: Dict[int, int] = {}  # First sequence number each pending batch covers
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        
+        self._sync_requested = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
         
     async def start(self):
         """Start the monitoring service"""
@@ -32,83 +82,214 @@ class DeviceMonitor:
             
         self.running = True
         logger.info("Device monitoring service started")
+        self.status_writer.start()
         
-        # Start monitoring loop
-        asyncio.create_task(self._monitoring_loop())
+        # Probe either in worker processes or on this loop
+        if settings.MONITOR_WORKER_PROCESSES > 0:
+            self.workers = ProbeWorkerPool(settings.MONITOR_WORKER_PROCESSES, self._handle_results)
+            self.workers.start()
+        else:
+            self._tasks.append(asyncio.create_task(self.scheduler.run()))
+        
+        # Load the inventory, then let the scheduler dispatch probes as they fall due
+        await self._sync_devices()
+        self._tasks.append(asyncio.create_task(self._sync_loop()))
         
     async def stop(self):
         """Stop the monitoring service"""
         self.running = False
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self.workers:
+            await self.workers.stop()
+            self.workers = None
+        self.prober.close()
+        await self.status_writer.stop()
         logger.info("Device monitoring service stopped")
+    
+    def request_sync(self):
+        """Pick up inventory changes (added, edited or deleted devices) right away"""
+        self._sync_requested.set()
         
-    async def _monitoring_loop(self):
-        """Main monitoring loop - checks devices every 30 seconds"""
+    async def _sync_loop(self):
+        """Periodically reconcile the probe schedule with the database"""
         while self.running:
             try:
-                await self._check_all_devices()
-                await asyncio.sleep(30)  # Check every 30 seconds
+                await asyncio.wait_for(self._sync_requested.wait(), timeout=settings.MONITOR_SYNC_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._sync_requested.clear()
+            
+            try:
+                await self._sync_devices()
             except Exception as e:
-                logger.error(f"Error in monitoring loop: {e}", exc_info=True)
-                await asyncio.sleep(10)  # Wait before retrying
+                logger.error(f"Error syncing monitored devices: {e}", exc_info=True)
                 
-    async def _check_all_devices(self):
-        """Check status of all devices with IP addresses"""
+    async def _sync_devices(self):
+        """Load all devices with IP addresses into the scheduler"""
         async with async_session() as db:
+            result = await db.execute(
+                select(
+                    Device.id, Device.ip_address, Device.datacenter_id,
+                    Device.check_interval, Device.status
+                ).where(Device.ip_address != None, Device.ip_address != "")
+            )
+            rows = result.all()
+        
+        status_to_online = {"online": True, "offline": False}
+        devices = [
+            (row.id, row.ip_address, row.datacenter_id, row.check_interval,
+             status_to_online.get(row.status))
+            for row in rows
+        ]
+        if self.workers:
+            self.workers.assign(devices)
+        else:
+            self.scheduler.sync(devices)
+        self.latency.discard(self.monitored_devices - {row.id for row in rows})
+        self.monitored_devices = {row.id for row in rows}
+        self.device_datacenters = {row.id: row.datacenter_id for row in rows}
+        host_devices: Dict[str, Set[int]] = {}
+        for row in rows:
+            host_devices.setdefault(row.ip_address, set()).add(row.id)
+        self.host_devices = host_devices
+        for row in rows:
+            # Seed from the database so snapshots cover devices not probed yet
+            self.status_cache.setdefault(row.id, row.status)
+        
+    async def _probe_batch(self, targets: List[ProbeTarget]) -> Dict[int, Optional[float]]:
+        """Ping a batch of scheduled devices"""
+        rtts = await self._ping_devices([target.ip_address for target in targets])
+        return {target.device_id: rtts.get(target.ip_address) for target in targets}
+    
+    async def _ping_devices(self, ip_addresses: List[str]) -> Dict[str, Optional[float]]:
+        """
+        Ping a batch of addresses
+        
+        Uses the shared ICMP engine when available and falls back to one
+        ping subprocess per address for anything the engine cannot handle.
+        
+        Returns:
+            Mapping of IP address -> RTT in seconds, or None if unreachable
+        """
+        timeout = settings.MONITOR_PING_TIMEOUT
+        rtts: Dict[str, Optional[float]] = {}
+        
+        if settings.MONITOR_USE_ICMP_ENGINE and self.prober.available:
             try:
-                # Get all devices with IP addresses
-                result = await db.execute(
-                    select(Device).where(Device.ip_address != None, Device.ip_address != "")
-                )
-                devices = result.scalars().all()
-                
-                if not devices:
-                    return
-                    
-                logger.debug(f"Checking {len(devices)} devices")
-                
-                # Check each device
-                tasks = [self._check_device(db, device) for device in devices]
-                await asyncio.gather(*tasks, return_exceptions=True)
-                
-                await db.commit()
-                
+                rtts = await self.prober.ping_many(ip_addresses, timeout=timeout)
             except Exception as e:
-                logger.error(f"Error checking devices: {e}", exc_info=True)
-                await db.rollback()
-                
-    async def _check_device(self, db: AsyncSession, device: Device):
-        """Check a single device status"""
-        try:
-            if not device.ip_address:
-                return
-                
-            # Ping the device
-            is_online = await self._ping_device(device.ip_address)
-            
-            # Update status if changed
+                logger.error(f"ICMP engine failed, using ping subprocess: {e}", exc_info=True)
+        
+        remaining = [ip for ip in dict.fromkeys(ip_addresses) if ip not in rtts]
+        if remaining:
+            results = await asyncio.gather(*(self._ping_device(ip, timeout) for ip in remaining))
+            rtts.update(zip(remaining, results))
+        
+        return rtts
+    
+    async def _handle_results(self, outcomes: List[Tuple[ProbeTarget, bool, Optional[float], bool]]):
+        """Queue status changes from a probe batch for persistence and broadcast them"""
+        now = datetime.utcnow()
+        changes = []
+        for target, is_online, rtt, changed in outcomes:
             new_status = "online" if is_online else "offline"
-            if device.status != new_status:
-                logger.info(f"Device {device.name} ({device.ip_address}) status changed: {device.status} -> {new_status}")
-                device.status = new_status
-                device.last_checked = datetime.utcnow()
-                
-                # Cache the status
-                self.status_cache[device.id] = new_status
-                
-                # Emit real-time status update via Socket.IO
-                if self.sio:
-                    await self.sio.emit('device_status_update', {
-                        'device_id': device.id,
-                        'datacenter_id': device.datacenter_id,
-                        'status': new_status,
-                        'timestamp': datetime.utcnow().isoformat()
-                    })
-                
-        except Exception as e:
-            logger.error(f"Error checking device {device.id}: {e}")
-            device.status = "error"
+            self.status_cache[target.device_id] = new_status
+            self.latency.record(target.device_id, rtt)
+            if is_online:
+                ssh_breakers.record_ping_success(target.ip_address)
+            if changed:
+                logger.info(f"Device {target.device_id} ({target.ip_address}) status changed: {new_status}")
+                changes.append((target, new_status))
+            # Written in bulk later; no DB session is held here
+            self.status_writer.record(target.device_id, now, new_status if changed else None)
+        
+        if not changes:
+            return
+        
+        for target, new_status in changes:
+            delta = self.change_log.append(target.datacenter_id, target.device_id, new_status, now.isoformat())
+            # Only the latest change per device goes out in the next batch; the
+            # batch's from_seq..seq range still accounts for the ones dropped
+            self._outbox.setdefault(target.datacenter_id, {})[target.device_id] = delta
+            self._outbox_from.setdefault(target.datacenter_id, delta['seq'])
+        self._schedule_delta_flush()
+    
+    def _schedule_delta_flush(self):
+        """Coalesce changes for a short window, then emit one batch per datacenter"""
+        if self._flush_handle is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._flush_handle = loop.call_later(settings.MONITOR_DELTA_WINDOW, self._start_delta_flush)
+    
+    def _start_delta_flush(self):
+        self._flush_handle = None
+        self._flush_task = asyncio.create_task(self._flush_deltas())
+    
+    async def _flush_deltas(self):
+        """Emit pending deltas to each datacenter room"""
+        outbox, self._outbox = self._outbox, {}
+        outbox_from, self._outbox_from = self._outbox_from, {}
+        if not self.sio:
+            return
+        
+        for datacenter_id, deltas in outbox.items():
+            try:
+                await self.sio.emit('device_status_batch', {
+                    'epoch': self.change_log.epoch,
+                    'datacenter_id': datacenter_id,
+                    'from_seq': outbox_from[datacenter_id],
+                    'seq': self.change_log.latest_seq(datacenter_id),
+                    'deltas': sorted(deltas.values(), key=lambda delta: delta['seq'])
+                }, room=datacenter_room(datacenter_id))
+            except Exception as e:
+                logger.error(f"Error emitting status batch for datacenter {datacenter_id}: {e}")
+    
+    def get_resync(self, datacenter_ids: List[int], epoch: Optional[str],
+                   last_seqs: Dict[int, int]) -> Dict:
+        """
+        Catch-up payload for a reconnecting client
+        
+        Returns the missed deltas per datacenter, or a compact snapshot of
+        [device_id, status] pairs when the client is from another epoch, has
+        never synced, or the log has rolled past its last sequence number.
+        """
+        members: Dict[int, List[int]] = {}
+        for device_id, datacenter_id in self.device_datacenters.items():
+            members.setdefault(datacenter_id, []).append(device_id)
+        
+        datacenters = []
+        for datacenter_id in datacenter_ids:
+            entry = {'datacenter_id': datacenter_id, 'seq': self.change_log.latest_seq(datacenter_id)}
+            last_seq = last_seqs.get(datacenter_id)
+            deltas = None
+            if epoch == self.change_log.epoch and last_seq is not None:
+                deltas = self.change_log.since(datacenter_id, last_seq)
             
-    async def _ping_device(self, ip_address: str, timeout: int = 2) -> bool:
+            if deltas is not None:
+                entry['deltas'] = deltas
+            else:
+                entry['snapshot'] = [
+                    [device_id, self.status_cache[device_id]]
+                    for device_id in members.get(datacenter_id, [])
+                    if device_id in self.status_cache
+                ]
+            datacenters.append(entry)
+        
+        return {'epoch': self.change_log.epoch, 'datacenters': datacenters}
+    
+    def get_stats(self) -> Dict:
+        """Monitoring telemetry, including scheduler lag"""
+        if self.workers:
+            return {"running": self.running, "mode": "workers", **self.workers.get_stats()}
+        return {
+            "running": self.running,
+            "mode": "in-process",
+            "scheduler": self.scheduler.get_stats()
+        }
+            
+    async def _ping_device(self, ip_address: str, timeout: int = 2) -> Optional[float]:
         """
         Ping a device to check if it's reachable
         
@@ -117,15 +298,17 @@ class DeviceMonitor:
             timeout: Timeout in seconds
             
         Returns:
-            True if device is reachable, False otherwise
+            RTT in seconds if device is reachable, None otherwise
         """
         try:
+            started = time.monotonic()
+            
             # Determine ping command based on OS
-            param = '-n' if platform.system().lower() == 'windows' else '-c'
-            wait_param = '-w' if platform.system().lower() == 'windows' else '-W'
+            param = '-n' if IS_WINDOWS else '-c'
+            wait_param = '-w' if IS_WINDOWS else '-W'
             
             # Build ping command
-            command = ['ping', param, '1', wait_param, str(timeout * 1000) if platform.system().lower() == 'windows' else str(timeout), ip_address]
+            command = ['ping', param, '1', wait_param, str(timeout * 1000) if IS_WINDOWS else str(timeout), ip_address]
             
             # Execute ping in subprocess
             process = await asyncio.create_subprocess_exec(
@@ -140,15 +323,32 @@ class DeviceMonitor:
             )
             
             # Check return code
-            return process.returncode == 0
+            if process.returncode != 0:
+                return None
+            
+            # Prefer the RTT ping reports; fall back to the elapsed time
+            match = PING_TIME_PATTERN.search(stdout.decode('utf-8', errors='ignore'))
+            return float(match.group(1)) / 1000 if match else time.monotonic() - started
             
         except asyncio.TimeoutError:
             logger.debug(f"Ping timeout for {ip_address}")
-            return False
+            return None
         except Exception as e:
             logger.error(f"Error pinging {ip_address}: {e}")
-            return False
+            return None
             
+    def get_host_reachability(self, host: str) -> Optional[bool]:
+        """
+        Whether pings reach a host: True if any device at that address is
+        online, False if all are offline, None if it is not monitored yet
+        """
+        statuses = {self.status_cache.get(device_id) for device_id in self.host_devices.get(host, ())}
+        if "online" in statuses:
+            return True
+        if statuses == {"offline"}:
+            return False
+        return None
+    
     def get_device_status(self, device_id: int) -> str:
         """Get cached status for a device"""
         return self.status_cache.get(device_id, "unknown")
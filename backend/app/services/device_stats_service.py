@@ -2,10 +2,17 @@
 Service for collecting device statistics via SSH
 """
 import asyncio
-import paramiko
 import logging
-from typing import Dict, Optional, List
-import json
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, List, Union
+
+from app.core.config import settings
+from app.services.remote_actions import process_command, service_command
+from app.services.remote_exec import ExecResult, execute
+from app.services.request_cache import SingleFlightCache
+from app.services.service_inventory import SERVICE_INVENTORY_COMMAND, parse_service_inventory
+from app.services.ssh_pool import ssh_pool
+from app.services.ssh_transport import SSHConnection, SSHProcess
+from app.services.stats_collector import SAMPLE_SCRIPT, StatsCollector, parse_sample, stream_script
 
 logger = logging.getLogger(__name__)
 
@@ -14,177 +21,223 @@ class DeviceStatsService:
     """Service to collect system stats from remote devices via SSH"""
     
     def __init__(self):
-        self.active_connections: Dict[int, paramiko.SSHClient] = {}
+        self.collector = StatsCollector()
+        # Concurrent identical requests share one remote call; results are
+        # briefly cached and served stale while a refresh runs
+        self.stats_cache = SingleFlightCache(
+            "stats", settings.STATS_CACHE_TTL, settings.STATS_CACHE_STALE,
+            cacheable=lambda stats: bool(stats) and 'error' not in stats
+        )
+        self.services_cache = SingleFlightCache(
+            "services", settings.SERVICES_CACHE_TTL, settings.SERVICES_CACHE_STALE,
+            cacheable=lambda services: services is not None
+        )
+        self.processes_cache = SingleFlightCache(
+            "processes", settings.PROCESSES_CACHE_TTL, settings.PROCESSES_CACHE_STALE,
+            # An empty list is what a failed fetch returns
+            cacheable=lambda processes: bool(processes)
+        )
+        # Called with (device_id, services) whenever a fresh inventory is fetched
+        self.services_listener: Optional[Callable[[int, List[Dict]], Awaitable[None]]] = None
     
     async def get_ssh_connection(self, device_id: int, host: str, port: int, 
-                                  username: str, password: str) -> Optional[paramiko.SSHClient]:
-        """Get or create SSH connection for a device"""
+                                  username: str, password: str) -> Optional[SSHConnection]:
+        """Borrow the shared pooled SSH connection for a device"""
         try:
-            # Check if connection exists and is active
-            if device_id in self.active_connections:
-                client = self.active_connections[device_id]
-                try:
-                    # Test if connection is alive
-                    transport = client.get_transport()
-                    if transport and transport.is_active():
-                        return client
-                    else:
-                        # Connection is dead, remove it
-                        del self.active_connections[device_id]
-                except:
-                    del self.active_connections[device_id]
-            
-            # Create new connection
-            client = paramiko.SSHClient()
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: client.connect(
-                    hostname=host,
-                    port=port,
-                    username=username,
-                    password=password,
-                    timeout=10,
-                    look_for_keys=False,
-                    allow_agent=False
-                )
-            )
-            
-            self.active_connections[device_id] = client
-            logger.info(f"SSH connection established for device {device_id}")
-            return client
-            
+            return await ssh_pool.get_client(host, port, username, password)
         except Exception as e:
             logger.error(f"Failed to connect to device {device_id}: {e}")
             return None
     
-    async def execute_command(self, client: paramiko.SSHClient, command: str) -> str:
-        """Execute command via SSH and return output"""
+    async def execute_command(self, client: SSHConnection, command: str,
+                              timeout: Optional[float] = None,
+                              max_output: Optional[int] = None) -> ExecResult:
+        """Execute command via SSH with a deadline and capped output"""
         try:
-            stdin, stdout, stderr = await asyncio.get_event_loop().run_in_executor(
-                None,
-                client.exec_command,
-                command
-            )
-            
-            output = await asyncio.get_event_loop().run_in_executor(
-                None,
-                stdout.read
-            )
-            
-            return output.decode('utf-8', errors='ignore')
+            async with ssh_pool.channel_slot(client):
+                return await execute(client, command, timeout, max_output)
         except Exception as e:
             logger.error(f"Command execution failed: {e}")
-            return ""
+            return ExecResult(None, b"", str(e).encode())
     
     async def get_system_stats(self, device_id: int, host: str, port: int, 
                                 username: str, password: str) -> Dict:
         """Get comprehensive system statistics"""
+        return await self.stats_cache.get(
+            device_id,
+            lambda: self._fetch_system_stats(device_id, host, port, username, password)
+        )
+    
+    async def _fetch_system_stats(self, device_id: int, host: str, port: int, 
+                                  username: str, password: str) -> Dict:
         client = await self.get_ssh_connection(device_id, host, port, username, password)
         
         if not client:
             return {"error": "Failed to connect to device"}
         
         try:
-            # Get CPU usage
-            cpu_command = "top -bn1 | grep 'Cpu(s)' | sed 's/.*, *\\([0-9.]*\\)%* id.*/\\1/' | awk '{print 100 - $1}'"
-            cpu_output = await self.execute_command(client, cpu_command)
-            
-            # Get memory usage
-            mem_command = "free -m | awk 'NR==2{printf \"{\\\"total\\\":%s,\\\"used\\\":%s,\\\"free\\\":%s,\\\"percent\\\":%.2f}\", $2,$3,$4,$3*100/$2 }'"
-            mem_output = await self.execute_command(client, mem_command)
+            # One round trip: /proc/stat, /proc/meminfo and statvfs in a single JSON line
+            result = await self.execute_command(client, SAMPLE_SCRIPT)
+            sample = parse_sample(result.text)
+            if sample is None:
+                return {"error": "Failed to read system stats"}
             
-            # Get disk usage
-            disk_command = "df -h / | awk 'NR==2{printf \"{\\\"total\\\":\\\"%s\\\",\\\"used\\\":\\\"%s\\\",\\\"available\\\":\\\"%s\\\",\\\"percent\\\":\\\"%s\\\"}\", $2,$3,$4,$5}'"
-            disk_output = await self.execute_command(client, disk_command)
-            
-            # Parse results
-            try:
-                cpu_percent = float(cpu_output.strip()) if cpu_output.strip() else 0.0
-            except:
-                cpu_percent = 0.0
-            
-            try:
-                memory = json.loads(mem_output.strip()) if mem_output.strip() else {}
-            except:
-                memory = {"total": 0, "used": 0, "free": 0, "percent": 0}
-            
-            try:
-                disk = json.loads(disk_output.strip()) if disk_output.strip() else {}
-            except:
-                disk = {"total": "0G", "used": "0G", "available": "0G", "percent": "0%"}
-            
-            return {
-                "cpu": {
-                    "percent": round(cpu_percent, 2)
-                },
-                "memory": memory,
-                "disk": disk
-            }
+            return self.collector.build_stats(device_id, sample)
             
         except Exception as e:
             logger.error(f"Failed to get stats for device {device_id}: {e}")
             return {"error": str(e)}
     
+    async def _iter_lines(self, process: SSHProcess) -> AsyncIterator[str]:
+        """Yield complete output lines from a remote process as they arrive"""
+        buffer = b""
+        while True:
+            data = await process.read()
+            if not data:
+                return
+            buffer += data
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                yield line.decode('utf-8', errors='ignore')
+    
+    async def stream_lines(self, device_id: int, host: str, port: int,
+                           username: str, password: str, command: str,
+                           label: str = "Stream") -> AsyncIterator[Union[str, Dict]]:
+        """
+        Run a long-lived command on the device and yield its output lines
+        
+        The command holds one channel slot for as long as it runs. If the
+        channel or connection drops it is re-established with backoff;
+        failures are yielded as ``{"error": ...}`` so callers can surface
+        them without the stream ending.
+        """
+        backoff = 1
+        
+        while True:
+            client = await self.get_ssh_connection(device_id, host, port, username, password)
+            if not client:
+                yield {"error": "Failed to connect to device"}
+            else:
+                process = None
+                slot_held = False
+                try:
+                    await ssh_pool.acquire_slot(client)
+                    slot_held = True
+                    process = await client.start(command)
+                    
+                    async for line in self._iter_lines(process):
+                        backoff = 1
+                        yield line
+                    
+                    logger.info(f"{label} for device {device_id} ended, reconnecting")
+                except Exception as e:
+                    logger.error(f"{label} for device {device_id} failed: {e}")
+                    yield {"error": str(e)}
+                finally:
+                    if process is not None:
+                        process.close()
+                    if slot_held:
+                        ssh_pool.release_slot(client)
+            
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+    
+    async def stream_system_stats(self, device_id: int, host: str, port: int,
+                                  username: str, password: str,
+                                  interval: float = 3.0, cache: bool = False) -> AsyncIterator[Dict]:
+        """
+        Stream system statistics from one long-lived sampling channel
+        
+        A sampling loop runs on the device and writes a JSON line every
+        ``interval`` seconds, which is parsed as it arrives. Pass ``cache``
+        only when the connection is the device's stored one: samples then
+        also answer one-off stats requests, which other users read.
+        """
+        async for line in self.stream_lines(
+            device_id, host, port, username, password, stream_script(interval), "Stats stream"
+        ):
+            if isinstance(line, dict):
+                yield line
+                continue
+            sample = parse_sample(line)
+            if sample is not None:
+                stats = self.collector.build_stats(device_id, sample, consumer="stream")
+                if cache:
+                    self.stats_cache.put(device_id, stats)
+                yield stats
+    
     async def get_services(self, device_id: int, host: str, port: int, 
                            username: str, password: str) -> List[Dict]:
-        """Get list of systemd services"""
+        """Get the device's systemd service inventory"""
+        services = await self.services_cache.get(
+            device_id,
+            lambda: self._fetch_services(device_id, host, port, username, password)
+        )
+        return services if services is not None else []
+    
+    async def _fetch_services(self, device_id: int, host: str, port: int, 
+                              username: str, password: str) -> Optional[List[Dict]]:
         client = await self.get_ssh_connection(device_id, host, port, username, password)
         
         if not client:
-            return []
+            return None
         
         try:
-            # Get systemd services
-            command = "systemctl list-units --type=service --all --no-pager --no-legend | awk '{print $1,$2,$3,$4}' | head -200"
-            output = await self.execute_command(client, command)
-            
-            services = []
-            for line in output.strip().split('\n'):
-                if line.strip():
-                    parts = line.split(None, 3)
-                    if len(parts) >= 3:
-                        services.append({
-                            "name": parts[0].replace('.service', ''),
-                            "load": parts[1] if len(parts) > 1 else "unknown",
-                            "active": parts[2] if len(parts) > 2 else "unknown",
-                            "sub": parts[3] if len(parts) > 3 else "unknown"
-                        })
+            # Loaded units and unit file (enabled) states in one round trip
+            result = await self.execute_command(client, SERVICE_INVENTORY_COMMAND)
+            if not result.ok:
+                logger.warning(f"Listing services on device {device_id} failed: {result.error_text}")
+                if not result.stdout:
+                    return None
             
+            services = parse_service_inventory(result.text)
+            if self.services_listener:
+                await self.services_listener(device_id, services)
             return services
             
         except Exception as e:
             logger.error(f"Failed to get services for device {device_id}: {e}")
-            return []
+            return None
     
     async def manage_service(self, device_id: int, host: str, port: int, 
                             username: str, password: str, service_name: str, 
                             action: str) -> Dict:
-        """Start, stop, or restart a service"""
+        """
+        Start, stop, restart or reload a service
+        
+        Raises ValueError for an unknown action or an invalid unit name.
+        """
+        command = service_command(service_name, action)
         client = await self.get_ssh_connection(device_id, host, port, username, password)
         
         if not client:
             return {"success": False, "error": "Failed to connect"}
         
         try:
-            if action not in ['start', 'stop', 'restart', 'status']:
-                return {"success": False, "error": "Invalid action"}
-            
-            command = f"sudo systemctl {action} {service_name}"
-            output = await self.execute_command(client, command)
+            result = await self.execute_command(client, command)
             
             # Get updated status
-            status_cmd = f"systemctl status {service_name} --no-pager | head -5"
-            status_output = await self.execute_command(client, status_cmd)
+            status_cmd = f"{service_command(service_name, 'status')} | head -5"
+            status_result = await self.execute_command(client, status_cmd)
+            
+            # Refetch the inventory so subscribers receive the changed unit
+            self.services_cache.invalidate(device_id)
+            services = await self.get_services(device_id, host, port, username, password)
             
-            return {
-                "success": True,
+            response = {
+                "success": result.ok,
                 "action": action,
                 "service": service_name,
-                "output": output,
-                "status": status_output
+                "exit_status": result.exit_status,
+                "output": result.text,
+                "status": status_result.text,
+                "unit": next((unit for unit in services if unit["name"] == service_name), None)
             }
+            if not result.ok:
+                response["error"] = result.error_text or (
+                    "Command timed out" if result.timed_out else f"Exit status {result.exit_status}"
+                )
+            return response
             
         except Exception as e:
             logger.error(f"Failed to manage service {service_name}: {e}")
@@ -193,6 +246,13 @@ class DeviceStatsService:
     async def get_processes(self, device_id: int, host: str, port: int, 
                            username: str, password: str) -> List[Dict]:
         """Get list of running processes"""
+        return await self.processes_cache.get(
+            device_id,
+            lambda: self._fetch_processes(device_id, host, port, username, password)
+        )
+    
+    async def _fetch_processes(self, device_id: int, host: str, port: int, 
+                               username: str, password: str) -> List[Dict]:
         client = await self.get_ssh_connection(device_id, host, port, username, password)
         
         if not client:
@@ -201,10 +261,12 @@ class DeviceStatsService:
         try:
             # Get top processes by CPU/Memory
             command = "ps aux --sort=-%cpu | head -201 | tail -200 | awk '{printf \"%s|%s|%s|%s|%s\\n\", $2, $1, $3, $4, substr($0, index($0,$11))}'"
-            output = await self.execute_command(client, command)
+            result = await self.execute_command(client, command)
+            if not result.ok:
+                logger.warning(f"Listing processes on device {device_id} failed: {result.error_text}")
             
             processes = []
-            for line in output.strip().split('\n'):
+            for line in result.text.strip().split('\n'):
                 if line.strip():
                     parts = line.split('|')
                     if len(parts) >= 5:
@@ -225,46 +287,42 @@ class DeviceStatsService:
     async def manage_process(self, device_id: int, host: str, port: int, 
                             username: str, password: str, pid: str, 
                             action: str) -> Dict:
-        """Kill or stop a process"""
+        """
+        Kill or stop a process
+        
+        Raises ValueError for an unknown action or an invalid pid.
+        """
+        command = process_command(pid, action)
         client = await self.get_ssh_connection(device_id, host, port, username, password)
         
         if not client:
             return {"success": False, "error": "Failed to connect"}
         
         try:
-            if action == "kill":
-                command = f"sudo kill -9 {pid}"
-            elif action == "stop":
-                command = f"sudo kill -SIGTERM {pid}"
-            else:
-                return {"success": False, "error": "Invalid action"}
-            
-            output = await self.execute_command(client, command)
+            result = await self.execute_command(client, command)
+            self.processes_cache.invalidate(device_id)
             
-            return {
-                "success": True,
+            response = {
+                "success": result.ok,
                 "action": action,
                 "pid": pid,
-                "output": output
+                "exit_status": result.exit_status,
+                "output": result.text
             }
+            if not result.ok:
+                response["error"] = result.error_text or f"Exit status {result.exit_status}"
+            return response
             
         except Exception as e:
             logger.error(f"Failed to manage process {pid}: {e}")
             return {"success": False, "error": str(e)}
+
     
-    def close_connection(self, device_id: int):
-        """Close SSH connection for a device"""
-        if device_id in self.active_connections:
-            try:
-                self.active_connections[device_id].close()
-            except:
-                pass
-            del self.active_connections[device_id]
-    
-    def close_all_connections(self):
-        """Close all SSH connections"""
-        for device_id in list(self.active_connections.keys()):
-            self.close_connection(device_id)
+    def get_cache_stats(self) -> Dict:
+        return {
+            cache.name: cache.get_stats()
+            for cache in (self.stats_cache, self.services_cache, self.processes_cache)
+        }
 
 
 # Global instance
@@ -0,0 +1,110 @@
+"""
+Bounded thread pools for blocking SSH work, one per subsystem
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorSaturated(Exception):
+    """Raised instead of queueing when an executor's backlog is full"""
+
+
+class BoundedExecutor:
+    """
+    A sized ThreadPoolExecutor that refuses work beyond ``max_queue`` waiting jobs.
+
+    Keeping connects, command execution and SFTP transfers on separate pools
+    means a slow connect to a dead host or a stalled transfer can only
+    exhaust its own threads. Queue depth, active threads and time spent
+    waiting for a thread are tracked for the health endpoint.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"ssh-{name}")
+        self._lock = threading.Lock()
+
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.avg_wait = 0.0
+        self.max_wait = 0.0
+
+    async def run(self, func: Callable, *args):
+        """Run ``func(*args)`` on this pool, or raise ExecutorSaturated if the backlog is full"""
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise ExecutorSaturated(
+                    f"{self.name} executor saturated ({self.queued} jobs waiting)"
+                )
+            self.queued += 1
+        enqueued = time.monotonic()
+
+        def job():
+            waited = time.monotonic() - enqueued
+            with self._lock:
+                self.queued -= 1
+                self.active += 1
+                # Exponentially weighted so the gauge follows recent load
+                self.avg_wait += (waited - self.avg_wait) * 0.1
+                self.max_wait = max(self.max_wait, waited)
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.completed += 1
+
+        return await asyncio.get_event_loop().run_in_executor(self._executor, job)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self.queued,
+                "active": self.active,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_seconds": round(self.avg_wait, 4),
+                "max_wait_seconds": round(self.max_wait, 4),
+            }
+
+
+# Global executor instances
+connect_executor = BoundedExecutor(
+    "connect", settings.SSH_CONNECT_WORKERS, settings.SSH_CONNECT_QUEUE
+)
+exec_executor = BoundedExecutor(
+    "exec", settings.SSH_EXEC_WORKERS, settings.SSH_EXEC_QUEUE
+)
+transfer_executor = BoundedExecutor(
+    "transfer", settings.SSH_TRANSFER_WORKERS, settings.SSH_TRANSFER_QUEUE
+)
+
+
+def get_executor_stats() -> Dict:
+    return {
+        executor.name: executor.get_stats()
+        for executor in (connect_executor, exec_executor, transfer_executor)
+    }
+
+
+def shutdown_executors():
+    for executor in (connect_executor, exec_executor, transfer_executor):
+        executor.shutdown()
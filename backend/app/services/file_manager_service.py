@@ -2,12 +2,16 @@
 Service for managing remote files via SSH
 """
 import asyncio
-import paramiko
 import logging
+import stat
 from typing import Dict, Optional, List
 import os
 from pathlib import Path
 
+from app.services.remote_exec import execute
+from app.services.ssh_pool import ssh_pool
+from app.services.ssh_transport import SFTPSession, SSHConnection
+
 logger = logging.getLogger(__name__)
 
 
@@ -15,71 +19,75 @@ class FileManagerService:
     """Service to manage files on remote devices via SSH"""
     
     def __init__(self):
-        self.active_connections: Dict[str, paramiko.SSHClient] = {}
-        self.sftp_clients: Dict[str, paramiko.SFTPClient] = {}
+        # connection_key (sid:files:device_id) -> pooled client it is using
+        self.active_connections: Dict[str, SSHConnection] = {}
+        # One SFTP session per pooled transport, shared by every connection_key on it
+        self.sftp_clients: Dict[SSHConnection, SFTPSession] = {}
+        self.sftp_users: Dict[SSHConnection, set] = {}
+        self._sftp_locks: Dict[SSHConnection, asyncio.Lock] = {}
     
     async def get_ssh_connection(self, connection_key: str, host: str, port: int, 
-                                  username: str, password: str) -> Optional[paramiko.SSHClient]:
-        """Get or create SSH connection for file operations"""
+                                  username: str, password: str) -> Optional[SSHConnection]:
+        """Borrow the shared pooled SSH connection for file operations"""
         try:
-            # Check if connection exists and is active
-            if connection_key in self.active_connections:
-                client = self.active_connections[connection_key]
-                try:
-                    transport = client.get_transport()
-                    if transport and transport.is_active():
-                        return client
-                    else:
-                        # Connection is dead, remove it
-                        del self.active_connections[connection_key]
-                        if connection_key in self.sftp_clients:
-                            del self.sftp_clients[connection_key]
-                except:
-                    del self.active_connections[connection_key]
-                    if connection_key in self.sftp_clients:
-                        del self.sftp_clients[connection_key]
-            
-            # Create new connection
-            client = paramiko.SSHClient()
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: client.connect(
-                    hostname=host,
-                    port=port,
-                    username=username,
-                    password=password,
-                    timeout=10,
-                    look_for_keys=False,
-                    allow_agent=False
-                )
-            )
-            
-            self.active_connections[connection_key] = client
-            logger.info(f"SSH connection established for file manager: {connection_key}")
-            return client
-            
+            client = await ssh_pool.get_client(host, port, username, password)
         except Exception as e:
             logger.error(f"Failed to connect for file operations {connection_key}: {e}")
             return None
+        
+        previous = self.active_connections.get(connection_key)
+        if previous is not None and previous is not client:
+            # The pool reconnected; let go of the SFTP session on the old transport
+            self._release_sftp(connection_key, previous)
+        self.active_connections[connection_key] = client
+        return client
     
-    async def get_sftp_client(self, connection_key: str, ssh_client: paramiko.SSHClient) -> Optional[paramiko.SFTPClient]:
-        """Get or create SFTP client"""
+    async def get_sftp_client(self, connection_key: str, ssh_client: SSHConnection) -> Optional[SFTPSession]:
+        """Get or create the SFTP session shared on this connection"""
         try:
-            if connection_key in self.sftp_clients:
-                return self.sftp_clients[connection_key]
-            
-            sftp = await asyncio.get_event_loop().run_in_executor(
-                None,
-                ssh_client.open_sftp
-            )
-            self.sftp_clients[connection_key] = sftp
-            return sftp
+            # Concurrent requests on the same connection share one SFTP session
+            async with self._sftp_locks.setdefault(ssh_client, asyncio.Lock()):
+                sftp = self.sftp_clients.get(ssh_client)
+                if sftp is not None and sftp.closed:
+                    self._close_sftp(ssh_client)
+                    sftp = None
+                
+                if sftp is None:
+                    await ssh_pool.acquire_slot(ssh_client)
+                    try:
+                        sftp = await ssh_client.open_sftp()
+                    except Exception:
+                        ssh_pool.release_slot(ssh_client)
+                        raise
+                    self.sftp_clients[ssh_client] = sftp
+                
+                self.sftp_users.setdefault(ssh_client, set()).add(connection_key)
+                return sftp
         except Exception as e:
             logger.error(f"Failed to open SFTP: {e}")
             return None
     
+    def _close_sftp(self, ssh_client: SSHConnection):
+        sftp = self.sftp_clients.pop(ssh_client, None)
+        self.sftp_users.pop(ssh_client, None)
+        lock = self._sftp_locks.get(ssh_client)
+        if lock is not None and not lock.locked():
+            del self._sftp_locks[ssh_client]
+        if sftp is not None:
+            try:
+                sftp.close()
+            except Exception:
+                pass
+            ssh_pool.release_slot(ssh_client)
+    
+    def _release_sftp(self, connection_key: str, ssh_client: SSHConnection):
+        users = self.sftp_users.get(ssh_client)
+        if users is None:
+            return
+        users.discard(connection_key)
+        if not users:
+            self._close_sftp(ssh_client)
+    
     async def list_directory(self, connection_key: str, host: str, port: int, 
                             username: str, password: str, path: str = '/') -> Dict:
         """List files and directories in a path"""
@@ -94,32 +102,28 @@ class FileManagerService:
                 return {"error": "Failed to open SFTP"}
             
             # List directory contents
-            def list_dir():
-                try:
-                    items = []
-                    for item in sftp.listdir_attr(path):
-                        item_path = os.path.join(path, item.filename)
-                        is_dir = paramiko.sftp_attr.S_ISDIR(item.st_mode)
-                        is_link = paramiko.sftp_attr.S_ISLNK(item.st_mode)
-                        
-                        items.append({
-                            'name': item.filename,
-                            'path': item_path,
-                            'is_directory': is_dir,
-                            'is_link': is_link,
-                            'size': item.st_size if not is_dir else 0,
-                            'modified': item.st_mtime,
-                            'permissions': oct(item.st_mode)[-3:],
-                        })
+            items = []
+            try:
+                for item in await sftp.listdir_attr(path):
+                    item_path = os.path.join(path, item.filename)
+                    is_dir = stat.S_ISDIR(item.st_mode)
+                    is_link = stat.S_ISLNK(item.st_mode)
                     
-                    # Sort: directories first, then files
-                    items.sort(key=lambda x: (not x['is_directory'], x['name'].lower()))
-                    return items
-                except Exception as e:
-                    logger.error(f"Error listing directory {path}: {e}")
-                    return []
-            
-            items = await asyncio.get_event_loop().run_in_executor(None, list_dir)
+                    items.append({
+                        'name': item.filename,
+                        'path': item_path,
+                        'is_directory': is_dir,
+                        'is_link': is_link,
+                        'size': item.st_size if not is_dir else 0,
+                        'modified': item.st_mtime,
+                        'permissions': oct(item.st_mode)[-3:],
+                    })
+                
+                # Sort: directories first, then files
+                items.sort(key=lambda x: (not x['is_directory'], x['name'].lower()))
+            except Exception as e:
+                logger.error(f"Error listing directory {path}: {e}")
+                items = []
             
             return {
                 'path': path,
@@ -143,27 +147,16 @@ class FileManagerService:
             if not sftp:
                 return {"error": "Failed to open SFTP"}
             
-            def read_file_content():
-                try:
-                    with sftp.open(file_path, 'r') as f:
-                        content = f.read()
-                        # Try to decode as UTF-8
-                        try:
-                            return content.decode('utf-8')
-                        except UnicodeDecodeError:
-                            # If not UTF-8, return base64 for binary files
-                            import base64
-                            return {
-                                'binary': True,
-                                'content': base64.b64encode(content).decode('ascii')
-                            }
-                except Exception as e:
-                    logger.error(f"Error reading file {file_path}: {e}")
-                    raise e
-            
-            content = await asyncio.get_event_loop().run_in_executor(None, read_file_content)
+            try:
+                data = await sftp.read_bytes(file_path)
+            except Exception as e:
+                logger.error(f"Error reading file {file_path}: {e}")
+                raise e
             
-            if isinstance(content, dict) and content.get('binary'):
+            # Try to decode as UTF-8
+            try:
+                content = data.decode('utf-8')
+            except UnicodeDecodeError:
                 return {
                     'path': file_path,
                     'binary': True,
@@ -193,19 +186,14 @@ class FileManagerService:
             if not sftp:
                 return {"error": "Failed to open SFTP"}
             
-            def write_file_content():
-                try:
-                    with sftp.open(file_path, 'w') as f:
-                        f.write(content.encode('utf-8'))
-                    return True
-                except Exception as e:
-                    logger.error(f"Error writing file {file_path}: {e}")
-                    raise e
-            
-            success = await asyncio.get_event_loop().run_in_executor(None, write_file_content)
+            try:
+                await sftp.write_bytes(file_path, content.encode('utf-8'))
+            except Exception as e:
+                logger.error(f"Error writing file {file_path}: {e}")
+                raise e
             
             return {
-                'success': success,
+                'success': True,
                 'path': file_path,
                 'message': 'File saved successfully'
             }
@@ -226,18 +214,12 @@ class FileManagerService:
             # Use find command to search
             command = f"find {search_path} -maxdepth 5 -iname '*{query}*' -type f 2>/dev/null | head -100"
             
-            stdin, stdout, stderr = await asyncio.get_event_loop().run_in_executor(
-                None,
-                client.exec_command,
-                command
-            )
-            
-            output = await asyncio.get_event_loop().run_in_executor(
-                None,
-                stdout.read
-            )
+            async with ssh_pool.channel_slot(client):
+                result = await execute(client, command)
+            if result.timed_out:
+                logger.warning(f"Search for '{query}' in {search_path} timed out; returning partial results")
             
-            files = output.decode('utf-8', errors='ignore').strip().split('\n')
+            files = result.text.strip().split('\n')
             files = [f for f in files if f]  # Remove empty lines
             
             return {
@@ -250,20 +232,15 @@ class FileManagerService:
             return {"error": str(e)}
     
     def close_connection(self, connection_key: str):
-        """Close SSH connection"""
-        if connection_key in self.sftp_clients:
-            try:
-                self.sftp_clients[connection_key].close()
-            except:
-                pass
-            del self.sftp_clients[connection_key]
-        
-        if connection_key in self.active_connections:
-            try:
-                self.active_connections[connection_key].close()
-            except:
-                pass
-            del self.active_connections[connection_key]
+        """Stop using the device connection; the pooled SSH connection stays open"""
+        client = self.active_connections.pop(connection_key, None)
+        if client is not None:
+            self._release_sftp(connection_key, client)
+    
+    def close_session(self, sid: str):
+        """Release everything a disconnected client was using"""
+        for connection_key in [key for key in self.active_connections if key.startswith(f"{sid}:")]:
+            self.close_connection(connection_key)
 
 
 # Global instance
@@ -0,0 +1,287 @@
+"""
+Service for running one command or action across many devices in parallel
+"""
+import asyncio
+import codecs
+import logging
+import time
+import uuid
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.datacenter import Datacenter, Device
+from app.services.device_stats_service import device_stats_service
+from app.services.remote_actions import process_command, service_command
+from app.services.remote_exec import execute
+from app.services.ssh_pool import SSHPoolError, ssh_pool
+
+logger = logging.getLogger(__name__)
+
+
+class FleetTarget(NamedTuple):
+    device_id: int
+    name: str
+    host: str
+    port: int
+    username: str
+    password: str
+
+
+def build_command(command: Optional[str] = None, service: Optional[str] = None,
+                  service_action: Optional[str] = None, pid: Optional[int] = None,
+                  process_action: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Shell command and job kind ("command", "service" or "process") for a request
+
+    Raises ValueError unless exactly one of a raw command, a service action
+    or a process action is given and valid.
+    """
+    given = [bool(command), service is not None, pid is not None]
+    if sum(given) != 1:
+        raise ValueError("Give exactly one of command, service or pid")
+
+    if command:
+        return command, "command"
+
+    if service is not None:
+        return service_command(service, service_action), "service"
+    return process_command(pid, process_action), "process"
+
+
+async def resolve_targets(db: AsyncSession, user_id: int,
+                          datacenter_ids: Optional[List[int]] = None,
+                          device_types: Optional[List[str]] = None,
+                          device_ids: Optional[List[int]] = None) -> Tuple[List[FleetTarget], List[Dict]]:
+    """
+    Devices of the user's datacenters matching every given selector
+
+    Returns the runnable targets and the matching devices that were skipped
+    because their SSH configuration is incomplete.
+    """
+    if not (datacenter_ids or device_types or device_ids):
+        raise ValueError("Select devices by datacenter_ids, device_types or device_ids")
+
+    query = select(Device).join(Datacenter).where(Datacenter.user_id == user_id)
+    if datacenter_ids:
+        query = query.where(Device.datacenter_id.in_(datacenter_ids))
+    if device_types:
+        query = query.where(Device.device_type.in_(device_types))
+    if device_ids:
+        query = query.where(Device.id.in_(device_ids))
+
+    result = await db.execute(query.order_by(Device.id))
+    targets, skipped = [], []
+    for device in result.scalars().all():
+        if not device.ip_address or not device.ssh_username:
+            skipped.append({"device_id": device.id, "name": device.name,
+                            "error": "Device SSH configuration incomplete"})
+            continue
+        targets.append(FleetTarget(
+            device.id, device.name, device.ip_address, device.ssh_port or 22,
+            device.ssh_username, device.ssh_password or ""
+        ))
+    return targets, skipped
+
+
+class FleetJob:
+    """
+    One fleet run: its targets, per-host results and the event stream.
+
+    Events are ``(name, payload)`` tuples queued as they happen and read
+    with ``events()``; the stream ends after ``fleet_exec_summary``.
+    """
+
+    def __init__(self, command: str, kind: str, targets: List[FleetTarget],
+                 skipped: List[Dict], concurrency: int, timeout: float, owner: Optional[str] = None):
+        self.job_id = uuid.uuid4().hex
+        self.command = command
+        self.kind = kind
+        self.targets = targets
+        self.skipped = skipped
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.owner = owner
+        self.results: Dict[int, Dict] = {}
+        self.started = time.monotonic()
+        self.task: Optional[asyncio.Task] = None
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    @property
+    def total(self) -> int:
+        return len(self.targets)
+
+    def emit(self, event: str, payload: Dict):
+        payload['job_id'] = self.job_id
+        self._queue.put_nowait((event, payload))
+
+    async def events(self) -> AsyncIterator[Tuple[str, Dict]]:
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            yield item
+
+    def progress(self) -> Dict:
+        done = self.results.values()
+        return {
+            "completed": len(self.results),
+            "total": self.total,
+            "succeeded": sum(1 for r in done if r["exit_status"] == 0 and not r["timed_out"]),
+            "failed": sum(1 for r in done if r["exit_status"] != 0 or r["timed_out"]),
+        }
+
+    def close(self):
+        """End the event stream"""
+        self._queue.put_nowait(None)
+
+    def cancel(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+
+
+class FleetExecutor:
+    """
+    Runs fleet jobs over the shared SSH pool.
+
+    At most ``concurrency`` hosts run at once. Each host's stdout/stderr is
+    streamed as ``fleet_exec_output`` events while it arrives, followed by
+    ``fleet_exec_host_done`` with the exit status and overall progress;
+    the job ends with ``fleet_exec_summary``. Cancelling a job closes the
+    channels of the hosts still running.
+    """
+
+    def __init__(self):
+        self.jobs: Dict[str, FleetJob] = {}
+
+    def start(self, command: str, kind: str, targets: List[FleetTarget], skipped: List[Dict],
+              concurrency: Optional[int] = None, timeout: Optional[float] = None,
+              owner: Optional[str] = None) -> FleetJob:
+        concurrency = min(max(int(concurrency or settings.FLEET_EXEC_CONCURRENCY), 1),
+                          settings.FLEET_EXEC_MAX_CONCURRENCY)
+        # Socket clients are not schema-validated, so out-of-range values fall back or are capped
+        timeout = float(timeout or 0)
+        if timeout <= 0:
+            timeout = settings.FLEET_EXEC_TIMEOUT
+        timeout = min(timeout, settings.FLEET_EXEC_MAX_TIMEOUT)
+        job = FleetJob(command, kind, targets, skipped, concurrency, timeout, owner)
+        self.jobs[job.job_id] = job
+        job.task = asyncio.create_task(self._run(job))
+        logger.info(
+            f"Fleet job {job.job_id} started on {job.total} devices "
+            f"(concurrency {concurrency}): {command[:80]}"
+        )
+        return job
+
+    def cancel(self, job_id: str, owner: Optional[str] = None) -> bool:
+        job = self.jobs.get(job_id)
+        if job is None or (owner is not None and job.owner != owner):
+            return False
+        job.cancel()
+        return True
+
+    def cancel_owned(self, owner: str):
+        for job in list(self.jobs.values()):
+            if job.owner == owner:
+                job.cancel()
+
+    async def _run(self, job: FleetJob):
+        job.emit('fleet_exec_started', {
+            "command": job.command,
+            "total": job.total,
+            "concurrency": job.concurrency,
+            "devices": [{"device_id": t.device_id, "name": t.name} for t in job.targets],
+            "skipped": job.skipped
+        })
+
+        semaphore = asyncio.Semaphore(job.concurrency)
+        cancelled = False
+        tasks = [asyncio.create_task(self._run_host(job, target, semaphore)) for target in job.targets]
+        try:
+            await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            cancelled = True
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            summary = job.progress()
+            summary.update({
+                "cancelled": cancelled,
+                "duration": round(time.monotonic() - job.started, 3),
+                "unreachable": sum(1 for r in job.results.values() if r.get("unreachable")),
+                "timed_out": sum(1 for r in job.results.values() if r["timed_out"]),
+                "skipped": len(job.skipped),
+                "results": {str(device_id): r for device_id, r in job.results.items()}
+            })
+            job.emit('fleet_exec_summary', summary)
+            job.close()
+            self.jobs.pop(job.job_id, None)
+            logger.info(
+                f"Fleet job {job.job_id} finished: {summary['succeeded']} succeeded, "
+                f"{summary['failed']} failed{' (cancelled)' if cancelled else ''}"
+            )
+
+    async def _run_host(self, job: FleetJob, target: FleetTarget, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            device_id = target.device_id
+            job.emit('fleet_exec_host_started', {"device_id": device_id, "name": target.name})
+            started = time.monotonic()
+            decoders = {
+                stream: codecs.getincrementaldecoder('utf-8')(errors='replace')
+                for stream in ("stdout", "stderr")
+            }
+
+            def on_output(stream: str, data: bytes):
+                text = decoders[stream].decode(data)
+                if text:
+                    job.emit('fleet_exec_output', {"device_id": device_id, "stream": stream, "data": text})
+
+            result = {"exit_status": None, "timed_out": False, "truncated": False}
+            try:
+                try:
+                    client = await ssh_pool.get_client(
+                        target.host, target.port, target.username, target.password
+                    )
+                except SSHPoolError:
+                    result["unreachable"] = True
+                    raise
+                async with ssh_pool.channel_slot(client):
+                    outcome = await execute(
+                        client, job.command, job.timeout, settings.FLEET_EXEC_MAX_OUTPUT, on_output
+                    )
+                result.update(exit_status=outcome.exit_status, timed_out=outcome.timed_out,
+                              truncated=outcome.truncated)
+                if outcome.timed_out:
+                    result["error"] = f"Timed out after {job.timeout:g}s"
+            except asyncio.CancelledError:
+                result["error"] = "Cancelled"
+                raise
+            except Exception as e:
+                result["error"] = str(e)
+            finally:
+                result["duration"] = round(time.monotonic() - started, 3)
+                job.results[device_id] = result
+                if job.kind == "service":
+                    device_stats_service.services_cache.invalidate(device_id)
+                elif job.kind == "process":
+                    device_stats_service.processes_cache.invalidate(device_id)
+                job.emit('fleet_exec_host_done', {
+                    "device_id": device_id,
+                    "name": target.name,
+                    **result,
+                    "progress": job.progress()
+                })
+
+    def get_stats(self) -> Dict:
+        """Counts only: this is served on the unauthenticated health endpoint"""
+        return {
+            "jobs": len(self.jobs),
+            "running": sum(1 for job in self.jobs.values() if job.task and not job.task.done())
+        }
+
+
+# Global fleet executor instance
+fleet_executor = FleetExecutor()
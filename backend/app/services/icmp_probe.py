@@ -0,0 +1,218 @@
+"""
+In-process asyncio ICMP echo engine used by the device monitor
+"""
+import asyncio
+import ipaddress
+import logging
+import os
+import socket
+import struct
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+
+# Echo payload size in bytes (matches nothing in particular, just keeps packets small)
+PAYLOAD_SIZE = 16
+
+
+def _checksum(data: bytes) -> int:
+    """Internet checksum (RFC 1071)"""
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def build_echo_request(identifier: int, sequence: int) -> bytes:
+    """Build an ICMP echo request packet"""
+    payload = struct.pack('!d', time.time()).ljust(PAYLOAD_SIZE, b'\x00')
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+    checksum = _checksum(header + payload)
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, checksum, identifier, sequence)
+    return header + payload
+
+
+class ICMPProber:
+    """
+    Sends ICMP echo requests for a whole batch of hosts over one shared socket.
+
+    Prefers an unprivileged datagram ICMP socket (Linux ``ping_group_range``)
+    and falls back to a raw socket. Replies are matched back to requests by
+    (address, sequence number) and the round-trip time is recorded per reply.
+    """
+
+    def __init__(self):
+        self.sock: Optional[socket.socket] = None
+        self.is_raw = False
+        self.identifier = os.getpid() & 0xFFFF
+        self._sequence = 0
+        self._pending: Dict[Tuple[str, int], Tuple[asyncio.Future, float]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._open_failed = False
+
+    @property
+    def available(self) -> bool:
+        """Whether an ICMP socket could be opened"""
+        return self.sock is not None or not self._open_failed
+
+    def open(self) -> bool:
+        """Open the shared ICMP socket and register it with the running loop"""
+        if self.sock is not None:
+            return True
+        if self._open_failed:
+            return False
+
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+            self.is_raw = False
+        except OSError:
+            try:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+                self.is_raw = True
+            except OSError as e:
+                logger.warning(f"ICMP sockets unavailable, falling back to ping subprocess: {e}")
+                self._open_failed = True
+                return False
+
+        sock.setblocking(False)
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(sock.fileno(), self._on_readable)
+        self.sock = sock
+        logger.info(f"ICMP probe engine using {'raw' if self.is_raw else 'datagram'} socket")
+        return True
+
+    def close(self):
+        """Close the socket and fail any outstanding probes"""
+        if self.sock is not None:
+            try:
+                self._loop.remove_reader(self.sock.fileno())
+            except Exception:
+                pass
+            self.sock.close()
+            self.sock = None
+
+        for future, _ in self._pending.values():
+            if not future.done():
+                future.cancel()
+        self._pending.clear()
+
+    def _next_sequence(self) -> int:
+        self._sequence = (self._sequence + 1) & 0xFFFF
+        return self._sequence
+
+    def _on_readable(self):
+        """Drain every queued reply and resolve the matching probes"""
+        while self.sock is not None:
+            try:
+                packet, (address, _) = self.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logger.debug(f"ICMP receive error: {e}")
+                return
+
+            received_at = time.monotonic()
+            if self.is_raw:
+                # Raw sockets deliver the IP header as well
+                packet = packet[(packet[0] & 0x0F) * 4:]
+            if len(packet) < 8:
+                continue
+
+            icmp_type, _, _, identifier, sequence = struct.unpack('!BBHHH', packet[:8])
+            if icmp_type != ICMP_ECHO_REPLY:
+                continue
+            # Datagram sockets rewrite the identifier, raw sockets see everyone's replies
+            if self.is_raw and identifier != self.identifier:
+                continue
+
+            entry = self._pending.pop((address, sequence), None)
+            if entry:
+                future, sent_at = entry
+                if not future.done():
+                    future.set_result(received_at - sent_at)
+
+    async def _resolve(self, host: str) -> Optional[str]:
+        """Resolve a host to an IPv4 address, or None if it cannot be probed here"""
+        try:
+            address = ipaddress.ip_address(host)
+            return str(address) if address.version == 4 else None
+        except ValueError:
+            pass
+
+        try:
+            infos = await self._loop.getaddrinfo(host, None, family=socket.AF_INET)
+            return infos[0][4][0] if infos else ""
+        except OSError:
+            # Unresolvable names are simply unreachable
+            return ""
+
+    async def ping_many(self, hosts: Iterable[str], timeout: float = 2.0) -> Dict[str, Optional[float]]:
+        """
+        Ping a batch of hosts in one pass.
+
+        Args:
+            hosts: Hostnames or IPv4 addresses
+            timeout: Seconds to wait for replies
+
+        Returns:
+            Mapping of host -> RTT in seconds, or None if no reply arrived.
+            Hosts the engine cannot handle (e.g. IPv6) are left out so the
+            caller can fall back to another method.
+        """
+        if not self.open():
+            return {}
+
+        hosts = list(dict.fromkeys(hosts))
+        resolved = await asyncio.gather(*(self._resolve(host) for host in hosts))
+
+        results: Dict[str, Optional[float]] = {}
+        probes: Dict[str, asyncio.Future] = {}
+        by_address: Dict[str, asyncio.Future] = {}
+        sent_keys = []
+
+        for host, address in zip(hosts, resolved):
+            if address is None:
+                continue
+            if not address:
+                results[host] = None
+                continue
+            if address in by_address:
+                probes[host] = by_address[address]
+                continue
+
+            sequence = self._next_sequence()
+            future = self._loop.create_future()
+            self._pending[(address, sequence)] = (future, time.monotonic())
+            sent_keys.append((address, sequence))
+            packet = build_echo_request(self.identifier, sequence)
+            try:
+                try:
+                    self.sock.sendto(packet, (address, 0))
+                except (BlockingIOError, InterruptedError):
+                    await self._loop.sock_sendto(self.sock, packet, (address, 0))
+            except OSError as e:
+                logger.debug(f"ICMP send to {address} failed: {e}")
+                self._pending.pop((address, sequence), None)
+                future.set_result(None)
+            by_address[address] = future
+            probes[host] = future
+
+        if by_address:
+            await asyncio.wait(set(by_address.values()), timeout=timeout)
+
+        # Anything still pending timed out
+        for key in sent_keys:
+            entry = self._pending.pop(key, None)
+            if entry and not entry[0].done():
+                entry[0].cancel()
+
+        for host, future in probes.items():
+            results[host] = future.result() if future.done() and not future.cancelled() else None
+
+        return results
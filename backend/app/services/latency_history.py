@@ -0,0 +1,110 @@
+"""
+Per-device ring buffers of ping RTT and loss samples
+"""
+import math
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+NAN = float('nan')
+
+PERCENTILES = (50, 95, 99)
+
+
+class LatencyRing:
+    """Fixed-capacity ring of (timestamp, rtt) samples; a NaN rtt is a lost probe"""
+
+    __slots__ = ('capacity', 'timestamps', 'rtts', 'next_index', 'count')
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.timestamps = array('d', [0.0]) * capacity
+        self.rtts = array('d', [NAN]) * capacity
+        self.next_index = 0
+        self.count = 0
+
+    def add(self, timestamp: float, rtt: Optional[float]):
+        self.timestamps[self.next_index] = timestamp
+        self.rtts[self.next_index] = NAN if rtt is None else rtt
+        self.next_index = (self.next_index + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+
+def _percentile(sorted_values: List[float], percentile: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    rank = max(1, math.ceil(percentile / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples: List[float]) -> Dict:
+    """Latency percentiles (ms) and loss for one window of samples"""
+    received = sorted(rtt for rtt in samples if rtt == rtt)  # NaN != NaN
+    lost = len(samples) - len(received)
+    summary = {
+        "samples": len(samples),
+        "lost": lost,
+        "loss_percent": round(lost * 100 / len(samples), 2) if samples else None,
+    }
+    for percentile in PERCENTILES:
+        summary[f"p{percentile}_ms"] = (
+            round(_percentile(received, percentile) * 1000, 3) if received else None
+        )
+    return summary
+
+
+def parse_windows(value: str) -> List[int]:
+    """Parse a comma-separated list of window lengths in seconds"""
+    windows = sorted({int(part) for part in value.split(',') if part.strip()})
+    if not windows or windows[0] <= 0:
+        raise ValueError("windows must be positive integers (seconds)")
+    return windows
+
+
+class LatencyHistory:
+    """Ring buffer per device, fed by the device monitor"""
+
+    def __init__(self, capacity: int = 720):
+        self.capacity = capacity
+        self.rings: Dict[int, LatencyRing] = {}
+
+    def record(self, device_id: int, rtt: Optional[float], timestamp: Optional[float] = None):
+        ring = self.rings.get(device_id)
+        if ring is None:
+            ring = self.rings[device_id] = LatencyRing(self.capacity)
+        ring.add(timestamp or time.time(), rtt)
+
+    def discard(self, device_ids: Iterable[int]):
+        for device_id in device_ids:
+            self.rings.pop(device_id, None)
+
+    def summary(self, device_id: int, windows: List[int]) -> Dict[str, Dict]:
+        return self.summaries([device_id], windows)[device_id]
+
+    def summaries(self, device_ids: Iterable[int], windows: List[int]) -> Dict[int, Dict[str, Dict]]:
+        """
+        Percentiles and loss per window for many devices in one pass
+
+        Each ring is scanned once for the widest window and the narrower
+        windows are filtered from that subset.
+        """
+        now = time.time()
+        widest = max(windows)
+        results = {}
+        for device_id in device_ids:
+            ring = self.rings.get(device_id)
+            if ring is None:
+                results[device_id] = {str(window): summarize([]) for window in windows}
+                continue
+
+            timestamps = ring.timestamps
+            rtts = ring.rtts
+            pairs = [
+                (timestamps[i], rtts[i])
+                for i in range(ring.count)
+                if timestamps[i] >= now - widest
+            ]
+            results[device_id] = {
+                str(window): summarize([rtt for timestamp, rtt in pairs if timestamp >= now - window])
+                for window in windows
+            }
+        return results
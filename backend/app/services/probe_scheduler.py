@@ -0,0 +1,233 @@
+"""
+Heap-based per-device probe scheduler for the device monitor
+"""
+import asyncio
+import heapq
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ProbeTarget:
+    """Scheduling state for one monitored device"""
+
+    def __init__(self, device_id: int, ip_address: str, datacenter_id: int,
+                 interval: float, online: Optional[bool] = None):
+        self.device_id = device_id
+        self.ip_address = ip_address
+        self.datacenter_id = datacenter_id
+        self.interval = interval
+        self.online = online
+        self.stable_count = 0  # Consecutive results without a status change
+        self.next_due = 0.0
+        self.generation = 0  # Bumped on reschedule so stale heap entries are skipped
+        self.in_flight = False
+
+
+# probe_batch(targets) -> {device_id: rtt in seconds, or None if unreachable}
+ProbeBatch = Callable[[List[ProbeTarget]], Awaitable[Dict[int, Optional[float]]]]
+# on_results([(target, is_online, rtt, changed), ...])
+ResultHandler = Callable[[List[Tuple[ProbeTarget, bool, Optional[float], bool]]], Awaitable[None]]
+
+
+class ProbeScheduler:
+    """
+    Schedules each device on its own interval instead of sweeping the whole fleet at once.
+
+    New devices start at a random offset within their interval so probes are
+    spread evenly over the period. Devices that just went offline are
+    re-probed quickly and devices that stay unchanged back off gradually.
+    Everything due within ``batch_window`` is probed together as one batch,
+    with at most ``max_in_flight`` probes outstanding (0 = unlimited).
+    """
+
+    def __init__(self, probe_batch: ProbeBatch, on_results: ResultHandler,
+                 default_interval: float = 30, fast_recheck_interval: float = 5,
+                 fast_recheck_count: int = 3, backoff_after: int = 10,
+                 max_backoff_factor: int = 4, batch_window: float = 0.05,
+                 lag_warning: float = 5.0, max_in_flight: int = 0):
+        self.probe_batch = probe_batch
+        self.on_results = on_results
+        self.default_interval = default_interval
+        self.fast_recheck_interval = fast_recheck_interval
+        self.fast_recheck_count = fast_recheck_count
+        self.backoff_after = backoff_after
+        self.max_backoff_factor = max_backoff_factor
+        self.batch_window = batch_window
+        self.lag_warning = lag_warning
+        self.max_in_flight = max_in_flight
+
+        self.targets: Dict[int, ProbeTarget] = {}
+        self._heap: List[Tuple[float, int, int]] = []
+        self._wakeup = asyncio.Event()
+        self._batches: set = set()
+        self._in_flight_count = 0
+
+        # Lag telemetry (seconds behind schedule when a probe was dispatched)
+        self.last_lag = 0.0
+        self.avg_lag = 0.0
+        self.max_lag = 0.0
+        self._last_lag_warning = 0.0
+
+    def sync(self, devices: Iterable[Tuple[int, str, int, Optional[int], Optional[bool]]]):
+        """
+        Reconcile the schedule with the current device inventory
+
+        Args:
+            devices: (device_id, ip_address, datacenter_id, interval, online) tuples
+        """
+        now = time.monotonic()
+        seen = set()
+
+        for device_id, ip_address, datacenter_id, interval, online in devices:
+            seen.add(device_id)
+            # Rows stored before intervals were validated may hold zero or negatives
+            interval = interval if interval and interval > 0 else self.default_interval
+            target = self.targets.get(device_id)
+
+            if target is None:
+                target = ProbeTarget(device_id, ip_address, datacenter_id, interval, online)
+                self.targets[device_id] = target
+                # Jitter the first probe across the whole interval
+                self._schedule(target, now + random.uniform(0, interval))
+                continue
+
+            if target.ip_address != ip_address or target.interval != interval:
+                target.ip_address = ip_address
+                target.interval = interval
+                target.stable_count = 0
+                if not target.in_flight:
+                    self._schedule(target, now + random.uniform(0, min(interval, self.fast_recheck_interval)))
+            target.datacenter_id = datacenter_id
+
+        for device_id in list(self.targets):
+            if device_id not in seen:
+                # Stale heap entries are dropped lazily when popped
+                del self.targets[device_id]
+
+        self._wakeup.set()
+
+    def _schedule(self, target: ProbeTarget, due: float):
+        target.generation += 1
+        target.next_due = due
+        heapq.heappush(self._heap, (due, target.device_id, target.generation))
+
+    def next_interval(self, target: ProbeTarget) -> float:
+        """Interval until the next probe, based on how recently the device changed"""
+        if target.online is False and target.stable_count < self.fast_recheck_count:
+            return min(self.fast_recheck_interval, target.interval)
+        factor = min(2 ** (target.stable_count // self.backoff_after), self.max_backoff_factor)
+        # A little jitter keeps devices from drifting back into lockstep
+        return target.interval * factor * random.uniform(0.9, 1.1)
+
+    def _has_capacity(self) -> bool:
+        return not self.max_in_flight or self._in_flight_count < self.max_in_flight
+
+    def _pop_due(self, now: float) -> List[ProbeTarget]:
+        """Pop every target due within the batch window, up to the in-flight limit"""
+        due_targets = []
+        while self._heap and self._heap[0][0] <= now + self.batch_window and self._has_capacity():
+            due, device_id, generation = heapq.heappop(self._heap)
+            target = self.targets.get(device_id)
+            if target is None or target.generation != generation or target.in_flight:
+                continue
+            target.in_flight = True
+            self._in_flight_count += 1
+            due_targets.append(target)
+        return due_targets
+
+    def _record_lag(self, targets: List[ProbeTarget], now: float):
+        lag = max(0.0, now - min(target.next_due for target in targets))
+        self.last_lag = lag
+        self.avg_lag = 0.9 * self.avg_lag + 0.1 * lag
+        self.max_lag = max(self.max_lag, lag)
+
+        if lag > self.lag_warning and now - self._last_lag_warning > 60:
+            self._last_lag_warning = now
+            logger.warning(f"Probe scheduler is {lag:.1f}s behind schedule ({len(self.targets)} devices)")
+
+    async def run(self):
+        """Dispatch probe batches as they fall due until cancelled"""
+        try:
+            while True:
+                now = time.monotonic()
+                if not self._heap:
+                    timeout = None
+                else:
+                    timeout = self._heap[0][0] - now
+
+                # Sleep until something falls due or, when saturated, a batch completes
+                if not self._has_capacity():
+                    timeout = None
+                if timeout is None or timeout > self.batch_window:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                targets = self._pop_due(now)
+                if not targets:
+                    continue
+
+                self._record_lag(targets, now)
+                task = asyncio.create_task(self._run_batch(targets))
+                self._batches.add(task)
+                task.add_done_callback(self._batches.discard)
+        finally:
+            for task in list(self._batches):
+                task.cancel()
+
+    async def _run_batch(self, targets: List[ProbeTarget]):
+        """Probe a batch, update per-device state and reschedule"""
+        try:
+            results = await self.probe_batch(targets)
+        except Exception as e:
+            logger.error(f"Probe batch failed: {e}", exc_info=True)
+            results = None
+
+        now = time.monotonic()
+        outcomes = []
+        for target in targets:
+            target.in_flight = False
+            self._in_flight_count -= 1
+            if self.targets.get(target.device_id) is not target:
+                continue
+
+            if results is None:
+                self._schedule(target, now + target.interval)
+                continue
+
+            rtt = results.get(target.device_id)
+            is_online = rtt is not None
+            changed = target.online != is_online
+            target.stable_count = 0 if changed else target.stable_count + 1
+            target.online = is_online
+            self._schedule(target, now + self.next_interval(target))
+            outcomes.append((target, is_online, rtt, changed))
+
+        self._wakeup.set()
+
+        if outcomes:
+            try:
+                await self.on_results(outcomes)
+            except Exception as e:
+                logger.error(f"Error handling probe results: {e}", exc_info=True)
+
+    def get_stats(self) -> Dict:
+        """Scheduler telemetry, including how far behind schedule it is running"""
+        now = time.monotonic()
+        overdue = [target for target in self.targets.values()
+                   if not target.in_flight and target.next_due < now]
+        return {
+            "devices": len(self.targets),
+            "in_flight": self._in_flight_count,
+            "overdue": len(overdue),
+            "lag_seconds": round(self.last_lag, 3),
+            "avg_lag_seconds": round(self.avg_lag, 3),
+            "max_lag_seconds": round(self.max_lag, 3),
+        }
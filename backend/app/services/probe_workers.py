@@ -0,0 +1,273 @@
+"""
+Worker processes that run device probe loops off the API event loop
+"""
+import asyncio
+import bisect
+import hashlib
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ConsistentHashRing:
+    """Maps device ids onto worker indexes so shards stay stable as devices come and go"""
+
+    def __init__(self, nodes: Iterable[int], replicas: int = 64):
+        self._ring: List[Tuple[int, int]] = []
+        for node in nodes:
+            for replica in range(replicas):
+                self._ring.append((self._hash(f"{node}:{replica}"), node))
+        self._ring.sort()
+        self._keys = [key for key, _ in self._ring]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+    def get_node(self, key) -> int:
+        index = bisect.bisect(self._keys, self._hash(str(key))) % len(self._ring)
+        return self._ring[index][1]
+
+
+class _PipeChannel:
+    """
+    One end of the pipe between the API process and a probe worker.
+
+    ``Connection.send`` and ``recv`` block until a whole message has been
+    written or read, so neither runs on an event loop: a reader thread hands
+    incoming messages to the loop and a writer thread drains a queue of
+    outgoing ones. Both sides sending large messages at once therefore
+    cannot deadlock, and a slow peer never stalls the loop.
+    """
+
+    def __init__(self, conn, loop: asyncio.AbstractEventLoop,
+                 on_message: Callable, on_closed: Callable[[], None]):
+        self.conn = conn
+        self._loop = loop
+        self._outbox: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._closed = False
+        threading.Thread(target=self._read, args=(on_message, on_closed), daemon=True).start()
+        threading.Thread(target=self._write, daemon=True).start()
+
+    def send(self, message):
+        if not self._closed:
+            self._outbox.put(message)
+
+    def close(self):
+        """Stop the writer once queued messages are sent and close the pipe"""
+        if not self._closed:
+            self._closed = True
+            self._outbox.put(None)
+
+    def _write(self):
+        while True:
+            message = self._outbox.get()
+            if message is None:
+                break
+            try:
+                self.conn.send(message)
+            except (OSError, ValueError):
+                # The peer went away; the reader reports it
+                break
+        self._closed = True
+        self.conn.close()
+
+    def _read(self, on_message: Callable, on_closed: Callable[[], None]):
+        try:
+            while True:
+                message = self.conn.recv()
+                self._call(on_message, message)
+        except (EOFError, OSError):
+            self._call(on_closed)
+
+    def _call(self, callback: Callable, *args):
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # Event loop already closed during shutdown
+            pass
+
+
+def _worker_main(conn, worker_index: int):
+    """Entry point of a probe worker process"""
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_worker_loop(conn, worker_index))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _worker_loop(conn, worker_index: int):
+    """Run a probe scheduler for this worker's shard and report results to the API process"""
+    # Imported here to avoid a circular import with the device monitor
+    from app.services.device_monitor import DeviceMonitor
+
+    monitor = DeviceMonitor()
+    stopping = asyncio.Event()
+
+    def on_message(message):
+        command, payload = message
+        if command == "sync":
+            monitor.scheduler.sync(payload)
+        elif command == "stop":
+            stopping.set()
+
+    # The API process went away
+    channel = _PipeChannel(conn, asyncio.get_running_loop(), on_message, stopping.set)
+
+    async def send_results(outcomes):
+        channel.send(("results", outcomes))
+
+    monitor.scheduler.on_results = send_results
+    scheduler_task = asyncio.create_task(monitor.scheduler.run())
+    logger.info(f"Probe worker {worker_index} started")
+
+    try:
+        while not stopping.is_set():
+            try:
+                await asyncio.wait_for(stopping.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                channel.send(("stats", monitor.scheduler.get_stats()))
+    finally:
+        channel.close()
+        scheduler_task.cancel()
+        monitor.prober.close()
+        logger.info(f"Probe worker {worker_index} stopped")
+
+
+class ProbeWorkerPool:
+    """
+    Splits the fleet across N worker processes by consistent hashing of device id.
+
+    Each worker runs its own probe scheduler and ICMP engine; results are
+    sent back over a pipe serviced by threads on both ends, so neither
+    probing nor pipe I/O blocks the API loop.
+    """
+
+    # Seconds before a worker that died is started again
+    RESPAWN_DELAY = 1.0
+
+    def __init__(self, num_workers: int, on_results: Callable[[List], Awaitable[None]]):
+        self.num_workers = num_workers
+        self.on_results = on_results
+        self.ring = ConsistentHashRing(range(num_workers))
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * num_workers
+        self._channels: List[Optional[_PipeChannel]] = [None] * num_workers
+        self._shards: Dict[int, List[Tuple]] = {}
+        self._stats: Dict[int, Dict] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: set = set()
+        self._stopping = False
+
+    def start(self):
+        """Spawn the worker processes"""
+        self._loop = asyncio.get_running_loop()
+        for index in range(self.num_workers):
+            self._spawn(index)
+        logger.info(f"Started {self.num_workers} probe worker processes")
+
+    def _spawn(self, index: int):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, index),
+            name=f"probe-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        self._processes[index] = process
+        channel = _PipeChannel(
+            parent_conn, self._loop,
+            lambda message: self._on_message(index, message),
+            lambda: self._on_closed(index, channel)
+        )
+        self._channels[index] = channel
+
+    def _respawn(self, index: int):
+        if self._stopping:
+            return
+        self._spawn(index)
+        # Hand the new worker the shard its predecessor was probing
+        if index in self._shards:
+            self._send_shard(index, self._shards[index])
+        logger.info(f"Respawned probe worker {index}")
+
+    async def stop(self):
+        """Ask the workers to exit and reap them, without blocking the event loop"""
+        self._stopping = True
+        for channel in self._channels:
+            if channel is not None:
+                channel.send(("stop", None))
+
+        processes = [process for process in self._processes if process is not None]
+
+        def reap():
+            # One deadline shared by all workers rather than 5s each
+            deadline = time.monotonic() + 5
+            for process in processes:
+                process.join(timeout=max(deadline - time.monotonic(), 0))
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+        await asyncio.to_thread(reap)
+        for channel in self._channels:
+            if channel is not None:
+                channel.close()
+        self._processes = [None] * self.num_workers
+        self._channels = [None] * self.num_workers
+
+    def assign(self, devices: Iterable[Tuple]):
+        """Send each worker its shard of the inventory (tuples as for ProbeScheduler.sync)"""
+        shards: Dict[int, List[Tuple]] = {index: [] for index in range(self.num_workers)}
+        for device in devices:
+            shards[self.ring.get_node(device[0])].append(device)
+
+        self._shards = shards
+        for index, shard in shards.items():
+            self._send_shard(index, shard)
+
+    def _send_shard(self, index: int, shard: List[Tuple]):
+        channel = self._channels[index]
+        if channel is None:
+            # Dead worker; its replacement gets the shard when it starts
+            return
+        channel.send(("sync", shard))
+
+    def _on_message(self, index: int, message):
+        kind, payload = message
+        if kind == "results":
+            task = self._loop.create_task(self.on_results(payload))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+        elif kind == "stats":
+            self._stats[index] = dict(payload, reported_at=time.time())
+
+    def _on_closed(self, index: int, channel: _PipeChannel):
+        if self._stopping or self._channels[index] is not channel:
+            return
+        process = self._processes[index]
+        exitcode = process.exitcode if process is not None else None
+        logger.error(
+            f"Probe worker {index} exited unexpectedly (exit code {exitcode}), "
+            f"respawning in {self.RESPAWN_DELAY:g}s"
+        )
+        channel.close()
+        self._channels[index] = None
+        self._stats.pop(index, None)
+        self._loop.call_later(self.RESPAWN_DELAY, self._respawn, index)
+
+    def get_stats(self) -> Dict:
+        return {
+            "workers": [
+                dict(self._stats.get(index, {}), alive=process is not None and process.is_alive())
+                for index, process in enumerate(self._processes)
+            ]
+        }
@@ -0,0 +1,311 @@
+"""
+Live process table: remote /proc sampling published as per-subscriber
+paged delta views
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.services.device_stats_service import device_stats_service
+from app.services.table_views import PagedDeltaView
+
+logger = logging.getLogger(__name__)
+
+# One long-running awk on the device. Each cycle it prints
+#   S <total jiffies> <cpus> <MemTotal kB>
+#   P <pid> <starttime> <utime+stime> <rss kB> <state> <comm>   for every process
+#   N <pid> <user> <args>                                        for processes not seen before
+#   E
+# so user and command line are only looked up (with a single ps) for new
+# processes. The first cycle is followed by a short sleep so CPU deltas
+# are available quickly. Writing to a closed channel ends the loop.
+_PROCESS_AWK = r'''BEGIN {
+  first = 1
+  while (1) {
+    total = 0; ncpu = 0; mem = 0
+    while ((getline line < "/proc/stat") > 0) {
+      if (line ~ /^cpu /) { n = split(line, f, " "); for (i = 2; i <= n; i++) total += f[i] }
+      else if (line ~ /^cpu[0-9]/) ncpu++
+    }
+    close("/proc/stat")
+    while ((getline line < "/proc/meminfo") > 0) if (line ~ /^MemTotal:/) { split(line, f, " "); mem = f[2] }
+    close("/proc/meminfo")
+    printf "S %d %d %d\n", total, ncpu, mem
+    split("", alive); newpids = ""
+    cmd = "ls /proc"
+    while ((cmd | getline pid) > 0) {
+      if (pid !~ /^[0-9]+$/) continue
+      file = "/proc/" pid "/stat"
+      if ((getline line < file) > 0) {
+        comm = line; sub(/^[^(]*\(/, "", comm); sub(/\) [^)]*$/, "", comm)
+        sub(/^.*\) /, "", line); split(line, f, " ")
+        printf "P %s %s %d %d %s %s\n", pid, f[20], f[12] + f[13], f[22] * pagekb, f[1], comm
+        alive[pid] = f[20]
+        if (!(pid in seen) || seen[pid] != f[20]) newpids = newpids (newpids == "" ? "" : ",") pid
+      }
+      close(file)
+    }
+    close(cmd)
+    for (pid in seen) if (!(pid in alive)) delete seen[pid]
+    if (newpids != "") {
+      cmd = "ps -o pid=,user:32=,args= -p " newpids " 2>/dev/null"
+      while ((cmd | getline line) > 0) { print "N " line; split(line, f, " "); if (f[1] in alive) seen[f[1]] = alive[f[1]] }
+      close(cmd)
+    }
+    print "E"; fflush()
+    if (system("sleep " (first ? 0.5 : interval)) != 0) exit
+    first = 0
+  }
+}'''
+
+SORT_KEYS = ('cpu', 'memory', 'rss', 'pid', 'user', 'command', 'state')
+
+
+def process_script(interval: float) -> str:
+    """Remote command that writes a process table block every ``interval`` seconds"""
+    return (
+        f"awk -v interval={interval:g} "
+        f"-v pagekb=$(( $(getconf PAGESIZE 2>/dev/null || echo 4096) / 1024 )) "
+        f"'{_PROCESS_AWK}'"
+    )
+
+
+class ProcessTable:
+    """
+    Rebuilds a device's process rows from the sampler's output blocks.
+
+    CPU is the share of one core used since the previous block, computed
+    from per-process utime+stime deltas against the total jiffies in
+    /proc/stat, like top. Deltas are reset when a pid is reused.
+    """
+
+    def __init__(self):
+        self.rows: Dict[int, Dict] = {}
+        self.ready = False  # True once a block with CPU deltas has been built
+        self._meta: Dict[int, Tuple[str, str]] = {}  # pid -> (user, command)
+        self._ticks: Dict[int, Tuple[str, int]] = {}  # pid -> (starttime, cpu ticks)
+        self._total: Optional[int] = None
+        self._pending: Dict[int, Tuple[str, int, int, str, str]] = {}
+        self._sample = (0, 1, 0)
+
+    def feed(self, line: str) -> bool:
+        """Consume one output line; True when it completed a publishable table"""
+        kind, _, rest = line.partition(' ')
+        try:
+            if kind == 'P':
+                pid, start, ticks, rss, state, comm = rest.split(' ', 5)
+                self._pending[int(pid)] = (start, int(ticks), int(rss), state, comm)
+            elif kind == 'N':
+                pid, user, *command = rest.split(None, 2)
+                self._meta[int(pid)] = (user, command[0].strip() if command else '')
+            elif kind == 'S':
+                total, ncpu, mem = rest.split()
+                self._sample = (int(total), max(int(ncpu), 1), int(mem))
+                self._pending = {}
+            elif kind == 'E':
+                return self._build()
+        except ValueError:
+            logger.debug(f"Ignoring malformed process line: {line[:80]}")
+        return False
+
+    def _build(self) -> bool:
+        total, ncpu, mem_total = self._sample
+        elapsed = total - self._total if self._total is not None else 0
+
+        rows = {}
+        ticks = {}
+        for pid, (start, cpu_ticks, rss, state, comm) in self._pending.items():
+            cpu = 0.0
+            previous = self._ticks.get(pid)
+            if elapsed > 0 and previous and previous[0] == start:
+                cpu = min((cpu_ticks - previous[1]) / elapsed * 100 * ncpu, 100.0 * ncpu)
+            ticks[pid] = (start, cpu_ticks)
+
+            # Processes that exited before ps saw them keep their kernel name
+            user, command = self._meta.get(pid, ('', f"[{comm}]"))
+            rows[pid] = {
+                'pid': pid,
+                'user': user,
+                'command': command[:200],
+                'state': state,
+                'cpu': round(max(cpu, 0.0), 1),
+                'memory': round(rss / mem_total * 100, 1) if mem_total else 0.0,
+                'rss': rss
+            }
+
+        for pid in [pid for pid in self._meta if pid not in rows]:
+            del self._meta[pid]
+        self._ticks = ticks
+        self._pending = {}
+        self.rows = rows
+
+        first = self._total is None
+        self._total = total
+        if not first:
+            self.ready = True
+        return self.ready
+
+
+class ProcessView(PagedDeltaView):
+    """One subscriber's sort, filter (command, user or pid) and page of a process table"""
+
+    key = 'pid'
+    sort_keys = SORT_KEYS
+    max_page = settings.PROCESS_TABLE_MAX_PAGE
+
+    def matches(self, row: Dict) -> bool:
+        query = self.query
+        return (not query or query in row['command'].lower() or query in row['user'].lower()
+                or query in str(row['pid']))
+
+
+class ProcessPublication:
+    """One device's process sampler and the views subscribed to it"""
+
+    def __init__(self, device_id: int, connection: Tuple[str, int, str, str]):
+        self.device_id = device_id
+        self.connection = connection  # (host, port, username, password)
+        self.views: Dict[str, ProcessView] = {}
+        self.intervals: Dict[str, float] = {}
+        self.last_sent: Dict[str, float] = {}
+        self.interval: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self.table = ProcessTable()
+
+
+class ProcessTablePublisher:
+    """
+    Runs a single process sampler per device and sends each subscriber
+    its own page of the table.
+
+    The sampler runs at the fastest interval any subscriber asked for;
+    slower subscribers are skipped on blocks that arrive before their
+    interval is due (their next delta still covers everything since the
+    last one they received). It stops when the last subscriber leaves.
+    """
+
+    def __init__(self, sio=None):
+        self.sio = sio
+        self.publications: Dict[int, ProcessPublication] = {}
+
+    async def subscribe(self, sid: str, device_id: int, host: str, port: int,
+                        username: str, password: str, interval: float, view: ProcessView):
+        publication = self.publications.get(device_id)
+        if publication is None:
+            publication = ProcessPublication(device_id, (host, port, username, password))
+            self.publications[device_id] = publication
+        else:
+            publication.connection = (host, port, username, password)
+
+        publication.views[sid] = view
+        publication.intervals[sid] = interval
+        self._restart_if_needed(publication)
+        if publication.table.ready:
+            await self._send(publication, sid)
+
+        logger.info(
+            f"Client {sid} subscribed to device {device_id} processes every {interval:g}s "
+            f"({len(publication.views)} subscribers)"
+        )
+
+    async def update_view(self, sid: str, device_id: int, **params):
+        """Change a subscriber's sort/filter/page and send it a fresh snapshot"""
+        publication = self.publications.get(device_id)
+        if publication is None or sid not in publication.views:
+            return
+        publication.views[sid].update(**params)
+        if publication.table.ready:
+            await self._send(publication, sid)
+
+    def unsubscribe(self, sid: str, device_id: int):
+        publication = self.publications.get(device_id)
+        if publication is None or sid not in publication.views:
+            return
+
+        del publication.views[sid]
+        del publication.intervals[sid]
+        publication.last_sent.pop(sid, None)
+
+        if not publication.views:
+            if publication.task:
+                publication.task.cancel()
+            del self.publications[device_id]
+            logger.info(f"Stopped process sampler for device {device_id}")
+        else:
+            self._restart_if_needed(publication)
+
+    def unsubscribe_all(self, sid: str):
+        """Drop a disconnected client from every device it watched"""
+        for device_id in [
+            device_id for device_id, publication in self.publications.items()
+            if sid in publication.views
+        ]:
+            self.unsubscribe(sid, device_id)
+
+    def _restart_if_needed(self, publication: ProcessPublication):
+        interval = min(publication.intervals.values())
+        if publication.task and not publication.task.done() and interval == publication.interval:
+            return
+
+        if publication.task:
+            publication.task.cancel()
+        publication.interval = interval
+        publication.table = ProcessTable()
+        for view in publication.views.values():
+            view.sent = None
+        publication.task = asyncio.create_task(self._publish(publication, interval))
+        logger.info(f"Sampling device {publication.device_id} processes every {interval:g}s")
+
+    async def _send(self, publication: ProcessPublication, sid: str):
+        rendered = publication.views[sid].render(publication.table.rows)
+        publication.last_sent[sid] = time.monotonic()
+        if rendered is not None:
+            kind, payload = rendered
+            payload['device_id'] = publication.device_id
+            await self.sio.emit(f'process_table_{kind}', payload, room=sid)
+
+    async def _publish(self, publication: ProcessPublication, interval: float):
+        device_id = publication.device_id
+        host, port, username, password = publication.connection
+        table = publication.table
+        try:
+            async for line in device_stats_service.stream_lines(
+                device_id, host, port, username, password,
+                process_script(interval), "Process sampler"
+            ):
+                if isinstance(line, dict):
+                    for sid in list(publication.views):
+                        await self.sio.emit('process_table_error', {
+                            'device_id': device_id,
+                            'error': line['error']
+                        }, room=sid)
+                    continue
+
+                if not table.feed(line):
+                    continue
+
+                now = time.monotonic()
+                for sid, wanted in list(publication.intervals.items()):
+                    if sid not in publication.views:
+                        continue
+                    # Half a sample of slack, as for device stats
+                    if now - publication.last_sent.get(sid, 0.0) >= wanted - interval / 2:
+                        await self._send(publication, sid)
+
+        except asyncio.CancelledError:
+            logger.debug(f"Process sampler for device {device_id} cancelled")
+        except Exception as e:
+            logger.error(f"Error streaming processes for device {device_id}: {e}")
+
+    def get_stats(self) -> Dict:
+        """Counts only: this is served on the unauthenticated health endpoint"""
+        return {
+            'devices': len(self.publications),
+            'subscribers': sum(len(publication.views) for publication in self.publications.values())
+        }
+
+
+# Global process table publisher instance
+process_table_publisher = ProcessTablePublisher()
@@ -0,0 +1,41 @@
+"""
+Shell commands for service and process actions on a device or across the fleet
+"""
+import re
+import shlex
+
+SERVICE_ACTIONS = ('start', 'stop', 'restart', 'reload', 'status')
+PROCESS_ACTIONS = {'kill': '-9', 'stop': '-SIGTERM'}
+_UNIT_NAME = re.compile(r'^[A-Za-z0-9@._:-]+$')
+
+
+def service_command(service: str, action: str) -> str:
+    """
+    systemctl command for a service action
+
+    Raises ValueError for an unknown action or an invalid unit name.
+    """
+    if action not in SERVICE_ACTIONS:
+        raise ValueError(f"service_action must be one of {', '.join(SERVICE_ACTIONS)}")
+    if not service or not _UNIT_NAME.match(service):
+        raise ValueError("Invalid service name")
+    if action == 'status':
+        return f"systemctl status {shlex.quote(service)} --no-pager"
+    return f"sudo -n systemctl {action} {shlex.quote(service)}"
+
+
+def process_command(pid, action: str) -> str:
+    """
+    kill command for a process action
+
+    Raises ValueError for an unknown action or a pid that is not a positive integer.
+    """
+    if action not in PROCESS_ACTIONS:
+        raise ValueError(f"process_action must be one of {', '.join(PROCESS_ACTIONS)}")
+    try:
+        pid = int(pid)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid pid") from None
+    if pid <= 0:
+        raise ValueError("Invalid pid")
+    return f"sudo -n kill {PROCESS_ACTIONS[action]} {pid}"
@@ -0,0 +1,101 @@
+"""
+Deadline-bound remote command execution with capped output capture
+"""
+import asyncio
+import logging
+from typing import Callable, NamedTuple, Optional
+
+from app.core.config import settings
+from app.services.ssh_transport import SSHConnection, SSHProcess
+
+logger = logging.getLogger(__name__)
+
+
+class ExecResult(NamedTuple):
+    exit_status: Optional[int]  # None when the command was cut short
+    stdout: bytes
+    stderr: bytes
+    timed_out: bool = False
+    truncated: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.exit_status == 0 and not self.timed_out
+
+    @property
+    def text(self) -> str:
+        return self.stdout.decode('utf-8', errors='ignore')
+
+    @property
+    def error_text(self) -> str:
+        return self.stderr.decode('utf-8', errors='ignore').strip()
+
+
+async def _collect(read, chunks: list, limit: int,
+                   on_chunk: Optional[Callable[[bytes], None]] = None) -> bool:
+    """Read a stream into ``chunks`` until EOF or ``limit`` bytes; True if truncated"""
+    size = 0
+    while True:
+        data = await read()
+        if not data:
+            return False
+        truncated = size + len(data) > limit
+        if truncated:
+            data = data[:limit - size]
+        chunks.append(data)
+        size += len(data)
+        if on_chunk and data:
+            on_chunk(data)
+        if truncated:
+            return True
+
+
+async def execute(client: SSHConnection, command: str, timeout: Optional[float] = None,
+                  max_output: Optional[int] = None,
+                  on_output: Optional[Callable[[str, bytes], None]] = None) -> ExecResult:
+    """
+    Run a command on its own channel and collect stdout, stderr and exit status.
+
+    Output is read as it streams in and capped at ``max_output`` bytes per
+    stream; hitting the cap or the ``timeout`` deadline closes the channel
+    so the remote command stops instead of running on, and whatever was
+    read so far is returned. Cancelling the caller closes the channel the
+    same way. ``on_output(stream, data)`` is called with each chunk of
+    "stdout" or "stderr" as it arrives.
+    """
+    timeout = settings.SSH_EXEC_TIMEOUT if timeout is None else timeout
+    max_output = settings.SSH_EXEC_MAX_OUTPUT if max_output is None else max_output
+
+    process: Optional[SSHProcess] = None
+    stdout_chunks, stderr_chunks = [], []
+    try:
+        async with asyncio.timeout(timeout):
+            process = await client.start(command)
+            process.close_stdin()
+
+            async def capture(read, chunks, stream) -> bool:
+                on_chunk = (lambda data: on_output(stream, data)) if on_output else None
+                if await _collect(read, chunks, max_output, on_chunk):
+                    # Stop the command so the other stream reaches EOF too
+                    process.close()
+                    return True
+                return False
+
+            truncated = any(await asyncio.gather(
+                capture(process.read, stdout_chunks, "stdout"),
+                capture(process.read_stderr, stderr_chunks, "stderr")
+            ))
+            if truncated:
+                logger.warning(f"Output of '{command[:80]}' truncated at {max_output} bytes")
+                return ExecResult(None, b"".join(stdout_chunks), b"".join(stderr_chunks),
+                                  truncated=True)
+
+            exit_status = await process.wait()
+            return ExecResult(exit_status, b"".join(stdout_chunks), b"".join(stderr_chunks))
+
+    except TimeoutError:
+        logger.warning(f"Command '{command[:80]}' timed out after {timeout}s")
+        return ExecResult(None, b"".join(stdout_chunks), b"".join(stderr_chunks), timed_out=True)
+    finally:
+        if process is not None:
+            process.close()
@@ -0,0 +1,129 @@
+"""
+Single-flight request coalescing with a short stale-while-revalidate cache
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, NamedTuple, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class CachedValue(NamedTuple):
+    value: Any
+    fetched_at: float
+
+
+class SingleFlightCache:
+    """
+    Shares one in-flight fetch among concurrent callers asking for the same key.
+
+    Results stay fresh for ``ttl`` seconds. For a further ``stale_ttl``
+    seconds the cached value is still returned immediately while a single
+    background fetch refreshes it. Older entries are fetched in the
+    foreground. Values for which ``cacheable`` returns False (errors) are
+    handed to the waiting callers but not stored.
+    """
+
+    def __init__(self, name: str, ttl: float, stale_ttl: float = 0,
+                 cacheable: Optional[Callable[[Any], bool]] = None):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.cacheable = cacheable or (lambda value: True)
+        self._entries: Dict[Hashable, CachedValue] = {}
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        # Bumped by invalidate() so fetches started earlier are discarded
+        self._generations: Dict[Hashable, int] = {}
+        self._background: Set[asyncio.Task] = set()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.fetched_at
+            if age < self.ttl:
+                self.hits += 1
+                return entry.value
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                if key not in self._inflight:
+                    task = self._start_fetch(key, fetch)
+                    self._background.add(task)
+                    task.add_done_callback(self._background_done)
+                return entry.value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            self.prune()
+            task = self._start_fetch(key, fetch)
+        # shield: one caller giving up must not cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    def _background_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Background refresh of {self.name} failed: {task.exception()}")
+
+    def _start_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        generation = self._generations.get(key, 0)
+
+        async def run():
+            try:
+                value = await fetch()
+                if self._generations.get(key, 0) == generation and self.cacheable(value):
+                    self._entries[key] = CachedValue(value, time.monotonic())
+                return value
+            finally:
+                if self._inflight.get(key) is task:
+                    del self._inflight[key]
+
+        task = asyncio.create_task(run())
+        self._inflight[key] = task
+        return task
+
+    def put(self, key: Hashable, value: Any):
+        """Store a value obtained elsewhere (e.g. from a live stream)"""
+        if self.cacheable(value):
+            self._entries[key] = CachedValue(value, time.monotonic())
+
+    def peek(self, key: Hashable, max_age: Optional[float] = None) -> Optional[Any]:
+        """Cached value if it is no older than ``max_age`` (default: the TTL)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.fetched_at >= (self.ttl if max_age is None else max_age):
+            return None
+        return entry.value
+
+    def invalidate(self, key: Hashable):
+        """
+        Forget the cached value. A fetch already in flight may have read the
+        old state, so it is neither stored nor joined by later callers.
+        """
+        self._entries.pop(key, None)
+        self._generations[key] = self._generations.get(key, 0) + 1
+        self._inflight.pop(key, None)
+
+    def prune(self):
+        """Drop entries past their stale window"""
+        cutoff = time.monotonic() - self.ttl - self.stale_ttl
+        for key in [key for key, entry in self._entries.items() if entry.fetched_at < cutoff]:
+            del self._entries[key]
+
+    def get_stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "in_flight": len(self._inflight),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
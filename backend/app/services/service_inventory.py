@@ -0,0 +1,108 @@
+"""
+Systemd service inventory: batch query, parsing and paged views
+"""
+from typing import Dict, List
+
+from app.core.config import settings
+from app.services.table_views import PagedDeltaView
+
+# Every loaded service unit, then every installed unit file with its enablement
+# state, separated by a marker line. Nothing is truncated.
+_UNIT_FILES_MARKER = "--unit-files--"
+SERVICE_INVENTORY_COMMAND = (
+    "systemctl list-units --type=service --all --no-legend --no-pager --plain; "
+    f"echo '{_UNIT_FILES_MARKER}'; "
+    "systemctl list-unit-files --type=service --no-legend --no-pager"
+)
+
+SERVICE_SORT_KEYS = ('name', 'active', 'sub', 'enabled', 'load')
+
+
+def _unit_name(unit: str) -> str:
+    return unit[:-len('.service')] if unit.endswith('.service') else unit
+
+
+def parse_service_inventory(output: str) -> List[Dict]:
+    """
+    Merge ``list-units`` and ``list-unit-files`` output into one row per service
+
+    Installed units that are not loaded (typically disabled ones) are
+    included as inactive so they can be started from the UI; templates
+    (``foo@.service``) are skipped since they cannot be started directly.
+    Instances take the enablement state of their template.
+    """
+    units_part, _, files_part = output.partition(_UNIT_FILES_MARKER)
+
+    unit_files: Dict[str, str] = {}
+    for line in files_part.splitlines():
+        parts = line.split()
+        if len(parts) >= 2:
+            unit_files[parts[0]] = parts[1]
+
+    services: Dict[str, Dict] = {}
+    for line in units_part.splitlines():
+        parts = line.split(None, 4)
+        if len(parts) < 4 or not parts[0].endswith('.service'):
+            continue
+        unit = parts[0]
+        enabled = unit_files.get(unit, "")
+        if not enabled and '@' in unit:
+            enabled = unit_files.get(f"{unit.split('@', 1)[0]}@.service", "")
+        services[unit] = {
+            "name": _unit_name(unit),
+            "load": parts[1],
+            "active": parts[2],
+            "sub": parts[3],
+            "enabled": enabled,
+            "description": parts[4] if len(parts) > 4 else ""
+        }
+
+    for unit, enabled in unit_files.items():
+        if unit in services or unit.endswith('@.service'):
+            continue
+        services[unit] = {
+            "name": _unit_name(unit),
+            "load": "not-loaded",
+            "active": "inactive",
+            "sub": "dead",
+            "enabled": enabled,
+            "description": ""
+        }
+
+    return list(services.values())
+
+
+class ServiceView(PagedDeltaView):
+    """
+    One client's name filter, state filter and page of a service inventory.
+
+    ``state`` matches the active, sub or enabled state of a unit, e.g.
+    "running", "failed" or "enabled".
+    """
+
+    key = 'name'
+    sort_keys = SERVICE_SORT_KEYS
+    max_page = settings.SERVICE_INVENTORY_MAX_PAGE
+
+    def __init__(self, *args, state: str = '', **kwargs):
+        super().__init__(*args, **kwargs)
+        self.state = (state or '').lower()
+
+    def update(self, *args, state: str = '', **kwargs):
+        super().update(*args, **kwargs)
+        self.state = (state or '').lower()
+
+    def matches(self, row: Dict) -> bool:
+        if self.query and self.query not in row['name'].lower():
+            return False
+        return not self.state or self.state in (row['active'], row['sub'], row['enabled'])
+
+    def page(self, services: List[Dict]) -> Dict:
+        """Plain (non-delta) page for one-off requests"""
+        total, rows = self.select({row['name']: row for row in services})
+        return {
+            "total": total,
+            "offset": self.offset,
+            "limit": self.limit,
+            "services": rows
+        }
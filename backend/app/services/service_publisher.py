@@ -0,0 +1,143 @@
+"""
+Per-device service inventory subscriptions with change notifications
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.device_stats_service import device_stats_service
+from app.services.service_inventory import ServiceView
+
+logger = logging.getLogger(__name__)
+
+
+class ServicePublication:
+    """One device's inventory refresher and the views subscribed to it"""
+
+    def __init__(self, device_id: int, connection: Tuple[str, int, str, str]):
+        self.device_id = device_id
+        self.connection = connection  # (host, port, username, password)
+        self.views: Dict[str, ServiceView] = {}
+        self.rows: Optional[Dict[str, Dict]] = None
+        self.task: Optional[asyncio.Task] = None
+
+
+class ServiceInventoryPublisher:
+    """
+    Keeps subscribed clients' service pages current.
+
+    The inventory of each watched device is refreshed every
+    ``SERVICE_INVENTORY_REFRESH_INTERVAL`` seconds and whenever a fetch
+    happens elsewhere (a service action refetches it), through
+    ``device_stats_service.services_listener``. Each subscriber first gets
+    a snapshot of its page, then only the units that changed.
+    """
+
+    def __init__(self, sio=None):
+        self.sio = sio
+        self.publications: Dict[int, ServicePublication] = {}
+
+    async def subscribe(self, sid: str, device_id: int, host: str, port: int,
+                        username: str, password: str, view: ServiceView):
+        publication = self.publications.get(device_id)
+        if publication is None:
+            publication = ServicePublication(device_id, (host, port, username, password))
+            self.publications[device_id] = publication
+        else:
+            publication.connection = (host, port, username, password)
+
+        publication.views[sid] = view
+        if publication.task is None or publication.task.done():
+            publication.task = asyncio.create_task(self._refresh_loop(publication))
+        if publication.rows is not None:
+            await self._send(publication, sid)
+
+        logger.info(
+            f"Client {sid} subscribed to device {device_id} services "
+            f"({len(publication.views)} subscribers)"
+        )
+
+    async def update_view(self, sid: str, device_id: int, **params):
+        """Change a subscriber's filter or page and send it a fresh snapshot"""
+        publication = self.publications.get(device_id)
+        if publication is None or sid not in publication.views:
+            return
+        publication.views[sid].update(**params)
+        if publication.rows is not None:
+            await self._send(publication, sid)
+
+    def unsubscribe(self, sid: str, device_id: int):
+        publication = self.publications.get(device_id)
+        if publication is None or sid not in publication.views:
+            return
+
+        del publication.views[sid]
+        if not publication.views:
+            if publication.task:
+                publication.task.cancel()
+            del self.publications[device_id]
+            logger.info(f"Stopped service inventory refresh for device {device_id}")
+
+    def unsubscribe_all(self, sid: str):
+        """Drop a disconnected client from every device it watched"""
+        for device_id in [
+            device_id for device_id, publication in self.publications.items()
+            if sid in publication.views
+        ]:
+            self.unsubscribe(sid, device_id)
+
+    async def services_changed(self, device_id: int, services: List[Dict]):
+        """Listener for freshly fetched inventories; pushes changes to subscribers"""
+        publication = self.publications.get(device_id)
+        if publication is None:
+            return
+        publication.rows = {service['name']: service for service in services}
+        for sid in list(publication.views):
+            await self._send(publication, sid)
+
+    async def _send(self, publication: ServicePublication, sid: str):
+        view = publication.views.get(sid)
+        if view is None:
+            return
+        rendered = view.render(publication.rows)
+        if rendered is not None:
+            kind, payload = rendered
+            payload['device_id'] = publication.device_id
+            await self.sio.emit(f'service_inventory_{kind}', payload, room=sid)
+
+    async def _refresh_loop(self, publication: ServicePublication):
+        device_id = publication.device_id
+        try:
+            while True:
+                host, port, username, password = publication.connection
+                services = await device_stats_service.get_services(
+                    device_id, host, port, username, password
+                )
+                if publication.rows is None:
+                    if services:
+                        # A cache hit does not reach the listener; publish it here
+                        await self.services_changed(device_id, services)
+                    else:
+                        for sid in list(publication.views):
+                            await self.sio.emit('service_inventory_error', {
+                                'device_id': device_id,
+                                'error': 'Failed to load services'
+                            }, room=sid)
+                await asyncio.sleep(settings.SERVICE_INVENTORY_REFRESH_INTERVAL)
+
+        except asyncio.CancelledError:
+            logger.debug(f"Service inventory refresh for device {device_id} cancelled")
+        except Exception as e:
+            logger.error(f"Error refreshing services for device {device_id}: {e}")
+
+    def get_stats(self) -> Dict:
+        """Counts only: this is served on the unauthenticated health endpoint"""
+        return {
+            'devices': len(self.publications),
+            'subscribers': sum(len(publication.views) for publication in self.publications.values())
+        }
+
+
+# Global service inventory publisher instance
+service_inventory_publisher = ServiceInventoryPublisher()
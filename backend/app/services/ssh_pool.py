@@ -0,0 +1,300 @@
+"""
+Shared SSH connection pool used by the device stats, file manager and terminal services
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.services.circuit_breaker import CircuitOpen, ssh_breakers
+from app.services.ssh_transport import SSHConnection, connect, is_auth_error, resolve_backend
+
+logger = logging.getLogger(__name__)
+
+PoolKey = Tuple[str, int, str, str]
+
+
+class SSHPoolError(Exception):
+    """Raised when the pool cannot provide a connection or channel"""
+
+
+class HostUnavailable(SSHPoolError):
+    """The host's circuit is open or it is known to be offline; nothing was dialed"""
+
+
+def credential_fingerprint(username: str, password: Optional[str]) -> str:
+    """Stable digest of the credentials so pool keys never hold the password itself"""
+    return hashlib.sha256(f"{username}\0{password or ''}".encode()).hexdigest()[:16]
+
+
+class PooledConnection:
+    """One authenticated SSH transport and its channel bookkeeping"""
+
+    def __init__(self, key: PoolKey, client: SSHConnection):
+        self.key = key
+        self.client = client
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.active_channels = 0
+
+    @property
+    def host(self) -> str:
+        return self.key[0]
+
+    def is_alive(self) -> bool:
+        try:
+            return self.client.is_alive()
+        except Exception:
+            return False
+
+    def close(self):
+        try:
+            self.client.close()
+        except Exception:
+            pass
+
+
+class SSHConnectionPool:
+    """
+    One SSH transport per (host, port, user, credential fingerprint).
+
+    Callers borrow channels on the shared transport instead of opening
+    their own connections, so a device costs a single TCP+SSH handshake
+    whatever features are in use. Channels are counted against a per-host
+    cap (sshd's MaxSessions defaults to 10); short commands hold a slot via
+    ``channel_slot`` and long-lived channels (shells, SFTP, streams) via
+    ``acquire_slot``/``release_slot``.
+
+    Connections without open channels are closed after ``idle_timeout``,
+    least recently used idle connections are evicted beyond
+    ``max_connections``, transports send keepalives, and a background
+    health check drops transports that have died.
+    """
+
+    def __init__(self, backend: str = "asyncssh", max_connections: int = 200,
+                 idle_timeout: float = 300, keepalive_interval: int = 30, max_channels_per_host: int = 10,
+                 channel_wait_timeout: float = 10, connect_timeout: float = 10,
+                 health_check_interval: float = 30):
+        self.backend = resolve_backend(backend)
+        self.breakers = ssh_breakers
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.max_channels_per_host = max_channels_per_host
+        self.channel_wait_timeout = channel_wait_timeout
+        self.connect_timeout = connect_timeout
+        self.health_check_interval = health_check_interval
+
+        self.connections: "OrderedDict[PoolKey, PooledConnection]" = OrderedDict()
+        # Keyed by id(client): the PooledConnection holds the client, so the id
+        # stays unique until the entry is removed by _forget
+        self._by_client: Dict[int, PooledConnection] = {}
+        self._connect_locks: Dict[PoolKey, asyncio.Lock] = {}
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self._health_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def stop(self):
+        if self._health_task:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        self.close_all()
+
+    @staticmethod
+    def make_key(host: str, port: int, username: str, password: Optional[str]) -> PoolKey:
+        return (host, int(port), username, credential_fingerprint(username, password))
+
+    async def get_client(self, host: str, port: int, username: str,
+                         password: Optional[str]) -> SSHConnection:
+        """Return the pooled client for these credentials, connecting if needed"""
+        key = self.make_key(host, port, username, password)
+
+        connection = self._get_alive(key)
+        if connection:
+            return connection.client
+
+        # Single-flight: concurrent borrowers of a new key share one handshake
+        lock = self._connect_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            connection = self._get_alive(key)
+            if connection:
+                return connection.client
+
+            try:
+                self.breakers.check(host)
+            except CircuitOpen as e:
+                raise HostUnavailable(str(e)) from None
+
+            try:
+                client = await connect(
+                    host, port, username, password,
+                    backend=self.backend,
+                    timeout=self.connect_timeout,
+                    keepalive_interval=self.keepalive_interval
+                )
+            except Exception as e:
+                if is_auth_error(e):
+                    # The host is up; bad credentials should not trip its circuit
+                    self.breakers.record_success(host)
+                else:
+                    self.breakers.record_failure(host)
+                raise SSHPoolError(f"Failed to connect to {host}:{port}: {e}") from e
+            self.breakers.record_success(host)
+
+            connection = PooledConnection(key, client)
+            self.connections[key] = connection
+            self._by_client[id(client)] = connection
+            logger.info(f"SSH connection established to {username}@{host}:{port} ({client.backend})")
+
+            self._evict_lru()
+            return client
+
+    def _get_alive(self, key: PoolKey) -> Optional[PooledConnection]:
+        connection = self.connections.get(key)
+        if connection is None:
+            return None
+        if not connection.is_alive():
+            self._drop(connection)
+            return None
+        connection.last_used = time.monotonic()
+        self.connections.move_to_end(key)
+        return connection
+
+    def _host_semaphore(self, host: str) -> asyncio.Semaphore:
+        semaphore = self._host_slots.get(host)
+        if semaphore is None:
+            semaphore = self._host_slots[host] = asyncio.Semaphore(self.max_channels_per_host)
+        return semaphore
+
+    async def acquire_slot(self, client: SSHConnection):
+        """Reserve one of the host's channel slots for a channel on ``client``"""
+        connection = self._by_client.get(id(client))
+        if connection is None:
+            raise SSHPoolError("Connection is not managed by the pool")
+
+        try:
+            await asyncio.wait_for(
+                self._host_semaphore(connection.host).acquire(),
+                timeout=self.channel_wait_timeout
+            )
+        except asyncio.TimeoutError:
+            raise SSHPoolError(
+                f"Too many open channels to {connection.host} "
+                f"(limit {self.max_channels_per_host})"
+            )
+        connection.active_channels += 1
+        connection.last_used = time.monotonic()
+
+    def release_slot(self, client: SSHConnection):
+        connection = self._by_client.get(id(client))
+        if connection is None or connection.active_channels <= 0:
+            return
+        connection.active_channels -= 1
+        connection.last_used = time.monotonic()
+        self._host_semaphore(connection.host).release()
+        if connection.active_channels == 0 and self.connections.get(connection.key) is not connection:
+            # Last channel of a connection dropped while it was in use
+            self._forget(connection)
+
+    @asynccontextmanager
+    async def channel_slot(self, client: SSHConnection):
+        """Hold a channel slot for the duration of a short operation"""
+        await self.acquire_slot(client)
+        try:
+            yield client
+        finally:
+            self.release_slot(client)
+
+    def discard(self, client: SSHConnection):
+        """Drop a client a caller found to be broken"""
+        connection = self._by_client.get(id(client))
+        if connection is not None:
+            self._drop(connection)
+
+    def _drop(self, connection: PooledConnection):
+        if self.connections.get(connection.key) is connection:
+            del self.connections[connection.key]
+        connection.close()
+        # Connections with open channels stay known until release_slot frees their slots
+        if connection.active_channels == 0:
+            self._forget(connection)
+        host, port, username, _ = connection.key
+        logger.info(f"SSH connection to {username}@{host}:{port} closed")
+
+    def _forget(self, connection: PooledConnection):
+        if self._by_client.get(id(connection.client)) is connection:
+            del self._by_client[id(connection.client)]
+
+    def _evict_lru(self):
+        """Close least recently used idle connections beyond max_connections"""
+        excess = len(self.connections) - self.max_connections
+        if excess <= 0:
+            return
+        for connection in list(self.connections.values()):
+            if excess <= 0:
+                break
+            if connection.active_channels == 0:
+                self._drop(connection)
+                excess -= 1
+        if excess > 0:
+            logger.warning(
+                f"SSH pool over capacity by {excess}: all connections have open channels"
+            )
+
+    def check_health(self):
+        """Drop dead transports and close connections idle for too long"""
+        now = time.monotonic()
+        for connection in list(self.connections.values()):
+            if not connection.is_alive():
+                self._drop(connection)
+            elif connection.active_channels == 0 and now - connection.last_used > self.idle_timeout:
+                self._drop(connection)
+
+        for key in [key for key, lock in self._connect_locks.items()
+                    if key not in self.connections and not lock.locked()]:
+            del self._connect_locks[key]
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            try:
+                self.check_health()
+            except Exception as e:
+                logger.error(f"SSH pool health check failed: {e}")
+
+    def close_all(self):
+        for connection in list(self.connections.values()):
+            self._drop(connection)
+
+    def get_stats(self) -> Dict:
+        return {
+            "backend": self.backend,
+            "connections": len(self.connections),
+            "active_channels": sum(c.active_channels for c in self.connections.values()),
+            "idle_connections": sum(1 for c in self.connections.values() if c.active_channels == 0),
+            "open_circuits": self.breakers.get_stats(),
+        }
+
+
+# Global SSH connection pool instance
+ssh_pool = SSHConnectionPool(
+    backend=settings.SSH_BACKEND,
+    max_connections=settings.SSH_POOL_MAX_CONNECTIONS,
+    idle_timeout=settings.SSH_POOL_IDLE_TIMEOUT,
+    keepalive_interval=settings.SSH_KEEPALIVE_INTERVAL,
+    max_channels_per_host=settings.SSH_MAX_CHANNELS_PER_HOST,
+    channel_wait_timeout=settings.SSH_CHANNEL_WAIT_TIMEOUT,
+    connect_timeout=settings.SSH_CONNECT_TIMEOUT,
+    health_check_interval=settings.SSH_POOL_HEALTH_CHECK_INTERVAL
+)
@@ -0,0 +1,439 @@
+"""
+Pluggable SSH transport: asyncio-native asyncssh backend with a paramiko fallback
+"""
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import List, NamedTuple, Optional
+
+import paramiko
+
+from app.services.executors import connect_executor, exec_executor, transfer_executor
+
+try:
+    import asyncssh
+except ImportError:  # optional dependency
+    asyncssh = None
+
+logger = logging.getLogger(__name__)
+
+
+class RemoteEntry(NamedTuple):
+    filename: str
+    st_mode: int
+    st_size: int
+    st_mtime: int
+
+
+class SSHProcess(ABC):
+    """A remote command or shell on one channel, read as an awaitable byte stream"""
+
+    @abstractmethod
+    async def read(self, n: int = 65536) -> bytes:
+        """Read up to ``n`` bytes of output; b"" once the remote side is done"""
+
+    async def read_available(self, limit: int = 1 << 20) -> bytes:
+        """
+        Wait for output and return all of it that has already arrived, up to
+        ``limit`` bytes; b"" once the remote side is done
+        """
+        return await self.read(limit)
+
+    @abstractmethod
+    async def read_stderr(self, n: int = 65536) -> bytes:
+        ...
+
+    @abstractmethod
+    async def wait(self) -> Optional[int]:
+        """Wait for the remote side to finish and return its exit status"""
+
+    @abstractmethod
+    def write(self, data: bytes):
+        ...
+
+    @abstractmethod
+    def close_stdin(self):
+        """Send EOF so commands waiting on input finish instead of hanging"""
+
+    @abstractmethod
+    def resize(self, cols: int, rows: int):
+        ...
+
+    @property
+    @abstractmethod
+    def exit_status(self) -> Optional[int]:
+        ...
+
+    @abstractmethod
+    def close(self):
+        ...
+
+
+class SFTPSession(ABC):
+    """The subset of SFTP the file manager needs"""
+
+    @abstractmethod
+    async def listdir_attr(self, path: str) -> List[RemoteEntry]:
+        ...
+
+    @abstractmethod
+    async def read_bytes(self, path: str) -> bytes:
+        ...
+
+    @abstractmethod
+    async def write_bytes(self, path: str, data: bytes):
+        ...
+
+    @property
+    @abstractmethod
+    def closed(self) -> bool:
+        ...
+
+    @abstractmethod
+    def close(self):
+        ...
+
+
+class SSHConnection(ABC):
+    """One authenticated SSH transport that channels are opened on"""
+
+    backend = ""
+
+    @abstractmethod
+    def is_alive(self) -> bool:
+        ...
+
+    @abstractmethod
+    async def start(self, command: Optional[str] = None, term: Optional[str] = None,
+                    cols: int = 80, rows: int = 24) -> SSHProcess:
+        """Start a command (or a login shell when command is None), with a PTY if term is set"""
+
+    @abstractmethod
+    async def open_sftp(self) -> SFTPSession:
+        ...
+
+    @abstractmethod
+    def close(self):
+        ...
+
+
+# asyncssh backend: everything runs on the event loop
+
+class AsyncSSHProcess(SSHProcess):
+    def __init__(self, process):
+        self.process = process
+
+    async def read(self, n: int = 65536) -> bytes:
+        return await self.process.stdout.read(n)
+
+    async def read_stderr(self, n: int = 65536) -> bytes:
+        return await self.process.stderr.read(n)
+
+    async def wait(self) -> Optional[int]:
+        await self.process.wait_closed()
+        return self.process.exit_status
+
+    def write(self, data: bytes):
+        self.process.stdin.write(data)
+
+    def close_stdin(self):
+        self.process.stdin.write_eof()
+
+    def resize(self, cols: int, rows: int):
+        self.process.change_terminal_size(cols, rows)
+
+    @property
+    def exit_status(self) -> Optional[int]:
+        return self.process.exit_status
+
+    def close(self):
+        self.process.close()
+
+
+class AsyncSSHSFTPSession(SFTPSession):
+    def __init__(self, sftp, connection: "AsyncSSHConnection"):
+        self.sftp = sftp
+        self.connection = connection
+        self._closed = False
+
+    async def listdir_attr(self, path: str) -> List[RemoteEntry]:
+        return [
+            RemoteEntry(name.filename, name.attrs.permissions or 0,
+                        name.attrs.size or 0, name.attrs.mtime or 0)
+            for name in await self.sftp.readdir(path)
+            if name.filename not in ('.', '..')
+        ]
+
+    async def read_bytes(self, path: str) -> bytes:
+        async with self.sftp.open(path, 'rb') as f:
+            return await f.read()
+
+    async def write_bytes(self, path: str, data: bytes):
+        async with self.sftp.open(path, 'wb') as f:
+            await f.write(data)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed or not self.connection.is_alive()
+
+    def close(self):
+        self._closed = True
+        self.sftp.exit()
+
+
+class AsyncSSHConnection(SSHConnection):
+    backend = "asyncssh"
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def is_alive(self) -> bool:
+        return not self.conn.is_closed()
+
+    async def start(self, command: Optional[str] = None, term: Optional[str] = None,
+                    cols: int = 80, rows: int = 24) -> SSHProcess:
+        kwargs = {'encoding': None}
+        if term:
+            kwargs.update(term_type=term, term_size=(cols, rows))
+        process = await self.conn.create_process(command, **kwargs)
+        return AsyncSSHProcess(process)
+
+    async def open_sftp(self) -> SFTPSession:
+        return AsyncSSHSFTPSession(await self.conn.start_sftp_client(), self)
+
+    def close(self):
+        self.conn.close()
+
+
+# paramiko backend: blocking calls go through the bounded connect/exec/transfer
+# executors, but channel reads wait on paramiko's readiness pipe from the event loop
+
+class _LoopEvent(threading.Event):
+    """A threading.Event that also resolves a future on an event loop when set"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        super().__init__()
+        self.loop = loop
+        self.future = loop.create_future()
+
+    def set(self):
+        super().set()
+        try:
+            self.loop.call_soon_threadsafe(self.wake)
+        except RuntimeError:
+            # Event loop already closed
+            pass
+
+    def wake(self):
+        """Release waiters without marking the event set (on the loop's thread)"""
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class ParamikoProcess(SSHProcess):
+    def __init__(self, channel: paramiko.Channel):
+        self.channel = channel
+        self._waiters: List[asyncio.Future] = []
+        # paramiko's transport thread sets status_event when the exit status
+        # arrives or the channel closes; swap in one the loop can await. It is
+        # installed before the old one is checked, so no set() is missed.
+        previous = channel.status_event
+        self._status = _LoopEvent(asyncio.get_running_loop())
+        channel.status_event = self._status
+        if previous.is_set():
+            self._status.set()
+
+    def _wake(self):
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def _wait_readable(self):
+        # paramiko sets this pipe whenever stdout or stderr data or EOF
+        # arrives. One reader is shared by all waiters and only registered
+        # while someone waits, so an idle consumer cannot spin the loop.
+        loop = asyncio.get_event_loop()
+        fd = self.channel.fileno()
+        waiter = loop.create_future()
+        if not self._waiters:
+            loop.add_reader(fd, self._wake)
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        finally:
+            self._waiters.remove(waiter)
+            if not self._waiters:
+                loop.remove_reader(fd)
+
+    async def read(self, n: int = 65536) -> bytes:
+        while True:
+            if self.channel.recv_ready():
+                return self.channel.recv(n)
+            if self.channel.eof_received or self.channel.closed:
+                return b""
+            await self._wait_readable()
+
+    async def read_available(self, limit: int = 1 << 20) -> bytes:
+        data = await self.read(limit)
+        chunks = [data]
+        size = len(data)
+        # Pick up packets the transport thread buffered meanwhile
+        while data and size < limit and self.channel.recv_ready():
+            data = self.channel.recv(limit - size)
+            chunks.append(data)
+            size += len(data)
+        return b"".join(chunks)
+
+    async def read_stderr(self, n: int = 65536) -> bytes:
+        while True:
+            if self.channel.recv_stderr_ready():
+                return self.channel.recv_stderr(n)
+            if self.channel.eof_received or self.channel.closed:
+                return b""
+            await self._wait_readable()
+
+    async def wait(self) -> Optional[int]:
+        # shield: a cancelled waiter must not cancel the future for later ones
+        await asyncio.shield(self._status.future)
+        return self.exit_status
+
+    def write(self, data: bytes):
+        self.channel.sendall(data)
+
+    def close_stdin(self):
+        self.channel.shutdown_write()
+
+    def resize(self, cols: int, rows: int):
+        self.channel.resize_pty(width=cols, height=rows)
+
+    @property
+    def exit_status(self) -> Optional[int]:
+        return self.channel.exit_status if self.channel.exit_status_ready() else None
+
+    def close(self):
+        self.channel.close()
+        # No exit status will come for a channel closed from this side
+        self._status.wake()
+
+
+class ParamikoSFTPSession(SFTPSession):
+    def __init__(self, sftp: paramiko.SFTPClient):
+        self.sftp = sftp
+
+    async def listdir_attr(self, path: str) -> List[RemoteEntry]:
+        attrs = await exec_executor.run(self.sftp.listdir_attr, path)
+        return [
+            RemoteEntry(item.filename, item.st_mode or 0, item.st_size or 0, item.st_mtime or 0)
+            for item in attrs
+        ]
+
+    async def read_bytes(self, path: str) -> bytes:
+        def read():
+            with self.sftp.open(path, 'r') as f:
+                return f.read()
+        return await transfer_executor.run(read)
+
+    async def write_bytes(self, path: str, data: bytes):
+        def write():
+            with self.sftp.open(path, 'w') as f:
+                f.write(data)
+        await transfer_executor.run(write)
+
+    @property
+    def closed(self) -> bool:
+        return self.sftp.get_channel().closed
+
+    def close(self):
+        self.sftp.close()
+
+
+class ParamikoConnection(SSHConnection):
+    backend = "paramiko"
+
+    def __init__(self, client: paramiko.SSHClient):
+        self.client = client
+
+    def is_alive(self) -> bool:
+        transport = self.client.get_transport()
+        return bool(transport and transport.is_active() and transport.is_authenticated())
+
+    async def start(self, command: Optional[str] = None, term: Optional[str] = None,
+                    cols: int = 80, rows: int = 24) -> SSHProcess:
+        def open_channel():
+            channel = self.client.get_transport().open_session()
+            if term:
+                channel.get_pty(term=term, width=cols, height=rows)
+            if command is None:
+                channel.invoke_shell()
+            else:
+                channel.exec_command(command)
+            return channel
+        channel = await exec_executor.run(open_channel)
+        return ParamikoProcess(channel)
+
+    async def open_sftp(self) -> SFTPSession:
+        sftp = await exec_executor.run(self.client.open_sftp)
+        return ParamikoSFTPSession(sftp)
+
+    def close(self):
+        self.client.close()
+
+
+def is_auth_error(exc: Exception) -> bool:
+    """True when the host answered but rejected the credentials"""
+    if isinstance(exc, paramiko.AuthenticationException):
+        return True
+    return asyncssh is not None and isinstance(exc, asyncssh.PermissionDenied)
+
+
+def resolve_backend(name: str) -> str:
+    """The backend that will actually be used for a configured name"""
+    if name == "asyncssh" and asyncssh is None:
+        return "paramiko"
+    return name if name in ("asyncssh", "paramiko") else "paramiko"
+
+
+async def connect(host: str, port: int, username: str, password: Optional[str],
+                  backend: str = "asyncssh", timeout: float = 10,
+                  keepalive_interval: int = 30) -> SSHConnection:
+    """Open an authenticated SSH connection with the selected backend"""
+    if resolve_backend(backend) == "asyncssh":
+        # Like the paramiko path: no host key verification, and keys/agent
+        # are only tried when no password is given
+        use_keys = () if password is None else None
+        conn = await asyncio.wait_for(
+            asyncssh.connect(
+                host,
+                port=port,
+                username=username,
+                password=password,
+                known_hosts=None,
+                client_keys=use_keys,
+                agent_path=use_keys,
+                keepalive_interval=keepalive_interval
+            ),
+            timeout=timeout
+        )
+        return AsyncSSHConnection(conn)
+
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    try:
+        await connect_executor.run(
+            lambda: client.connect(
+                hostname=host,
+                port=port,
+                username=username,
+                password=password,
+                timeout=timeout,
+                look_for_keys=password is None,
+                allow_agent=password is None
+            )
+        )
+    except Exception:
+        client.close()
+        raise
+    if keepalive_interval:
+        client.get_transport().set_keepalive(keepalive_interval)
+    return ParamikoConnection(client)
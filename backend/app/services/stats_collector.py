@@ -0,0 +1,129 @@
+"""
+Single round-trip system stats sampling from /proc and statvfs
+"""
+import json
+import logging
+import math
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# One remote command per sample: aggregate CPU counters from /proc/stat,
+# memory from /proc/meminfo and root filesystem usage (statvfs via df -P),
+# printed as a single JSON line. Only awk and df are needed on the target.
+SAMPLE_SCRIPT = (
+    "awk '/^cpu /{printf \"{\\\"cpu\\\":[%s,%s,%s,%s,%s,%s,%s,%s]\", $2,$3,$4,$5,$6,$7,$8,$9; exit}' /proc/stat; "
+    "awk '/^MemTotal:/{t=$2} /^MemFree:/{f=$2} /^MemAvailable:/{a=$2} /^Buffers:/{b=$2} /^Cached:/{c=$2} "
+    "END{printf \",\\\"mem\\\":[%d,%d,%d,%d,%d]\", t,f,a,b,c}' /proc/meminfo; "
+    "df -Pk / | awk 'NR==2{printf \",\\\"disk\\\":[%s,%s,%s]}\\n\", $2,$3,$4}'"
+)
+
+
+def stream_script(interval: float) -> str:
+    """
+    Long-running variant of SAMPLE_SCRIPT emitting one JSON line per interval.
+
+    The loop exits once stdout is gone (the channel was closed), so no
+    sampler is left behind on the device.
+    """
+    return f"while :; do {SAMPLE_SCRIPT} || exit; sleep {interval:g}; done"
+
+
+def parse_sample(line: str) -> Optional[Dict]:
+    """Parse one JSON sample line produced by SAMPLE_SCRIPT"""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        sample = json.loads(line)
+    except ValueError:
+        logger.debug(f"Unparseable stats sample: {line[:200]}")
+        return None
+    if not all(key in sample for key in ("cpu", "mem", "disk")):
+        return None
+    return sample
+
+
+def _human_size(kilobytes: float) -> str:
+    """Format a size like ``df -h`` does (e.g. 980M, 9.8G, 20G)"""
+    size = float(kilobytes)
+    for unit in ("K", "M", "G", "T", "P"):
+        if size < 1024 or unit == "P":
+            if size < 10 and unit != "K":
+                return f"{math.ceil(size * 10) / 10:.1f}{unit}"
+            return f"{math.ceil(size)}{unit}"
+        size /= 1024
+    return f"{size}P"
+
+
+class StatsCollector:
+    """
+    Turns raw samples into dashboard stats, computing CPU% from deltas per device
+
+    Each consumer (one-off requests, the live stream) keeps its own CPU
+    baseline, so a one-off sample between two stream ticks does not shrink
+    the window the stream's next CPU% covers.
+    """
+
+    def __init__(self):
+        self._cpu_counters: Dict[Tuple[int, str], Tuple[int, int]] = {}
+
+    def forget(self, device_id: int, consumer: str):
+        self._cpu_counters.pop((device_id, consumer), None)
+
+    def _cpu_percent(self, device_id: int, consumer: str, counters: List[int]) -> float:
+        total = sum(counters)
+        idle = counters[3] + counters[4]  # idle + iowait
+        key = (device_id, consumer)
+        previous = self._cpu_counters.get(key)
+        self._cpu_counters[key] = (total, idle)
+
+        if previous and total > previous[0]:
+            # Usage since the previous sample
+            total_delta = total - previous[0]
+            idle_delta = idle - previous[1]
+        else:
+            # First sample (or counter reset): average since boot
+            total_delta, idle_delta = total, idle
+
+        if total_delta <= 0:
+            return 0.0
+        return max(0.0, min(100.0, (total_delta - idle_delta) * 100 / total_delta))
+
+    def build_stats(self, device_id: int, sample: Dict, consumer: str = "request") -> Dict:
+        """Stats in the shape the dashboard expects (memory in MB, disk like df -h)"""
+        cpu_percent = self._cpu_percent(device_id, consumer, [int(value) for value in sample["cpu"]])
+
+        total_kb, free_kb, available_kb, buffers_kb, cached_kb = sample["mem"]
+        if available_kb:
+            used_kb = total_kb - available_kb
+        else:
+            # Kernels before 3.14 have no MemAvailable
+            used_kb = total_kb - free_kb - buffers_kb - cached_kb
+        memory = {
+            "total": total_kb // 1024,
+            "used": used_kb // 1024,
+            "free": free_kb // 1024,
+            "percent": round(used_kb * 100 / total_kb, 2) if total_kb else 0
+        }
+
+        disk_total_kb, disk_used_kb, disk_available_kb = sample["disk"]
+        disk_capacity_kb = disk_used_kb + disk_available_kb
+        disk = {
+            "total": _human_size(disk_total_kb),
+            "used": _human_size(disk_used_kb),
+            "available": _human_size(disk_available_kb),
+            "percent": f"{math.ceil(disk_used_kb * 100 / disk_capacity_kb) if disk_capacity_kb else 0}%",
+            # Raw sizes for aggregation across devices
+            "total_kb": disk_total_kb,
+            "used_kb": disk_used_kb,
+            "available_kb": disk_available_kb
+        }
+
+        return {
+            "cpu": {
+                "percent": round(cpu_percent, 2)
+            },
+            "memory": memory,
+            "disk": disk
+        }
@@ -0,0 +1,162 @@
+"""
+Shared per-device stats publisher with reference-counted subscribers
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+from app.services.device_stats_service import device_stats_service
+
+logger = logging.getLogger(__name__)
+
+
+def device_stats_room(device_id: int) -> str:
+    """Socket.IO room holding every client that watches a device's stats"""
+    return f"device_stats:{device_id}"
+
+
+class DevicePublication:
+    """One device's sampling stream and the clients subscribed to it"""
+
+    def __init__(self, device_id: int, connection: Tuple[str, int, str, str]):
+        self.device_id = device_id
+        self.connection = connection  # (host, port, username, password)
+        self.subscribers: Dict[str, float] = {}  # sid -> requested interval
+        self.last_sent: Dict[str, float] = {}
+        self.interval: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self.latest: Optional[Dict] = None
+
+    def fastest_interval(self) -> float:
+        return min(self.subscribers.values())
+
+
+class StatsPublisher:
+    """
+    Runs a single stats stream per device however many clients watch it.
+
+    Subscribers join the device's Socket.IO room. The stream samples at the
+    fastest interval any subscriber asked for; slower subscribers are
+    skipped on samples that arrive before their own interval is due. The
+    stream is restarted when the fastest interval changes and stopped when
+    the last subscriber leaves. The device's SSH connection is left open
+    for the other device services.
+    """
+
+    def __init__(self, sio=None):
+        self.sio = sio
+        self.publications: Dict[int, DevicePublication] = {}
+
+    async def subscribe(self, sid: str, device_id: int, host: str, port: int,
+                        username: str, password: str, interval: float):
+        """Callers pass the device's stored connection after checking the client owns it"""
+        publication = self.publications.get(device_id)
+        if publication is None:
+            publication = DevicePublication(device_id, (host, port, username, password))
+            self.publications[device_id] = publication
+        else:
+            publication.connection = (host, port, username, password)
+
+        publication.subscribers[sid] = interval
+        await self.sio.enter_room(sid, device_stats_room(device_id))
+        self._restart_if_needed(publication)
+
+        # Give a late joiner the current picture instead of waiting a full interval
+        if publication.latest is not None:
+            publication.last_sent[sid] = time.monotonic()
+            await self.sio.emit('device_stats_update', {
+                'device_id': device_id,
+                'stats': publication.latest
+            }, room=sid)
+
+        logger.info(
+            f"Client {sid} subscribed to device {device_id} stats every {interval:g}s "
+            f"({len(publication.subscribers)} subscribers)"
+        )
+
+    async def unsubscribe(self, sid: str, device_id: int):
+        publication = self.publications.get(device_id)
+        if publication is None or sid not in publication.subscribers:
+            return
+
+        del publication.subscribers[sid]
+        publication.last_sent.pop(sid, None)
+        await self.sio.leave_room(sid, device_stats_room(device_id))
+
+        if not publication.subscribers:
+            if publication.task:
+                publication.task.cancel()
+            del self.publications[device_id]
+            device_stats_service.collector.forget(device_id, "stream")
+            logger.info(f"Stopped stats stream for device {device_id}")
+        else:
+            self._restart_if_needed(publication)
+
+    async def unsubscribe_all(self, sid: str):
+        """Drop a disconnected client from every device it watched"""
+        for device_id in [
+            device_id for device_id, publication in self.publications.items()
+            if sid in publication.subscribers
+        ]:
+            await self.unsubscribe(sid, device_id)
+
+    def _restart_if_needed(self, publication: DevicePublication):
+        interval = publication.fastest_interval()
+        if publication.task and not publication.task.done() and interval == publication.interval:
+            return
+
+        if publication.task:
+            publication.task.cancel()
+        publication.interval = interval
+        publication.task = asyncio.create_task(self._publish(publication, interval))
+        logger.info(f"Sampling device {publication.device_id} stats every {interval:g}s")
+
+    async def _publish(self, publication: DevicePublication, interval: float):
+        device_id = publication.device_id
+        host, port, username, password = publication.connection
+        room = device_stats_room(device_id)
+        try:
+            # Subscriptions carry the device's stored connection, so samples may be cached
+            async for stats in device_stats_service.stream_system_stats(
+                device_id, host, port, username, password, interval, cache=True
+            ):
+                if not stats or 'error' in stats:
+                    logger.warning(f"Failed to get stats for device {device_id}")
+                    continue
+
+                publication.latest = stats
+                now = time.monotonic()
+                # Half a sample of slack so slower subscribers do not drift a whole sample late
+                skipped = []
+                for sid, wanted in publication.subscribers.items():
+                    if now - publication.last_sent.get(sid, 0.0) >= wanted - interval / 2:
+                        publication.last_sent[sid] = now
+                    else:
+                        skipped.append(sid)
+
+                if len(skipped) < len(publication.subscribers):
+                    await self.sio.emit('device_stats_update', {
+                        'device_id': device_id,
+                        'stats': stats
+                    }, room=room, skip_sid=skipped or None)
+
+        except asyncio.CancelledError:
+            logger.debug(f"Stats stream for device {device_id} cancelled")
+        except Exception as e:
+            logger.error(f"Error streaming device stats: {e}")
+            await self.sio.emit('device_monitoring_error', {
+                'device_id': device_id,
+                'error': str(e)
+            }, room=room)
+
+    def get_stats(self) -> Dict:
+        """Counts only: this is served on the unauthenticated health endpoint"""
+        return {
+            'devices': len(self.publications),
+            'subscribers': sum(len(publication.subscribers) for publication in self.publications.values())
+        }
+
+
+# Global stats publisher instance
+stats_publisher = StatsPublisher()
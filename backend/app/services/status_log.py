@@ -0,0 +1,45 @@
+"""
+Sequenced in-memory log of device status changes, per datacenter
+"""
+import uuid
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+
+class StatusChangeLog:
+    """
+    Keeps the most recent status changes of each datacenter with a monotonically
+    increasing sequence number so reconnecting clients can catch up on what
+    they missed. ``epoch`` changes on every backend start; a client holding a
+    sequence number from another epoch needs a snapshot instead.
+    """
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self.epoch = uuid.uuid4().hex[:12]
+        self._logs: Dict[int, Deque[Dict]] = {}
+        self._sequences: Dict[int, int] = {}
+
+    def append(self, datacenter_id: int, device_id: int, status: str, timestamp: str) -> Dict:
+        """Record a change and return the sequenced delta"""
+        seq = self._sequences.get(datacenter_id, 0) + 1
+        self._sequences[datacenter_id] = seq
+        delta = {'seq': seq, 'device_id': device_id, 'status': status, 'timestamp': timestamp}
+        self._logs.setdefault(datacenter_id, deque(maxlen=self.max_entries)).append(delta)
+        return delta
+
+    def latest_seq(self, datacenter_id: int) -> int:
+        return self._sequences.get(datacenter_id, 0)
+
+    def since(self, datacenter_id: int, last_seq: int) -> Optional[List[Dict]]:
+        """
+        Deltas after ``last_seq``, or None if the log no longer reaches back that far
+        """
+        if last_seq > self.latest_seq(datacenter_id):
+            return None
+        log = self._logs.get(datacenter_id)
+        if not log:
+            return []
+        if last_seq < log[0]['seq'] - 1:
+            return None
+        return [delta for delta in log if delta['seq'] > last_seq]
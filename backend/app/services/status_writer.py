@@ -0,0 +1,125 @@
+"""
+Write-behind queue for device status updates from the device monitor
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, update
+
+from app.core.database import async_session
+from app.models.datacenter import Device
+
+logger = logging.getLogger(__name__)
+
+_devices = Device.__table__
+
+# Core statements rather than ORM bulk updates: rows deleted since the check
+# simply match nothing instead of raising StaleDataError. updated_at is
+# pinned so monitoring does not look like a user edit.
+UPDATE_STATUS = (
+    update(_devices)
+    .where(_devices.c.id == bindparam("device_id"))
+    .values(
+        status=bindparam("new_status"),
+        last_checked=bindparam("checked_at"),
+        updated_at=_devices.c.updated_at
+    )
+)
+UPDATE_LAST_CHECKED = (
+    update(_devices)
+    .where(_devices.c.id == bindparam("device_id"))
+    .values(last_checked=bindparam("checked_at"), updated_at=_devices.c.updated_at)
+)
+
+
+class StatusWriteBehind:
+    """
+    Collects status transitions and last_checked timestamps and flushes them in bulk.
+
+    Pending updates are coalesced per device (the latest wins) and written as
+    one executemany UPDATE when either ``max_pending`` devices are queued or
+    ``flush_interval`` seconds have passed, so the SQLite write lock is held
+    for a handful of statements instead of one per device.
+    """
+
+    def __init__(self, flush_interval: float = 5.0, max_pending: int = 500):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[int, Dict] = {}
+        self._flush_now = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._stopping = False
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the flush loop and write whatever is still queued"""
+        if self._task:
+            # Let the loop finish its current write rather than cancelling it midway
+            self._stopping = True
+            self._flush_now.set()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._stopping = False
+        await self.flush()
+
+    def record(self, device_id: int, checked_at: datetime, status: Optional[str] = None):
+        """Queue a check result; status is only set when it changed"""
+        entry = self._pending.setdefault(device_id, {"device_id": device_id})
+        entry["checked_at"] = checked_at
+        if status is not None:
+            entry["new_status"] = status
+
+        if len(self._pending) >= self.max_pending:
+            self._flush_now.set()
+
+    async def _flush_loop(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write all queued updates in bulk"""
+        async with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+
+            # executemany needs uniform parameter sets, so split by shape
+            with_status = [entry for entry in pending.values() if "new_status" in entry]
+            checked_only = [entry for entry in pending.values() if "new_status" not in entry]
+
+            async with async_session() as db:
+                try:
+                    if with_status:
+                        await db.execute(UPDATE_STATUS, with_status)
+                    if checked_only:
+                        await db.execute(UPDATE_LAST_CHECKED, checked_only)
+                    await db.commit()
+                    logger.debug(f"Flushed status for {len(pending)} devices")
+                except Exception as e:
+                    logger.error(f"Error flushing device status: {e}", exc_info=True)
+                    await db.rollback()
+                    self._requeue(pending)
+                except BaseException:
+                    # Cancelled mid-write: keep the batch for the next flush
+                    self._requeue(pending)
+                    raise
+
+    def _requeue(self, pending: Dict[int, Dict]):
+        """Put a batch that was not written back without clobbering anything newer"""
+        for device_id, entry in pending.items():
+            newer = self._pending.get(device_id)
+            self._pending[device_id] = {**entry, **newer} if newer else entry
@@ -0,0 +1,96 @@
+"""
+Server-side sorted, filtered and paged table views with delta encoding
+"""
+import heapq
+from typing import Dict, Hashable, List, Optional, Tuple
+
+
+class PagedDeltaView:
+    """
+    One subscriber's sort, filter and page over a table of rows.
+
+    Rows are dicts identified by their ``key`` field. ``render`` returns a
+    full snapshot the first time (and after the view changes) and
+    afterwards only the rows that were added, changed (just the fields
+    that differ) or removed from the page since the last render.
+    Subclasses define the sortable columns and the filter.
+    """
+
+    key = 'id'
+    sort_keys: Tuple[str, ...] = ('id',)
+    max_page = 500
+
+    def __init__(self, sort: Optional[str] = None, descending: bool = False,
+                 query: str = '', offset: int = 0, limit: int = 100):
+        self.sent: Optional[Dict[Hashable, Dict]] = None
+        self.order: List[Hashable] = []
+        self.total = 0
+        self.seq = 0
+        self.update(sort, descending, query, offset, limit)
+
+    def update(self, sort: Optional[str] = None, descending: bool = False,
+               query: str = '', offset: int = 0, limit: int = 100):
+        self.sort = sort if sort in self.sort_keys else self.sort_keys[0]
+        self.descending = descending
+        self.query = (query or '').lower()
+        self.offset = max(int(offset), 0)
+        self.limit = min(max(int(limit), 1), self.max_page)
+        # Next render is a fresh snapshot
+        self.sent = None
+
+    def matches(self, row: Dict) -> bool:
+        return True
+
+    def select(self, rows: Dict[Hashable, Dict]) -> Tuple[int, List[Dict]]:
+        """Total matching rows and the current page"""
+        matching = [row for row in rows.values() if self.matches(row)]
+
+        # Only the rows up to the end of the page need ordering
+        sort, key = self.sort, self.key
+        pick = heapq.nlargest if self.descending else heapq.nsmallest
+        ordered = pick(self.offset + self.limit, matching, key=lambda row: (row[sort], row[key]))
+        return len(matching), ordered[self.offset:]
+
+    def render(self, rows: Dict[Hashable, Dict]) -> Optional[Tuple[str, Dict]]:
+        """('snapshot' or 'delta', payload) to send, or None if the page did not change"""
+        key = self.key
+        total, page = self.select(rows)
+        order = [row[key] for row in page]
+
+        if self.sent is None:
+            kind = 'snapshot'
+            payload = {'rows': page, 'order': order}
+        else:
+            added, changed = [], []
+            for row in page:
+                previous = self.sent.get(row[key])
+                if previous is None:
+                    added.append(row)
+                elif previous != row:
+                    diff = {field: value for field, value in row.items() if previous.get(field) != value}
+                    diff[key] = row[key]
+                    changed.append(diff)
+            current = set(order)
+            removed = [item for item in self.sent if item not in current]
+
+            if not (added or changed or removed) and order == self.order and total == self.total:
+                return None
+            kind = 'delta'
+            payload = {'added': added, 'changed': changed, 'removed': removed}
+            if order != self.order:
+                payload['order'] = order
+
+        self.sent = {row[key]: row for row in page}
+        self.order = order
+        self.total = total
+        self.seq += 1
+
+        payload.update({
+            'seq': self.seq,
+            'total': total,
+            'offset': self.offset,
+            'limit': self.limit,
+            'sort': self.sort,
+            'descending': self.descending
+        })
+        return kind, payload
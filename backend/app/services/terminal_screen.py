@@ -0,0 +1,157 @@
+"""
+Terminal scrollback and screen snapshots for reattaching clients
+"""
+import asyncio
+from collections import deque
+from typing import Deque, List
+
+try:
+    import pyte
+    from pyte import graphics
+except ImportError:  # optional dependency
+    pyte = None
+
+# Private modes restored on reattach: cursor keys, alternate screen,
+# mouse reporting and bracketed paste
+_RESTORED_MODES = (1, 47, 1047, 1049, 1000, 1002, 1003, 1006, 2004)
+
+if pyte is not None:
+    _FG_CODES = {name: code for table in (graphics.FG_ANSI, graphics.FG_AIXTERM)
+                 for code, name in table.items() if name != 'default'}
+    _BG_CODES = {name: code for table in (graphics.BG_ANSI, graphics.BG_AIXTERM)
+                 for code, name in table.items() if name != 'default'}
+
+
+def _color(value: str, codes: dict, extended: int) -> List[str]:
+    if value == 'default':
+        return []
+    if value in codes:
+        return [str(codes[value])]
+    # 256-colour and truecolour values are kept as hex
+    try:
+        return [str(extended), '2', str(int(value[0:2], 16)),
+                str(int(value[2:4], 16)), str(int(value[4:6], 16))]
+    except ValueError:
+        return []
+
+
+def _sgr(char) -> str:
+    codes = ['0']
+    for flag, code in ((char.bold, '1'), (char.italics, '3'), (char.underscore, '4'),
+                       (char.blink, '5'), (char.reverse, '7'), (char.strikethrough, '9')):
+        if flag:
+            codes.append(code)
+    codes += _color(char.fg, _FG_CODES, 38)
+    codes += _color(char.bg, _BG_CODES, 48)
+    return f"\x1b[{';'.join(codes)}m"
+
+
+def render_screen(screen) -> str:
+    """
+    Escape sequences that repaint a pyte screen on a freshly reset terminal
+
+    Only non-blank cells are sent, each row positioned directly, followed
+    by the terminal modes, cursor position and pen of the screen.
+    """
+    out = []
+    for mode in _RESTORED_MODES:
+        if (mode << 5) in screen.mode:
+            out.append(f"\x1b[?{mode}h")
+    out.append("\x1b[0m\x1b[H\x1b[2J")
+
+    for y in range(screen.lines):
+        line = screen.buffer[y]
+        # Trailing default blanks are already there after the clear
+        end = max((x + 1 for x, char in line.items()
+                   if x < screen.columns and (char.data != ' ' or char.bg != 'default' or char.reverse)),
+                  default=0)
+        if not end:
+            continue
+        out.append(f"\x1b[{y + 1};1H")
+        pen = None
+        for x in range(end):
+            char = line[x]
+            if not char.data:
+                # Second cell of a wide character
+                continue
+            if char[1:] != pen:
+                out.append(_sgr(char))
+                pen = char[1:]
+            out.append(char.data)
+        out.append("\x1b[0m")
+
+    out.append(f"\x1b[{screen.cursor.y + 1};{screen.cursor.x + 1}H")
+    out.append(_sgr(screen.cursor.attrs))
+    if screen.cursor.hidden:
+        out.append("\x1b[?25l")
+    return "".join(out)
+
+
+class TerminalScreen:
+    """
+    Recent output of one terminal and the screen it produced.
+
+    Every output frame is appended to a ring of the last ``limit`` bytes,
+    which is all the per-frame work. The screen itself is only emulated
+    (with pyte) when a client reattaches: a worker thread brings the
+    emulator up to date with the output since the previous snapshot and
+    renders the visible screen, so the client gets one screenful instead
+    of a replay. If more output than the ring holds arrived in between,
+    the screen is rebuilt from the ring. Without pyte the ring itself is
+    the snapshot.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.chunks: Deque[bytes] = deque()
+        self.size = 0
+        self.written = 0  # Total bytes ever fed
+        self._screen = None
+        self._stream = None
+        self._emulated = 0  # Value of ``written`` the emulator has caught up to
+        self._lock = asyncio.Lock()
+
+    def feed(self, data: bytes):
+        self.chunks.append(data)
+        self.size += len(data)
+        self.written += len(data)
+        excess = self.size - self.limit
+        while excess > 0:
+            head = self.chunks[0]
+            if len(head) <= excess:
+                self.chunks.popleft()
+                self.size -= len(head)
+                excess -= len(head)
+            else:
+                self.chunks[0] = head[excess:]
+                self.size -= excess
+                excess = 0
+
+    def since(self, offset: int) -> bytes:
+        """Output after the first ``offset`` bytes ever written, as far as the ring still holds it"""
+        missing = self.written - offset
+        if missing <= 0:
+            return b""
+        data = b"".join(self.chunks)
+        return data[-missing:] if missing < len(data) else data
+
+    def _emulate(self, data: bytes, rebuild: bool, cols: int, rows: int) -> str:
+        if rebuild or self._screen is None:
+            self._screen = pyte.Screen(cols, rows)
+            self._stream = pyte.ByteStream(self._screen)
+        elif (self._screen.columns, self._screen.lines) != (cols, rows):
+            self._screen.resize(lines=rows, columns=cols)
+        self._stream.feed(data)
+        return render_screen(self._screen)
+
+    async def snapshot(self, cols: int, rows: int) -> bytes:
+        """The current screen (or, without pyte, the recent output) as one frame"""
+        if pyte is None:
+            return self.since(0)
+        async with self._lock:
+            written = self.written
+            rebuild = written - self._emulated > self.size
+            data = self.since(0 if rebuild else self._emulated)
+            rendered = await asyncio.to_thread(self._emulate, data, rebuild, cols, rows)
+            self._emulated = written
+            return rendered.encode()
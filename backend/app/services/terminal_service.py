@@ -1,18 +1,24 @@
 import os
 import sys
 import asyncio
+import codecs
+import time
 import uuid
 import struct
 import fcntl
 import termios
-from typing import Dict, Optional
+from typing import Dict, Optional, Union
 import pty
-import select
-import paramiko
+
+from app.core.config import settings
+from app.services.ssh_pool import ssh_pool
+from app.services.ssh_transport import SSHConnection, SSHProcess
+from app.services.terminal_screen import TerminalScreen
 
 
 class Terminal:
-    def __init__(self, terminal_id: str, cols: int = 80, rows: int = 24, ssh_config: Optional[dict] = None):
+    def __init__(self, terminal_id: str, cols: int = 80, rows: int = 24, ssh_config: Optional[dict] = None,
+                 binary: bool = False):
         self.terminal_id = terminal_id
         self.cols = cols
         self.rows = rows
@@ -20,11 +26,115 @@ class Terminal:
         self.pid: Optional[int] = None
         self.closed = False
         
+        # Binary terminals send output as raw bytes; text ones decode it here,
+        # keeping characters split across frames intact
+        self.binary = binary
+        self._decoder = None if binary else codecs.getincrementaldecoder('utf-8')(errors='replace')
+        
         # SSH specific
         self.is_ssh = ssh_config is not None
         self.ssh_config = ssh_config
-        self.ssh_client: Optional[paramiko.SSHClient] = None
-        self.ssh_channel: Optional[paramiko.Channel] = None
+        self.ssh_client: Optional[SSHConnection] = None
+        self.ssh_channel: Optional[SSHProcess] = None
+        
+        # Output as it arrives, from a PTY reader or the channel pump; None marks EOF
+        self.output: asyncio.Queue = asyncio.Queue()
+        self._reader_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pump: Optional[asyncio.Task] = None
+        
+        # Flow control: bytes read but not yet acknowledged by the client.
+        # Reading pauses at the high watermark, so the queue and the socket
+        # buffers hold at most that much no matter how fast output arrives.
+        self.unacked = 0
+        self.paused = False
+        self._flowing = asyncio.Event()
+        self._flowing.set()
+        self.last_frame = 0.0
+        
+        # Detachable sessions: the owning user, the client currently attached
+        # (None while detached) and the timer that closes an abandoned terminal.
+        # Output is delivered under ``attach_lock`` so a reattaching client's
+        # snapshot and the frames after it neither overlap nor leave a gap.
+        self.owner: Optional[int] = None
+        self.sid: Optional[str] = None
+        self.expiry: Optional[asyncio.TimerHandle] = None
+        self.attach_lock = asyncio.Lock()
+        self.screen = TerminalScreen(settings.TERMINAL_SCROLLBACK_BYTES)
+    
+    @property
+    def host(self) -> str:
+        return self.ssh_config['host'] if self.is_ssh else 'local'
+    
+    def start_reading(self):
+        """Have the event loop deliver output as it arrives, without polling"""
+        if self.is_ssh:
+            self._pump = asyncio.create_task(self._pump_channel())
+        else:
+            self._reader_loop = asyncio.get_running_loop()
+            self._reader_loop.add_reader(self.fd, self._on_readable)
+    
+    def _stop_reading(self):
+        if self._reader_loop is not None:
+            self._reader_loop.remove_reader(self.fd)
+            self._reader_loop = None
+    
+    def pause_reading(self):
+        """Stop taking output from the PTY or channel; the remote side blocks once its buffers fill"""
+        if self.paused:
+            return
+        self.paused = True
+        self._flowing.clear()
+        if self._reader_loop is not None:
+            self._reader_loop.remove_reader(self.fd)
+    
+    def resume_reading(self):
+        if not self.paused or self.closed:
+            return
+        self.paused = False
+        self._flowing.set()
+        if self._reader_loop is not None:
+            self._reader_loop.add_reader(self.fd, self._on_readable)
+    
+    def acknowledge(self, size: int):
+        """The client has consumed ``size`` more bytes of output"""
+        self.unacked = max(self.unacked - size, 0)
+        if self.paused and self.unacked <= settings.TERMINAL_LOW_WATERMARK:
+            self.resume_reading()
+    
+    def _received(self, data: bytes):
+        self.output.put_nowait(data)
+        self.unacked += len(data)
+        if self.unacked >= settings.TERMINAL_HIGH_WATERMARK:
+            self.pause_reading()
+    
+    async def _pump_channel(self):
+        # The channel read waits on readiness and returns everything buffered
+        try:
+            while True:
+                await self._flowing.wait()
+                data = await self.ssh_channel.read_available(settings.TERMINAL_FRAME_MAX_BYTES)
+                if not data:
+                    break
+                self._received(data)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            pass
+        self.output.put_nowait(None)
+    
+    def _on_readable(self):
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            # EIO once the shell has exited
+            data = b""
+        if data:
+            self._received(data)
+        else:
+            self._stop_reading()
+            self.output.put_nowait(None)
         
     def resize(self, cols: int, rows: int):
         """Resize the terminal"""
@@ -34,7 +144,7 @@ class Terminal:
         if self.is_ssh and self.ssh_channel:
             # Resize SSH channel
             try:
-                self.ssh_channel.resize_pty(width=cols, height=rows)
+                self.ssh_channel.resize(cols, rows)
             except Exception:
                 pass
         elif self.fd is not None:
@@ -42,18 +152,24 @@ class Terminal:
             winsize = struct.pack("HHHH", rows, cols, 0, 0)
             fcntl.ioctl(self.fd, termios.TIOCSWINSZ, winsize)
     
-    def write(self, data: str):
+    def decode(self, data: bytes) -> str:
+        """Text of an output frame for text-mode clients"""
+        return self._decoder.decode(data)
+    
+    def write(self, data: Union[bytes, str]):
         """Write data to terminal"""
         if self.closed:
             return
+        if isinstance(data, str):
+            data = data.encode()
             
         try:
             if self.is_ssh and self.ssh_channel:
                 # Write to SSH channel
-                self.ssh_channel.send(data)
+                self.ssh_channel.write(data)
             elif self.fd is not None:
                 # Write to local PTY
-                os.write(self.fd, data.encode())
+                os.write(self.fd, data)
         except (OSError, Exception):
             pass
     
@@ -62,21 +178,24 @@ class Terminal:
         if not self.closed:
             self.closed = True
             
-            # Close SSH connection
+            # Close SSH channel; the pooled connection stays open for other users
             if self.is_ssh:
+                if self._pump and not self._pump.done():
+                    self._pump.cancel()
+                    self.output.put_nowait(None)
                 if self.ssh_channel:
                     try:
                         self.ssh_channel.close()
                     except Exception:
                         pass
                 if self.ssh_client:
-                    try:
-                        self.ssh_client.close()
-                    except Exception:
-                        pass
+                    ssh_pool.release_slot(self.ssh_client)
             
-            # Close local PTY
+            # Close local PTY and wake anyone waiting for output
             if self.fd is not None:
+                if self._reader_loop is not None:
+                    self._stop_reading()
+                    self.output.put_nowait(None)
                 try:
                     os.close(self.fd)
                 except OSError:
@@ -92,39 +211,39 @@ class TerminalManager:
     def __init__(self):
         self.terminals: Dict[str, Terminal] = {}
     
-    async def create_terminal(self, cols: int = 80, rows: int = 24, ssh_config: Optional[dict] = None) -> Terminal:
-        """Create a new terminal instance (local or SSH)"""
+    async def create_terminal(self, cols: int = 80, rows: int = 24, ssh_config: Optional[dict] = None,
+                              binary: bool = False, owner: Optional[int] = None,
+                              sid: Optional[str] = None) -> Terminal:
+        """Create a new terminal instance (local or SSH), attached to client ``sid``"""
         terminal_id = str(uuid.uuid4())
-        terminal = Terminal(terminal_id, cols, rows, ssh_config)
+        terminal = Terminal(terminal_id, cols, rows, ssh_config, binary)
+        terminal.owner = owner
+        terminal.sid = sid
         
         if ssh_config:
             # Create SSH terminal
             try:
-                ssh_client = paramiko.SSHClient()
-                ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                
-                # Connect to SSH server
-                ssh_client.connect(
-                    hostname=ssh_config['host'],
-                    port=ssh_config.get('port', 22),
-                    username=ssh_config['username'],
-                    password=ssh_config.get('password'),
-                    timeout=10
+                # Borrow the shared connection and a channel slot on it
+                ssh_client = await ssh_pool.get_client(
+                    ssh_config['host'],
+                    ssh_config.get('port', 22),
+                    ssh_config['username'],
+                    ssh_config.get('password')
                 )
+                await ssh_pool.acquire_slot(ssh_client)
+                terminal.ssh_client = ssh_client
                 
                 # Open interactive shell
-                channel = ssh_client.invoke_shell(term='xterm-256color', width=cols, height=rows)
-                channel.setblocking(0)
-                
-                terminal.ssh_client = ssh_client
-                terminal.ssh_channel = channel
+                terminal.ssh_channel = await ssh_client.start(
+                    term='xterm-256color', cols=cols, rows=rows
+                )
+                terminal.start_reading()
                 
                 self.terminals[terminal_id] = terminal
                 return terminal
                 
             except Exception as e:
-                if ssh_client:
-                    ssh_client.close()
+                terminal.close()
                 raise Exception(f"SSH connection failed: {str(e)}")
         else:
             # Create local PTY terminal
@@ -154,48 +273,121 @@ class TerminalManager:
                 
                 # Set terminal size
                 terminal.resize(cols, rows)
+                terminal.start_reading()
                 
                 self.terminals[terminal_id] = terminal
                 return terminal
     
-    async def read_output(self, terminal_id: str, timeout: float = 0.1):
-        """Read output from terminal (local or SSH)"""
+    async def read_output(self, terminal_id: str) -> Optional[bytes]:
+        """
+        Read the next frame of output from terminal (local or SSH)
+        
+        Waits until output arrives and returns it as one frame; None means
+        the terminal has closed. An output burst is coalesced: while frames
+        are flowing, reads keep collecting for up to
+        TERMINAL_FRAME_INTERVAL after the previous frame or until
+        TERMINAL_FRAME_MAX_BYTES, while the first output after a quiet spell
+        (a keystroke echo) is returned at once.
+        """
         terminal = self.terminals.get(terminal_id)
         if not terminal or terminal.closed:
             return None
         
-        try:
-            if terminal.is_ssh:
-                # Read from SSH channel
-                if terminal.ssh_channel and terminal.ssh_channel.recv_ready():
-                    data = terminal.ssh_channel.recv(4096)
-                    return data.decode('utf-8', errors='replace')
-                return ""
-            else:
-                # Read from local PTY
-                # Use select to check if data is available
-                ready, _, _ = select.select([terminal.fd], [], [], timeout)
-                if ready:
-                    data = os.read(terminal.fd, 4096)
-                    return data.decode('utf-8', errors='replace')
-                return ""
-        except OSError:
-            # Terminal closed
-            terminal.close()
-            return None
-        except Exception as e:
-            # SSH error
+        data = await terminal.output.get()
+        if data is None:
             terminal.close()
             return None
+        
+        chunks = [data]
+        size = len(data)
+        deadline = terminal.last_frame + settings.TERMINAL_FRAME_INTERVAL
+        while size < settings.TERMINAL_FRAME_MAX_BYTES:
+            if terminal.output.empty():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    async with asyncio.timeout(remaining):
+                        data = await terminal.output.get()
+                except TimeoutError:
+                    break
+            else:
+                data = terminal.output.get_nowait()
+            if data is None:
+                # Deliver the final output; the next read reports the close
+                terminal.output.put_nowait(None)
+                break
+            chunks.append(data)
+            size += len(data)
+        
+        terminal.last_frame = time.monotonic()
+        return b"".join(chunks)
     
     def get_terminal(self, terminal_id: str) -> Optional[Terminal]:
         """Get terminal by ID"""
         return self.terminals.get(terminal_id)
     
+    async def detach(self, terminal_id: str, sid: str):
+        """
+        Detach client ``sid`` from a terminal, keeping it running
+        
+        Does nothing if another client has attached meanwhile. The terminal
+        is closed unless a client reattaches within TERMINAL_DETACH_GRACE
+        seconds; its output meanwhile only goes to the scrollback.
+        """
+        terminal = self.terminals.get(terminal_id)
+        if not terminal:
+            return
+        async with terminal.attach_lock:
+            if terminal.closed or terminal.sid != sid:
+                return
+            if settings.TERMINAL_DETACH_GRACE <= 0:
+                self.close_terminal(terminal_id)
+                return
+            
+            terminal.sid = None
+            # Acknowledgements for output in flight to the old client never come
+            terminal.acknowledge(terminal.unacked)
+            if terminal.expiry:
+                terminal.expiry.cancel()
+            terminal.expiry = asyncio.get_running_loop().call_later(
+                settings.TERMINAL_DETACH_GRACE, self.close_terminal, terminal_id
+            )
+    
+    async def attach(self, terminal_id: str, sid: str, cols: Optional[int] = None,
+                     rows: Optional[int] = None) -> Optional[bytes]:
+        """
+        Attach client ``sid`` to a terminal, taking it over from any other client
+        
+        Returns the current screen as one frame, after which the client
+        receives the terminal's output as usual; None if the terminal is gone.
+        Callers hold ``terminal.attach_lock``.
+        """
+        terminal = self.terminals.get(terminal_id)
+        if not terminal or terminal.closed:
+            return None
+        
+        if terminal.expiry:
+            terminal.expiry.cancel()
+            terminal.expiry = None
+        if cols and rows and (cols, rows) != (terminal.cols, terminal.rows):
+            terminal.resize(cols, rows)
+        
+        screen = await terminal.screen.snapshot(terminal.cols, terminal.rows)
+        terminal.sid = sid
+        # Expiry may have been armed again while the snapshot was rendered
+        if terminal.expiry:
+            terminal.expiry.cancel()
+            terminal.expiry = None
+        terminal.acknowledge(terminal.unacked)
+        return screen
+    
     def close_terminal(self, terminal_id: str):
         """Close and remove terminal"""
         terminal = self.terminals.get(terminal_id)
         if terminal:
+            if terminal.expiry:
+                terminal.expiry.cancel()
             terminal.close()
             del self.terminals[terminal_id]
     
@@ -203,6 +395,13 @@ class TerminalManager:
         """Close all terminals"""
         for terminal_id in list(self.terminals.keys()):
             self.close_terminal(terminal_id)
+    
+    def get_stats(self) -> Dict:
+        return {
+            "open": len(self.terminals),
+            "detached": sum(1 for terminal in self.terminals.values() if terminal.sid is None),
+            "paused": sum(1 for terminal in self.terminals.values() if terminal.paused)
+        }
 
 
 # Global terminal manager instance
@@ -1,7 +1,10 @@
+import multiprocessing
 import uvicorn
 from app.main import socket_app
 
 if __name__ == "__main__":
+    # Probe worker processes are spawned; needed for frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
     uvicorn.run(
         socket_app,
         host="0.0.0.0",
@@ -9,13 +9,41 @@ import { datacenterService } from '../services/datacenterService'
 function DatacenterPanel({ datacenter, socket, onUpdate, onDeviceClick, onFileEditor, position = 'left' }) {
   const { theme } = useTheme()
   const [showAddDevice, setShowAddDevice] = useState(false)
-  const [activeTerminals, setActiveTerminals] = useState([])
-  const [activeTab, setActiveTab] = useState(null)
+  // Open terminals survive a reload: the server keeps them running and they are reattached
+  const storageKey = `terminals:${datacenter.id}`
+  const [activeTerminals, setActiveTerminals] = useState(() =>
+    JSON.parse(sessionStorage.getItem(storageKey) || '[]')
+  )
+  const [activeTab, setActiveTab] = useState(() => activeTerminals[0]?.id || null)
   const [terminalHeight, setTerminalHeight] = useState(40) // Default 40%
   const [selectedDevice, setSelectedDevice] = useState(null)
-  const [showTerminals, setShowTerminals] = useState(false)
+  const [showTerminals, setShowTerminals] = useState(activeTerminals.length > 0)
   const [isDragging, setIsDragging] = useState(false)
 
+  useEffect(() => {
+    // Device credentials are left out of storage
+    sessionStorage.setItem(storageKey, JSON.stringify(
+      activeTerminals.map(({ id, title, deviceId, sessionId }) => ({ id, title, deviceId, sessionId }))
+    ))
+  }, [activeTerminals, storageKey])
+
+  // Drop terminals that ended or were taken over by another tab
+  useEffect(() => {
+    if (!socket) return
+
+    const handleGone = (data) => {
+      setActiveTerminals((prev) => prev.filter((t) => t.id !== data.terminal_id))
+    }
+
+    socket.on('terminal_closed', handleGone)
+    socket.on('terminal_detached', handleGone)
+
+    return () => {
+      socket.off('terminal_closed', handleGone)
+      socket.off('terminal_detached', handleGone)
+    }
+  }, [socket])
+
   const handleAddDevice = async (deviceData) => {
     await datacenterService.addDevice(datacenter.id, {
       ...deviceData,
@@ -43,6 +71,7 @@ function DatacenterPanel({ datacenter, socket, onUpdate, onDeviceClick, onFileEd
       socket.emit('create_terminal', {
         cols: 80,
         rows: 10,
+        binary: true,
         ssh_config: {
           host: device.ip_address,
           port: device.ssh_port || 22,
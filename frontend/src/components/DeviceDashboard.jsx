@@ -15,13 +15,9 @@ function DeviceDashboard({ device, socket, onClose }) {
   useEffect(() => {
     if (!socket || !device) return
 
-    // Start monitoring
+    // Start monitoring; the server connects with the device's stored credentials
     socket.emit('start_device_monitoring', {
       device_id: device.id,
-      host: device.ip_address,
-      port: device.ssh_port || 22,
-      username: device.ssh_username,
-      password: device.ssh_password,
     })
 
     // Listen for stats updates
@@ -160,10 +156,10 @@ function DeviceDashboard({ device, socket, onClose }) {
         {/* Tab Content */}
         <div className="flex-1 overflow-hidden">
           {activeTab === 'services' && (
-            <ServicesTab device={device} theme={theme} />
+            <ServicesTab device={device} socket={socket} theme={theme} />
           )}
           {activeTab === 'processes' && (
-            <ProcessesTab device={device} theme={theme} />
+            <ProcessesTab device={device} socket={socket} theme={theme} />
           )}
         </div>
       </div>
@@ -1,39 +1,95 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { RefreshCw, AlertCircle, XCircle, StopCircle, Search } from 'lucide-react'
 import axios from 'axios'
 
-function ProcessesTab({ device, theme }) {
-  const [processes, setProcesses] = useState([])
+const PAGE_SIZE = 200
+
+function ProcessesTab({ device, socket, theme }) {
+  const [rows, setRows] = useState({})
+  const [order, setOrder] = useState([])
+  const [total, setTotal] = useState(0)
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState(null)
   const [actionLoading, setActionLoading] = useState({})
   const [sortBy, setSortBy] = useState('cpu') // 'cpu' or 'memory'
   const [searchQuery, setSearchQuery] = useState('')
+  const viewRef = useRef({ sort: 'cpu', filter: '' })
 
-  const loadProcesses = async () => {
-    try {
-      setLoading(true)
-      const token = localStorage.getItem('token')
-      const response = await axios.get(`/api/devices/${device.id}/processes`, {
-        headers: { Authorization: `Bearer ${token}` },
-      })
-      setProcesses(response.data)
+  const viewParams = () => ({
+    device_id: device.id,
+    sort: viewRef.current.sort,
+    order: 'desc',
+    filter: viewRef.current.filter,
+    offset: 0,
+    limit: PAGE_SIZE,
+  })
+
+  // Ask for a fresh snapshot of the current page
+  const loadProcesses = () => {
+    if (!socket) return
+    setLoading(true)
+    socket.emit('update_process_view', viewParams())
+  }
+
+  useEffect(() => {
+    if (!socket || !device) return
+
+    // The server sorts, filters and pages the table; after the first
+    // snapshot only added, changed and removed rows arrive
+    socket.emit('subscribe_processes', {
+      ...viewParams(),
+      interval: 2,
+    })
+
+    const handleSnapshot = (data) => {
+      if (data.device_id !== device.id) return
+      setRows(Object.fromEntries(data.rows.map((row) => [row.pid, row])))
+      setOrder(data.order)
+      setTotal(data.total)
       setError(null)
-    } catch (err) {
-      console.error('Failed to load processes:', err)
-      setError(err.response?.data?.detail || 'Failed to load processes')
-    } finally {
       setLoading(false)
     }
-  }
 
+    const handleDelta = (data) => {
+      if (data.device_id !== device.id) return
+      setRows((current) => {
+        const next = { ...current }
+        data.removed.forEach((pid) => delete next[pid])
+        data.added.forEach((row) => { next[row.pid] = row })
+        data.changed.forEach((change) => { next[change.pid] = { ...next[change.pid], ...change } })
+        return next
+      })
+      if (data.order) setOrder(data.order)
+      setTotal(data.total)
+    }
+
+    const handleError = (data) => {
+      if (data.device_id !== device.id) return
+      setError(data.error)
+      setLoading(false)
+    }
+
+    socket.on('process_table_snapshot', handleSnapshot)
+    socket.on('process_table_delta', handleDelta)
+    socket.on('process_table_error', handleError)
+
+    return () => {
+      socket.off('process_table_snapshot', handleSnapshot)
+      socket.off('process_table_delta', handleDelta)
+      socket.off('process_table_error', handleError)
+      socket.emit('unsubscribe_processes', { device_id: device.id })
+    }
+  }, [socket, device.id])
+
+  // Re-query the server when the sort or filter changes
   useEffect(() => {
-    loadProcesses()
-    
-    // Auto-refresh every 5 seconds
-    const interval = setInterval(loadProcesses, 5000)
-    return () => clearInterval(interval)
-  }, [device.id])
+    viewRef.current = { sort: sortBy, filter: searchQuery }
+    if (!socket) return
+    const timeout = setTimeout(() => {
+      socket.emit('update_process_view', viewParams())
+    }, 250)
+    return () => clearTimeout(timeout)
+  }, [sortBy, searchQuery])
 
   const handleProcessAction = async (pid, action) => {
     if (!confirm(`Are you sure you want to ${action} process ${pid}?`)) {
@@ -52,11 +108,7 @@ function ProcessesTab({ device, theme }) {
           headers: { Authorization: `Bearer ${token}` },
         }
       )
-      
-      // Reload processes after action
-      setTimeout(() => {
-        loadProcesses()
-      }, 1000)
+      // The next table delta reports the process as removed
     } catch (err) {
       console.error(`Failed to ${action} process:`, err)
       alert(`Failed to ${action} process: ${err.response?.data?.detail || err.message}`)
@@ -65,20 +117,9 @@ function ProcessesTab({ device, theme }) {
     }
   }
 
-  // Filter processes based on search query
-  const filteredProcesses = processes.filter((process) =>
-    process.command.toLowerCase().includes(searchQuery.toLowerCase()) ||
-    process.user.toLowerCase().includes(searchQuery.toLowerCase()) ||
-    process.pid.toString().includes(searchQuery)
-  )
-
-  const sortedProcesses = [...filteredProcesses].sort((a, b) => {
-    if (sortBy === 'cpu') return b.cpu - a.cpu
-    if (sortBy === 'memory') return b.memory - a.memory
-    return 0
-  })
+  const sortedProcesses = order.map((pid) => rows[pid]).filter(Boolean)
 
-  if (loading && processes.length === 0) {
+  if (loading && sortedProcesses.length === 0) {
     return (
       <div className="flex items-center justify-center h-full">
         <RefreshCw className={`w-8 h-8 animate-spin ${
@@ -118,7 +159,7 @@ function ProcessesTab({ device, theme }) {
           <span className={`text-sm ${
             theme === 'dark' ? 'text-gray-400' : 'text-gray-600'
           }`}>
-            {sortedProcesses.length} / {processes.length} processes
+            {sortedProcesses.length} / {total} processes
           </span>
           
           <div className="flex items-center space-x-2">
@@ -206,9 +247,9 @@ function ProcessesTab({ device, theme }) {
             </tr>
           </thead>
           <tbody>
-            {sortedProcesses.map((process, index) => (
+            {sortedProcesses.map((process) => (
               <tr
-                key={`${process.pid}-${index}`}
+                key={process.pid}
                 className={`border-b ${
                   theme === 'dark'
                     ? 'border-gray-700 hover:bg-gray-700/50'
@@ -1,34 +1,89 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { Play, Square, RotateCw, RefreshCw, AlertCircle, Search } from 'lucide-react'
 import axios from 'axios'
 
-function ServicesTab({ device, theme }) {
-  const [services, setServices] = useState([])
+const PAGE_SIZE = 500
+
+function ServicesTab({ device, socket, theme }) {
+  const [units, setUnits] = useState({})
+  const [order, setOrder] = useState([])
+  const [total, setTotal] = useState(0)
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState(null)
   const [actionLoading, setActionLoading] = useState({})
   const [searchQuery, setSearchQuery] = useState('')
+  const filterRef = useRef('')
 
-  const loadServices = async () => {
-    try {
-      setLoading(true)
-      const token = localStorage.getItem('token')
-      const response = await axios.get(`/api/devices/${device.id}/services`, {
-        headers: { Authorization: `Bearer ${token}` },
-      })
-      setServices(response.data)
+  const viewParams = () => ({
+    device_id: device.id,
+    filter: filterRef.current,
+    offset: 0,
+    limit: PAGE_SIZE,
+  })
+
+  // Ask for a fresh snapshot of the current page
+  const loadServices = () => {
+    if (!socket) return
+    setError(null)
+    socket.emit('update_service_view', viewParams())
+  }
+
+  useEffect(() => {
+    if (!socket || !device) return
+
+    // The server filters and pages the inventory; after the snapshot
+    // only units that changed (after an action or refresh) arrive
+    socket.emit('subscribe_services', {
+      ...viewParams(),
+    })
+
+    const handleSnapshot = (data) => {
+      if (data.device_id !== device.id) return
+      setUnits(Object.fromEntries(data.rows.map((unit) => [unit.name, unit])))
+      setOrder(data.order)
+      setTotal(data.total)
       setError(null)
-    } catch (err) {
-      console.error('Failed to load services:', err)
-      setError(err.response?.data?.detail || 'Failed to load services')
-    } finally {
       setLoading(false)
     }
-  }
 
+    const handleDelta = (data) => {
+      if (data.device_id !== device.id) return
+      setUnits((current) => {
+        const next = { ...current }
+        data.removed.forEach((name) => delete next[name])
+        data.added.forEach((unit) => { next[unit.name] = unit })
+        data.changed.forEach((change) => { next[change.name] = { ...next[change.name], ...change } })
+        return next
+      })
+      if (data.order) setOrder(data.order)
+      setTotal(data.total)
+    }
+
+    const handleError = (data) => {
+      if (data.device_id !== device.id) return
+      setError(data.error)
+      setLoading(false)
+    }
+
+    socket.on('service_inventory_snapshot', handleSnapshot)
+    socket.on('service_inventory_delta', handleDelta)
+    socket.on('service_inventory_error', handleError)
+
+    return () => {
+      socket.off('service_inventory_snapshot', handleSnapshot)
+      socket.off('service_inventory_delta', handleDelta)
+      socket.off('service_inventory_error', handleError)
+      socket.emit('unsubscribe_services', { device_id: device.id })
+    }
+  }, [socket, device.id])
+
+  // Re-query the server when the filter changes
   useEffect(() => {
-    loadServices()
-  }, [device.id])
+    filterRef.current = searchQuery
+    if (!socket) return
+    const timeout = setTimeout(loadServices, 250)
+    return () => clearTimeout(timeout)
+  }, [searchQuery])
 
   const handleServiceAction = async (serviceName, action) => {
     const key = `${serviceName}-${action}`
@@ -43,11 +98,7 @@ function ServicesTab({ device, theme }) {
           headers: { Authorization: `Bearer ${token}` },
         }
       )
-      
-      // Reload services after action
-      setTimeout(() => {
-        loadServices()
-      }, 1000)
+      // The changed unit arrives as an inventory delta
     } catch (err) {
       console.error(`Failed to ${action} service:`, err)
       alert(`Failed to ${action} service: ${err.response?.data?.detail || err.message}`)
@@ -63,10 +114,7 @@ function ServicesTab({ device, theme }) {
     return 'text-yellow-500'
   }
 
-  // Filter services based on search query
-  const filteredServices = services.filter((service) =>
-    service.name.toLowerCase().includes(searchQuery.toLowerCase())
-  )
+  const filteredServices = order.map((name) => units[name]).filter(Boolean)
 
   const getStatusBadge = (active, sub) => {
     const color = getStatusColor(active, sub)
@@ -124,7 +172,7 @@ function ServicesTab({ device, theme }) {
         <span className={`text-sm ${
           theme === 'dark' ? 'text-gray-400' : 'text-gray-600'
         }`}>
-          {filteredServices.length} / {services.length} services
+          {filteredServices.length} / {total} services
         </span>
         <div className="flex items-center space-x-2" style={{ width: '35%' }}>
           <div className={`flex items-center flex-1 px-3 py-1.5 rounded-lg border ${
@@ -170,14 +218,15 @@ function ServicesTab({ device, theme }) {
             }`}>
               <th className="px-4 py-2 text-left">Service Name</th>
               <th className="px-4 py-2 text-left">Load</th>
+              <th className="px-4 py-2 text-left">Enabled</th>
               <th className="px-4 py-2 text-left">Status</th>
               <th className="px-4 py-2 text-right">Actions</th>
             </tr>
           </thead>
           <tbody>
-            {filteredServices.map((service, index) => (
+            {filteredServices.map((service) => (
               <tr
-                key={index}
+                key={service.name}
                 className={`border-b ${
                   theme === 'dark'
                     ? 'border-gray-700 hover:bg-gray-700/50'
@@ -187,13 +236,23 @@ function ServicesTab({ device, theme }) {
                 <td className={`px-4 py-3 text-sm ${
                   theme === 'dark' ? 'text-white' : 'text-gray-800'
                 }`}>
-                  {service.name}
+                  <div>{service.name}</div>
+                  {service.description && (
+                    <div className="text-xs text-gray-500">
+                      {service.description}
+                    </div>
+                  )}
                 </td>
                 <td className={`px-4 py-3 text-sm ${
                   theme === 'dark' ? 'text-gray-400' : 'text-gray-600'
                 }`}>
                   {service.load}
                 </td>
+                <td className={`px-4 py-3 text-sm ${
+                  theme === 'dark' ? 'text-gray-400' : 'text-gray-600'
+                }`}>
+                  {service.enabled}
+                </td>
                 <td className="px-4 py-3 text-sm">
                   {getStatusBadge(service.active, service.sub)}
                 </td>
@@ -4,7 +4,7 @@ import { FitAddon } from '@xterm/addon-fit'
 import { useTheme } from '../context/ThemeContext'
 import '@xterm/xterm/css/xterm.css'
 
-function TerminalComponent({ socket, terminalId, onClose, title }) {
+function TerminalComponent({ socket, terminalId, onClose, title, restored = false }) {
   const terminalRef = useRef(null)
   const xtermRef = useRef(null)
   const fitAddonRef = useRef(null)
@@ -75,25 +75,52 @@ function TerminalComponent({ socket, terminalId, onClose, title }) {
     xtermRef.current = term
     fitAddonRef.current = fitAddon
 
-    // Handle terminal input
+    // Handle terminal input, sent as bytes (a binary attachment)
+    const encoder = new TextEncoder()
     term.onData((data) => {
       if (socket && terminalId) {
         socket.emit('terminal_input', {
           terminal_id: terminalId,
-          data: data,
+          data: encoder.encode(data),
         })
       }
     })
 
-    // Handle terminal output
+    // Handle terminal output; acknowledging written bytes lets the server keep sending.
+    // Binary terminals send raw bytes, which xterm decodes itself.
     const handleOutput = (data) => {
       if (data.terminal_id === terminalId) {
-        term.write(data.data)
+        const output = typeof data.data === 'string' ? data.data : new Uint8Array(data.data)
+        term.write(output, () => {
+          socket.emit('terminal_ack', { terminal_id: terminalId, bytes: data.bytes })
+        })
       }
     }
 
     socket.on('terminal_output', handleOutput)
 
+    // Reattach after a reconnect (or a page reload) and repaint the current screen
+    const attach = () => {
+      socket.emit('attach_terminal', {
+        terminal_id: terminalId,
+        cols: term.cols,
+        rows: term.rows,
+      })
+    }
+
+    const handleAttached = (data) => {
+      if (data.terminal_id === terminalId) {
+        term.reset()
+        term.write(typeof data.data === 'string' ? data.data : new Uint8Array(data.data))
+      }
+    }
+
+    socket.on('terminal_attached', handleAttached)
+    socket.on('connect', attach)
+    if (restored && socket.connected) {
+      attach()
+    }
+
     // Handle window resize
     const handleResize = () => {
       fitAddon.fit()
@@ -112,6 +139,8 @@ function TerminalComponent({ socket, terminalId, onClose, title }) {
     return () => {
       window.removeEventListener('resize', handleResize)
       socket.off('terminal_output', handleOutput)
+      socket.off('terminal_attached', handleAttached)
+      socket.off('connect', attach)
       term.dispose()
     }
   }, [socket, terminalId])
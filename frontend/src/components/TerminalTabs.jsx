@@ -12,6 +12,8 @@ function TerminalTabs({ activeTerminals, activeTab, onTabChange, onCloseTerminal
   const [isReady, setIsReady] = useState(false)
 
   useEffect(() => {
+    const encoder = new TextEncoder()
+
     // Initialize terminals for each terminal session
     activeTerminals.forEach((terminal) => {
       const termId = terminal.id  // Use terminal session ID as key
@@ -46,12 +48,20 @@ function TerminalTabs({ activeTerminals, activeTab, onTabChange, onCloseTerminal
             fitAddon.fit()
           }, 100)
 
-          // Handle terminal input - send to backend
+          // Attach to get the current screen, e.g. after a reload or when the panel is reopened
+          if (socket.connected) {
+            socket.emit('attach_terminal', {
+              terminal_id: termId,
+              cols: term.cols,
+              rows: term.rows,
+            })
+          }
+
+          // Handle terminal input - send to backend as bytes (a binary attachment)
           term.onData((data) => {
-            console.log('Terminal input:', termId, data)
             socket.emit('terminal_input', {
               terminal_id: termId,
-              data: data,
+              data: encoder.encode(data),
             })
           })
 
@@ -67,14 +77,17 @@ function TerminalTabs({ activeTerminals, activeTab, onTabChange, onCloseTerminal
       }
     })
 
-    // Listen for terminal output
+    // Listen for terminal output; acknowledging written bytes lets the server keep sending.
+    // Binary terminals send raw bytes, which xterm decodes itself.
     const handleOutput = (data) => {
-      console.log('Terminal output received:', data)
       const termId = data.terminal_id
       const term = terminalRefs.current[termId]
       
       if (term) {
-        term.write(data.data)
+        const output = typeof data.data === 'string' ? data.data : new Uint8Array(data.data)
+        term.write(output, () => {
+          socket.emit('terminal_ack', { terminal_id: termId, bytes: data.bytes })
+        })
       } else {
         console.warn('Terminal not found for output:', termId)
       }
@@ -82,8 +95,35 @@ function TerminalTabs({ activeTerminals, activeTab, onTabChange, onCloseTerminal
 
     socket.on('terminal_output', handleOutput)
 
+    // Reattach every terminal after a reconnect (or a page reload) and repaint its screen
+    const handleConnect = () => {
+      activeTerminals.forEach((terminal) => {
+        const term = terminalRefs.current[terminal.id]
+        if (term) {
+          socket.emit('attach_terminal', {
+            terminal_id: terminal.id,
+            cols: term.cols,
+            rows: term.rows,
+          })
+        }
+      })
+    }
+
+    const handleAttached = (data) => {
+      const term = terminalRefs.current[data.terminal_id]
+      if (term) {
+        term.reset()
+        term.write(typeof data.data === 'string' ? data.data : new Uint8Array(data.data))
+      }
+    }
+
+    socket.on('connect', handleConnect)
+    socket.on('terminal_attached', handleAttached)
+
     return () => {
       socket.off('terminal_output', handleOutput)
+      socket.off('connect', handleConnect)
+      socket.off('terminal_attached', handleAttached)
     }
   }, [activeTerminals, socket, theme])
 
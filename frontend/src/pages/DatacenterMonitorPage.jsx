@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { useNavigate } from 'react-router-dom'
 import { io } from 'socket.io-client'
 import DatacenterPanel from '../components/DatacenterPanel'
@@ -23,6 +23,8 @@ function DatacenterMonitorPage() {
   const [fileEditorDatacenterId, setFileEditorDatacenterId] = useState(null)
   const navigate = useNavigate()
   const { theme } = useTheme()
+  // Last status sequence seen per datacenter, for resync after reconnects
+  const statusSync = useRef({ epoch: null, seqs: {} })
 
   useEffect(() => {
     // Connect to Socket.IO
@@ -30,35 +32,68 @@ function DatacenterMonitorPage() {
       path: '/socket.io',
       transports: ['websocket', 'polling'],
       reconnection: true,
+      auth: (cb) => cb({ token: authService.getToken() }),
     })
 
+    // Apply status changes to the matching devices of a datacenter
+    const applyStatuses = (datacenterId, statuses) => {
+      setDatacenters((prevDatacenters) =>
+        prevDatacenters.map((dc) => {
+          if (dc.id !== datacenterId) return dc
+          return {
+            ...dc,
+            devices: dc.devices.map((device) =>
+              device.id in statuses
+                ? { ...device, status: statuses[device.id] }
+                : device
+            ),
+          }
+        })
+      )
+    }
+
     newSocket.on('connect', () => {
       console.log('Connected to server')
+      // Catch up on anything missed while disconnected
+      newSocket.emit('resync_status', statusSync.current)
     })
 
     newSocket.on('disconnect', () => {
       console.log('Disconnected from server')
     })
 
-    // Listen for device status updates
-    newSocket.on('device_status_update', (data) => {
-      console.log('Device status update:', data)
-      // Update the device status in the state
-      setDatacenters((prevDatacenters) => 
-        prevDatacenters.map((dc) => {
-          if (dc.id === data.datacenter_id) {
-            return {
-              ...dc,
-              devices: dc.devices.map((device) =>
-                device.id === data.device_id
-                  ? { ...device, status: data.status }
-                  : device
-              ),
-            }
-          }
-          return dc
+    // Coalesced, sequenced device status updates
+    newSocket.on('device_status_batch', (data) => {
+      const sync = statusSync.current
+      const lastSeq = sync.seqs[data.datacenter_id]
+      // A batch covers seqs from_seq..seq even when it skips superseded changes of a device
+      if (sync.epoch !== data.epoch || (lastSeq !== undefined && data.from_seq > lastSeq + 1)) {
+        // Gap in the sequence - ask for what was missed
+        newSocket.emit('resync_status', sync)
+        return
+      }
+      const statuses = {}
+      data.deltas.forEach((delta) => {
+        statuses[delta.device_id] = delta.status
+      })
+      applyStatuses(data.datacenter_id, statuses)
+      sync.seqs[data.datacenter_id] = data.seq
+    })
+
+    newSocket.on('device_status_resync', (data) => {
+      const sync = statusSync.current
+      sync.epoch = data.epoch
+      data.datacenters.forEach((dc) => {
+        const statuses = {}
+        ;(dc.deltas || []).forEach((delta) => {
+          statuses[delta.device_id] = delta.status
         })
-      )
+        ;(dc.snapshot || []).forEach(([deviceId, status]) => {
+          statuses[deviceId] = status
+        })
+        applyStatuses(dc.datacenter_id, statuses)
+        sync.seqs[dc.datacenter_id] = dc.seq
+      })
     })
 
     setSocket(newSocket)
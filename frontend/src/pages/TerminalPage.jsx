@@ -10,18 +10,26 @@ import { useTheme } from '../context/ThemeContext'
 
 function TerminalPage() {
   const [socket, setSocket] = useState(null)
-  const [terminals, setTerminals] = useState([])
+  // Open terminals survive a reload: the server keeps them running and they are reattached
+  const [terminals, setTerminals] = useState(() =>
+    JSON.parse(sessionStorage.getItem('terminals') || '[]').map((t) => ({ ...t, restored: true }))
+  )
   const [showConnectionModal, setShowConnectionModal] = useState(false)
   const [showSettings, setShowSettings] = useState(false)
   const navigate = useNavigate()
   const { theme } = useTheme()
 
+  useEffect(() => {
+    sessionStorage.setItem('terminals', JSON.stringify(terminals))
+  }, [terminals])
+
   useEffect(() => {
     // Connect to Socket.IO server through Nginx proxy
     const newSocket = io('/', {
       path: '/socket.io',
       transports: ['websocket', 'polling'],
       reconnection: true,
+      auth: (cb) => cb({ token: authService.getToken() }),
     })
 
     newSocket.on('connect', () => {
@@ -40,6 +48,11 @@ function TerminalPage() {
       setTerminals((prev) => prev.filter((t) => t.id !== data.terminal_id))
     })
 
+    // Another tab took the terminal over
+    newSocket.on('terminal_detached', (data) => {
+      setTerminals((prev) => prev.filter((t) => t.id !== data.terminal_id))
+    })
+
     newSocket.on('error', (data) => {
       console.error('Socket error:', data)
       alert(data.message)
@@ -58,6 +71,7 @@ function TerminalPage() {
     const payload = {
       cols: 80,
       rows: 24,
+      binary: true,
     }
 
     // Add SSH configuration if provided
@@ -199,6 +213,7 @@ function TerminalPage() {
                 socket={socket}
                 terminalId={terminal.id}
                 title={terminal.title}
+                restored={terminal.restored}
                 onClose={() => closeTerminal(terminal.id)}
               />
             ))}